@@ -0,0 +1,5 @@
+# Carrega as variáveis de ambiente (.env) uma única vez para toda a aplicação.
+# Os módulos que leem configurações importam este módulo antes de usar os.getenv.
+from dotenv import load_dotenv
+
+load_dotenv()
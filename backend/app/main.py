@@ -1,21 +1,88 @@
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
 import os
-from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
-load_dotenv()
+from app import config
 
 # Importar routers
-from app.routers import auth, tickets, atendentes, etapas
+from app.routers import auth, tickets, atendentes, etapas, bootstrap, fila, avatars
+from app.services.warmup import warmup_state
+from app.services.health import health_monitor, require_diagnostics
+from app.services.blocking import BLOCKING_DETECTOR_ENABLED, RouteTrackingMiddleware, blocking_detector
+from app.services.profiling import PROFILING_ENABLED, ProfilingMiddleware
+from app.services.ratelimit import AdmissionControlMiddleware, admission_stats, rate_limit
+
+# Inicialização e encerramento da aplicação
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Serviços usados só no ciclo de vida: importados aqui, não ao carregar o módulo
+    from app.services.group_commit import INGEST_ENABLED
+    from app.services.jobs import job_queue
+    from app.services.idempotency import idempotency_store
+    from app.services.revocation import revocation_set
+    # Registra o handler dos jobs do cubo antes de iniciar os workers da fila
+    from app.services.arrival_cube import arrival_cube
+    from app.services.outbound_sync import outbound_sync
+    from app.services.invalidation import invalidation_bus
+    from app.services.queue_eta import queue_estimator
+    from app.services.sla import sla_monitor
+    from app.services.warmup import run_warmup
+
+    # Aquecimento em segundo plano: a API sobe imediatamente e só fica "ready" ao final
+    warmup_task = asyncio.create_task(run_warmup())
+    # Workers da fila de jobs em segundo plano
+    await job_queue.start()
+    # Avisos de invalidação de cache publicados pelos outros workers
+    await invalidation_bus.start()
+    # Tokens revogados (logout, desativação, troca de senha), sincronizados do banco
+    await revocation_set.start()
+    # Posições e estimativa de espera da fila, mantidas em memória
+    await queue_estimator.start()
+    # Prazos de SLA dos tickets em espera (roda de tempo reconstruída do banco)
+    await sla_monitor.start()
+    # Criações de tickets agrupadas em lotes (group commit)
+    if INGEST_ENABLED:
+        await tickets.ticket_ingestor.start()
+    # Envio das mudanças de etapa ao sistema externo (SYNC_ENABLED)
+    await outbound_sync.start()
+    # Cubo de chegadas por dia/hora/setor, agregado a partir de ticket_events
+    await arrival_cube.start()
+    # Remoção periódica das chaves de idempotência expiradas
+    await idempotency_store.start()
+    # Estado em memória usado pelas sondas de liveness/readiness
+    await health_monitor.start()
+    # Modo de diagnóstico: detector de chamadas bloqueantes no event loop
+    if BLOCKING_DETECTOR_ENABLED:
+        await blocking_detector.start()
+    yield
+    warmup_task.cancel()
+    await blocking_detector.stop()
+    await health_monitor.stop()
+    await idempotency_store.stop()
+    await arrival_cube.stop()
+    await sla_monitor.stop()
+    await outbound_sync.stop()
+    await tickets.ticket_ingestor.stop()
+    await queue_estimator.stop()
+    await revocation_set.stop()
+    await invalidation_bus.stop()
+    await job_queue.stop()
+    from app.routers.auth.db import db_pool, replica_router
+    db_pool.closeall()
+    replica_router.closeall()
 
 # Criar aplicação FastAPI
 app = FastAPI(
     title="FilaSling API",
     description="API para o sistema FilaSling de gerenciamento de filas e tickets",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurações de CORS
@@ -28,35 +95,114 @@ if os.getenv("ENVIRONMENT", "development") == "development":
 
 print(f"Origens CORS permitidas: {origins}")
 
+# Controle de admissão: descarta carga com 503 + Retry-After antes de esgotar o pool
+# (registrado antes do CORS para que as respostas 503 também recebam os headers de CORS)
+app.add_middleware(AdmissionControlMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Permitir todas as origens para resolver o problema de CORS
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Type", "Authorization"],
+    expose_headers=["Content-Type", "Authorization", "X-Min-LSN"],
 )
 
 print("Middleware CORS configurado")
 
+# Leitura das próprias escritas entre workers: o LSN do commit vai ao cliente e volta
+# nas leituras seguintes, que só usam réplicas que já o reproduziram
+from app.routers.auth.db import DB_REPLICA_STICKY_SECONDS, replica_router
+if replica_router.enabled:
+    from app.services.replicas import ReadYourWritesMiddleware
+    app.add_middleware(ReadYourWritesMiddleware, max_age=DB_REPLICA_STICKY_SECONDS)
+
+# Profiling opt-in por amostragem (PROFILING_SAMPLE_RATE) ou pelo header X-Profile
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+    print("Middleware de profiling configurado")
+
+# Associa cada requisição à sua task para identificar a rota que bloqueou o event loop
+if BLOCKING_DETECTOR_ENABLED:
+    app.add_middleware(RouteTrackingMiddleware)
+
 # Prefixo global para todos os endpoints
 API_PREFIX = "/api"
 
 # Incluir routers com prefixo /api
 app.include_router(auth.router, prefix=f"{API_PREFIX}/auth", tags=["auth"])
-app.include_router(tickets.router, prefix=f"{API_PREFIX}/tickets", tags=["tickets"])
-app.include_router(atendentes.router, prefix=f"{API_PREFIX}/atendentes", tags=["atendentes"])
-app.include_router(etapas.router, prefix=f"{API_PREFIX}/etapas", tags=["etapas"])
+# Limites por usuário e por rota, configurados por router (RATE_LIMIT_*)
+app.include_router(tickets.router, prefix=f"{API_PREFIX}/tickets", tags=["tickets"],
+                   dependencies=[Depends(rate_limit("tickets"))])
+app.include_router(atendentes.router, prefix=f"{API_PREFIX}/atendentes", tags=["atendentes"],
+                   dependencies=[Depends(rate_limit("atendentes"))])
+app.include_router(etapas.router, prefix=f"{API_PREFIX}/etapas", tags=["etapas"],
+                   dependencies=[Depends(rate_limit("etapas"))])
+# Fila e estimativas de espera (o painel público não exige autenticação)
+app.include_router(fila.router, prefix=f"{API_PREFIX}/fila", tags=["fila"])
+# Miniaturas dos avatares (públicas, carregadas por <img> com cache imutável)
+app.include_router(avatars.router, prefix=f"{API_PREFIX}/avatars", tags=["avatars"])
+app.include_router(bootstrap.router, prefix=f"{API_PREFIX}/bootstrap", tags=["bootstrap"],
+                   dependencies=[Depends(rate_limit("bootstrap"))])
 
 # Rota de health check
 @app.get(f"{API_PREFIX}/health", tags=["health"])
 def health_check():
     return {"status": "ok", "message": "API is running"}
 
+# Liveness: responde sem tocar no banco, apenas com o atraso do event loop
+@app.get(f"{API_PREFIX}/health/live", tags=["health"])
+def liveness_check():
+    return health_monitor.liveness()
+
+# Readiness: aquecimento concluído, banco respondendo recentemente, pool com folga
+# e event loop sem atraso. Usa apenas estado em memória (nenhuma conexão nova)
+@app.get(f"{API_PREFIX}/health/ready", tags=["health"])
+def readiness_check():
+    result = health_monitor.readiness()
+    result["aquecimento"] = warmup_state.as_dict()
+    status_code = status.HTTP_200_OK if result["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content=result)
+
+# Métricas internas da API (coalescência, fila de jobs, admissão, réplicas, invalidação, revogação de tokens,
+# idempotência, ingestão, sincronização externa, SLA, cubo de chegadas, avatares e event loop)
+# Consulta o banco (fila de jobs e sincronização externa): disponível apenas com diagnóstico habilitado
+@app.get(f"{API_PREFIX}/metrics", tags=["health"], dependencies=[Depends(require_diagnostics)])
+async def metrics():
+    from app.services.singleflight import singleflight_stats
+    from app.routers.auth.db import replica_router
+    from app.services.jobs import job_queue
+    from app.services.revocation import revocation_set
+    from app.services.arrival_cube import arrival_cube
+    from app.services.avatars import avatar_service
+    from app.services.idempotency import idempotency_store
+    from app.services.outbound_sync import outbound_sync
+    from app.services.invalidation import invalidation_bus
+    from app.services.queue_eta import queue_estimator
+    from app.services.sla import sla_monitor
+    return {
+        "singleflight": singleflight_stats(),
+        "jobs": await job_queue.metrics(),
+        "admissao": admission_stats(),
+        "replicas": replica_router.stats(),
+        "invalidacao": invalidation_bus.stats(),
+        "revogacao": revocation_set.stats(),
+        "fila": queue_estimator.stats(),
+        "sla": sla_monitor.stats(),
+        "cubo_chegadas": arrival_cube.stats(),
+        "avatares": avatar_service.stats(),
+        "idempotencia": idempotency_store.stats(),
+        "ingestao": tickets.ticket_ingestor.stats(),
+        "sincronizacao": await outbound_sync.stats(),
+        "event_loop": {
+            **health_monitor.liveness(),
+            "bloqueios": blocking_detector.stats()
+        }
+    }
+
 # Rota simples para testar diretamente a conexão com o banco
-# Colocada na raiz para ser acessada diretamente pela porta 8000
-@app.get("/")
-@app.get("/dbtest")
+# Abre uma conexão nova e consulta o catálogo: disponível apenas com diagnóstico habilitado
+@app.get("/dbtest", dependencies=[Depends(require_diagnostics)])
 def db_test():
     import psycopg2
     from psycopg2.extras import RealDictCursor
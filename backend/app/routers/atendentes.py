@@ -1,9 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 import psycopg2
+import base64
+import json
+import re
 from psycopg2.extras import RealDictCursor
 from pydantic import BaseModel
-from .auth import get_db_connection, oauth2_scheme, get_current_user
+from .auth import get_db_connection, get_read_connection, mark_primary_write, oauth2_scheme, get_current_user
+from .auth.security import ACCESS_TOKEN_EXPIRE_MINUTES
+from app.services.singleflight import singleflight
+from app.services.cache import response_cache
+from app.services.invalidation import publish_invalidation
+from app.services.revocation import revocation_set, revoke_user
+from app.services.avatars import avatar_service
+from .tickets import TICKETS_CACHE_NAMESPACE
 
 router = APIRouter()
 
@@ -18,6 +29,8 @@ class AtendenteCreate(AtendenteBase):
 
 class AtendenteUpdate(BaseModel):
     nome: Optional[str] = None  # nome do atendente
+    email: Optional[str] = None
+    url_imagem: Optional[str] = None
     ativo: Optional[bool] = None
 
 class Atendente(AtendenteBase):
@@ -25,39 +38,148 @@ class Atendente(AtendenteBase):
     ativo: bool
     url_imagem: Optional[str] = None
 
-# Listar todos os atendentes
+# Campos expostos pela listagem; o nome/email do banco é renomeado no próprio SQL
+# para os nomes usados pelo frontend
+ATENDENTE_FIELDS = {
+    "id": "id",
+    "nome_completo": "nome AS nome_completo",
+    "usuario": "email AS usuario",
+    "ativo": "ativo",
+    "url_imagem": "url_imagem",
+}
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(ATENDENTE_FIELDS)
+    campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in ATENDENTE_FIELDS]
+    if invalidos or not campos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Campos inválidos: {', '.join(invalidos)}. Disponíveis: {', '.join(ATENDENTE_FIELDS)}"
+        )
+    return campos
+
+def _encode_cursor(nome: str, atendente_id) -> str:
+    return base64.urlsafe_b64encode(json.dumps([nome, str(atendente_id)]).encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        nome, atendente_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return nome, atendente_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginação inválido"
+        )
+
+def query_atendentes(cur, fields: Optional[List[str]] = None, ativo: Optional[bool] = None,
+                     q: Optional[str] = None, after: Optional[tuple] = None, limit: Optional[int] = None):
+    """Consulta atendentes no cursor informado, já no formato esperado pelo frontend.
+
+    Ordena por (nome, id); `after` é a chave do último item da página anterior.
+    """
+    campos = fields or list(ATENDENTE_FIELDS)
+    colunas = [ATENDENTE_FIELDS[campo] for campo in campos]
+    # A chave de paginação é sempre lida, mesmo que não tenha sido pedida
+    if limit is not None:
+        colunas += ["nome AS _cursor_nome", "id AS _cursor_id"]
+
+    filtros = []
+    params = {}
+    if ativo is not None:
+        filtros.append("ativo = %(ativo)s")
+        params["ativo"] = ativo
+    if q:
+        # Busca por prefixo (índices em lower(nome)/lower(email) com text_pattern_ops)
+        filtros.append("(lower(nome) LIKE %(prefixo)s OR lower(email) LIKE %(prefixo)s)")
+        params["prefixo"] = re.sub(r"([\\%_])", r"\\\1", q.strip().lower()) + "%"
+    if after is not None:
+        filtros.append("(nome, id) > (%(after_nome)s, %(after_id)s::uuid)")
+        params["after_nome"], params["after_id"] = after
+
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    sql = f"""
+        SELECT {', '.join(colunas)}
+        FROM atendentes
+        {where}
+        ORDER BY nome, id
+    """
+    if limit is not None:
+        sql += " LIMIT %(limit)s"
+        params["limit"] = limit
+    cur.execute(sql, params)
+    # Miniatura do avatar, quando url_imagem foi pedida
+    return avatar_service.add_urls(cur.fetchall(), "url_imagem", "url_avatar")
+
+# Listar atendentes
+# Sem parâmetros retorna a lista completa (array), como o frontend espera; rajadas de
+# chamadas simultâneas compartilham uma única consulta.
+# Com `limit` retorna uma página {"items", "next_cursor"}; `fields` restringe as colunas.
 @router.get("/")
-async def list_atendentes(current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
+async def list_atendentes(
+    ativo: Optional[bool] = None,
+    q: Optional[str] = Query(None, min_length=1, max_length=100),
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if ativo is None and q is None and fields is None and limit is None and cursor is None:
+        return await _fetch_atendentes()
+    campos = _parse_fields(fields)
+    after = _decode_cursor(cursor) if cursor else None
+    if after is not None and limit is None:
+        limit = 50
+    return await run_in_threadpool(_fetch_atendentes_page, campos, ativo, q, after, limit)
+
+@singleflight("list_atendentes")
+def _fetch_atendentes():
+    """Consulta todos os atendentes no formato esperado pelo frontend."""
+    conn = get_read_connection("atendentes")
     try:
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
-            SELECT id, nome, email, url_imagem, ativo
-            FROM atendentes
-            ORDER BY nome
-        """)
-        atendentes = cur.fetchall()
-        
-        # Mapper para compatibilidade com o frontend
-        result = []
-        for atendente in atendentes:
-            result.append({
-                "id": atendente["id"],
-                "nome_completo": atendente["nome"],  # Mapeia nome para nome_completo
-                "usuario": atendente["email"],       # Mapeia email para usuario
-                "ativo": atendente["ativo"],
-                "url_imagem": atendente["url_imagem"]
-            })
-            
+        result = query_atendentes(cur)
         cur.close()
         conn.close()
         return result  # Retorna array diretamente
     except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao listar atendentes: {str(e)}"
+        )
+    finally:
+        conn.close()
+
+def _fetch_atendentes_page(campos: List[str], ativo: Optional[bool], q: Optional[str],
+                           after: Optional[tuple], limit: Optional[int]):
+    """Consulta atendentes filtrados; com `limit`, retorna uma página com o próximo cursor."""
+    conn = get_read_connection("atendentes")
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        # Uma linha a mais indica se existe próxima página
+        rows = query_atendentes(cur, campos, ativo, q, after, limit + 1 if limit else None)
+        cur.close()
         conn.close()
+    except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao listar atendentes: {str(e)}"
         )
+    finally:
+        conn.close()
+
+    if limit is None:
+        return rows
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["_cursor_nome"], rows[-1]["_cursor_id"])
+    for row in rows:
+        row.pop("_cursor_nome")
+        row.pop("_cursor_id")
+    return {"items": rows, "next_cursor": next_cursor}
 
 # Obter atendente por ID
 @router.get("/{atendente_id}")
@@ -81,12 +203,15 @@ async def get_atendente(atendente_id: str, current_user: dict = Depends(get_curr
             )
             
         return atendente
+    except HTTPException:
+        raise
     except Exception as e:
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao buscar atendente: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Criar novo atendente
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -133,9 +258,15 @@ async def create_atendente(
             (login_id, atendente.nome, atendente.email, None, atendente.ativo)
         )
         new_atendente = cur.fetchone()
+        # Tickets exibem nome e imagem do atendente
+        publish_invalidation(cur, "atendentes")
+        # Nenhuma linha de tickets muda: só as respostas em cache dos tickets
+        publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=[])
         conn.commit()
+        mark_primary_write(conn, "atendentes", "tickets")
         cur.close()
         conn.close()
+        await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
         
         # Mapear para formato esperado pelo frontend
         return {
@@ -147,11 +278,12 @@ async def create_atendente(
         }
     except Exception as e:
         conn.rollback()
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao criar atendente: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Atualizar atendente
 @router.put("/{atendente_id}")
@@ -162,63 +294,98 @@ async def update_atendente(
 ):
     conn = get_db_connection()
     try:
-        cur = conn.cursor()
+        cur = conn.cursor(cursor_factory=RealDictCursor)
         # Verificar se o atendente existe
-        cur.execute("SELECT * FROM usuarios WHERE id = %s", (atendente_id,))
+        cur.execute("SELECT id, nome, email, url_imagem, ativo FROM atendentes WHERE id = %s FOR UPDATE", (atendente_id,))
         existing_atendente = cur.fetchone()
         
         if not existing_atendente:
             cur.close()
-            conn.close()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Atendente com ID {atendente_id} não encontrado"
             )
+        
+        if atendente_update.email is not None and atendente_update.email != existing_atendente["email"]:
+            cur.execute(
+                "SELECT id FROM atendentes WHERE email = %s AND id <> %s",
+                (atendente_update.email, atendente_id)
+            )
+            if cur.fetchone():
+                cur.close()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Já existe um atendente com o email {atendente_update.email}"
+                )
             
         # Construir a consulta de atualização
         update_fields = []
         params = []
         
-        if atendente_update.nome_completo is not None:
-            update_fields.append("nome_completo = %s")
-            params.append(atendente_update.nome_completo)
-            
-        if atendente_update.ativo is not None:
-            update_fields.append("ativo = %s")
-            params.append(atendente_update.ativo)
-            
-        if atendente_update.admin is not None:
-            update_fields.append("admin = %s")
-            params.append(atendente_update.admin)
-            
-        if not update_fields:
-            cur.close()
-            conn.close()
-            return existing_atendente
-            
-        # Montar a consulta SQL
-        query = f"""
-            UPDATE usuarios 
-            SET {", ".join(update_fields)}
-            WHERE id = %s
-            RETURNING id, usuario, nome_completo, ativo, admin
-        """
-        params.append(atendente_id)
+        for campo in ("nome", "email", "url_imagem", "ativo"):
+            valor = getattr(atendente_update, campo)
+            if valor is not None:
+                update_fields.append(f"{campo} = %s")
+                params.append(valor)
         
-        # Executar a atualização
-        cur.execute(query, params)
-        updated_atendente = cur.fetchone()
+        updated_atendente = existing_atendente
+        revogacao = None
+        if update_fields:
+            params.append(atendente_id)
+            cur.execute(f"""
+                UPDATE atendentes
+                SET {", ".join(update_fields)}, data_atualizado = CURRENT_TIMESTAMP
+                WHERE id = %s
+                RETURNING id, nome, email, url_imagem, ativo
+            """, params)
+            updated_atendente = cur.fetchone()
+            
+            # O login usa o email como usuário e guarda o status usado na autenticação
+            cur.execute(
+                """
+                UPDATE login
+                SET usuario = COALESCE(%s, usuario), ativo = COALESCE(%s, ativo),
+                    data_atualizado = CURRENT_TIMESTAMP
+                WHERE id = %s
+                """,
+                (atendente_update.email, atendente_update.ativo, atendente_id)
+            )
+            # Desativação: os tokens já emitidos deixam de valer em todos os workers
+            if atendente_update.ativo is False:
+                revogacao = revoke_user(cur, atendente_id, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+            # Tickets exibem nome e imagem do atendente
+            publish_invalidation(cur, "atendentes")
+            # Nenhuma linha de tickets muda: só as respostas em cache dos tickets
+            publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=[])
         conn.commit()
+        if update_fields:
+            mark_primary_write(conn, "atendentes", "tickets")
         cur.close()
         conn.close()
-        return updated_atendente
+        if revogacao is not None:
+            revocation_set.apply([revogacao])
+        if update_fields:
+            await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
+        
+        # Mapear para formato esperado pelo frontend
+        return {
+            "id": updated_atendente["id"],
+            "nome_completo": updated_atendente["nome"],
+            "usuario": updated_atendente["email"],
+            "ativo": updated_atendente["ativo"],
+            "url_imagem": updated_atendente["url_imagem"]
+        }
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao atualizar atendente: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Atualizar senha do atendente
 @router.put("/{atendente_id}/senha")
@@ -239,7 +406,6 @@ async def update_password(
         cur.execute("SELECT * FROM login WHERE id = %s", (atendente_id,))
         if not cur.fetchone():
             cur.close()
-            conn.close()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Atendente com ID {atendente_id} não encontrado"
@@ -256,14 +422,21 @@ async def update_password(
             (hashed_password, atendente_id)
         )
         updated_atendente = cur.fetchone()
+        # Sessões abertas com a senha anterior são encerradas
+        revogacao = revoke_user(cur, atendente_id, ACCESS_TOKEN_EXPIRE_MINUTES * 60)
         conn.commit()
         cur.close()
         conn.close()
+        revocation_set.apply([revogacao])
         return {"message": "Senha atualizada com sucesso"}
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao atualizar senha: {str(e)}"
         )
+    finally:
+        conn.close()
@@ -1,6 +1,9 @@
 
 from fastapi import APIRouter
 from .routes import router
+from .db import get_db_connection, get_read_connection, mark_primary_write
+from .security import oauth2_scheme, pwd_context
+from .authentication import get_current_user
 
 # Export the router to maintain the same API
-__all__ = ["router"]
+__all__ = ["router", "get_db_connection", "get_read_connection", "mark_primary_write", "oauth2_scheme", "pwd_context", "get_current_user"]
@@ -3,6 +3,7 @@ from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import OAuth2PasswordBearer
 from .security import verify_password, decode_token, oauth2_scheme
 from .db import get_user_by_username
+from app.services.revocation import revocation_set
 import traceback
 
 def authenticate_user(username: str, password: str):
@@ -61,10 +62,20 @@ async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)
         usuario: str = payload.get("sub")
         user_id: str = payload.get("id")
         
+        # Revogações (logout, usuário desativado, troca de senha) mantidas em memória
+        if revocation_set.is_revoked(payload):
+            print(f"Token revogado para usuário: {usuario}, id: {user_id}")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token revogado",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        
         print(f"Token válido para usuário: {usuario}, id: {user_id}")
         
         # Retornando o campo como 'usuario' para manter consistência com o resto do código
-        return {"usuario": usuario, "id": user_id}
+        # (jti e exp permitem revogar este token no logout)
+        return {"usuario": usuario, "id": user_id, "jti": payload.get("jti"), "exp": payload.get("exp")}
     except Exception as e:
         print(f"Erro ao obter usuário atual: {e}")
         traceback.print_exc()
@@ -3,11 +3,10 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 from fastapi import HTTPException, status
 import os
-from dotenv import load_dotenv
 import traceback
-
-# Carregar variáveis de ambiente
-load_dotenv()
+from app import config  # Carrega as variáveis de ambiente (.env)
+from app.services.db_pool import ConnectionPool, PoolTimeoutError
+from app.services.replicas import ReplicaRouter
 
 # Conexão ao banco de dados
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -16,19 +15,75 @@ DB_USER = os.getenv("DB_USER", "postgres")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "postgres")
 DB_NAME = os.getenv("DB_NAME", "filasling")
 
+# Pool de conexões
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_MAX_IDLE_SECONDS = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+db_pool = ConnectionPool(
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    timeout=DB_POOL_TIMEOUT,
+    max_idle_seconds=DB_POOL_MAX_IDLE_SECONDS,
+    host=DB_HOST,
+    port=DB_PORT,
+    user=DB_USER,
+    password=DB_PASSWORD,
+    dbname=DB_NAME,
+    connect_timeout=DB_CONNECT_TIMEOUT
+)
+
+# Réplicas de leitura ("host:porta" separados por vírgula); vazio envia tudo ao primário
+DB_REPLICA_HOSTS = [h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()]
+DB_REPLICA_POOL_MAX = int(os.getenv("DB_REPLICA_POOL_MAX", str(DB_POOL_MAX)))
+# Janela após uma escrita em que as leituras exigem réplica em dia com o primário
+# (também a validade do cookie com o LSN devolvido ao cliente)
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "10"))
+
+def _replica_pool(endereco: str) -> ConnectionPool:
+    host, _, port = endereco.partition(":")
+    return ConnectionPool(
+        DB_POOL_MIN,
+        DB_REPLICA_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        max_idle_seconds=DB_POOL_MAX_IDLE_SECONDS,
+        host=host,
+        port=port or DB_PORT,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        dbname=DB_NAME,
+        connect_timeout=DB_CONNECT_TIMEOUT
+    )
+
+replica_router = ReplicaRouter(
+    [_replica_pool(endereco) for endereco in DB_REPLICA_HOSTS],
+    sticky_seconds=DB_REPLICA_STICKY_SECONDS,
+    retry_seconds=DB_REPLICA_RETRY_SECONDS
+)
+
+def init_db_pool():
+    """Abre antecipadamente as conexões mínimas do pool (usado no startup)."""
+    print(f"Abrindo pool de conexões: {DB_HOST}:{DB_PORT}/{DB_NAME} com usuário {DB_USER} (min={DB_POOL_MIN}, max={DB_POOL_MAX})")
+    db_pool.prefill()
+    if replica_router.enabled:
+        print(f"Abrindo pools das réplicas de leitura: {', '.join(DB_REPLICA_HOSTS)}")
+        replica_router.prefill()
+    print("Pool de conexões com o banco de dados pronto!")
+
 def get_db_connection():
-    """Obtém uma conexão com o banco de dados PostgreSQL."""
+    """Obtém uma conexão do pool; conn.close() devolve a conexão ao pool."""
     try:
-        print(f"Tentando conectar ao banco de dados: {DB_HOST}:{DB_PORT}/{DB_NAME} com usuário {DB_USER}")
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            dbname=DB_NAME
+        return db_pool.acquire()
+    except PoolTimeoutError as e:
+        print(f"Pool de conexões esgotado: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Banco de dados sobrecarregado, tente novamente",
+            headers={"Retry-After": "1"}
         )
-        print("Conexão com o banco de dados estabelecida com sucesso!")
-        return conn
     except Exception as e:
         error_msg = f"Erro ao conectar ao banco de dados: {e}"
         print(error_msg)
@@ -37,6 +92,23 @@ def get_db_connection():
             detail="Erro ao conectar ao banco de dados"
         )
 
+def get_read_connection(*keys):
+    """Conexão para consultas somente leitura: réplica quando disponível, senão o primário.
+
+    `keys` identifica os dados lidos (ex.: "tickets"); após uma escrita nessas chaves
+    (mark_primary_write, ou aviso de invalidação de outro worker) e quando o cliente
+    envia o LSN da sua última escrita, só são usadas réplicas que já receberam a escrita.
+    """
+    conn = replica_router.acquire(*keys)
+    return conn if conn is not None else get_db_connection()
+
+def mark_primary_write(conn, *keys):
+    """Registra, após o commit, que as chaves foram alteradas no primário.
+
+    O LSN também é devolvido ao cliente na resposta (ReadYourWritesMiddleware).
+    """
+    replica_router.mark_write(conn, *keys)
+
 def get_user_by_username(username: str):
     """Busca um usuário pelo nome de usuário."""
     # Tratando usuário master como caso especial
@@ -69,40 +141,38 @@ def get_user_by_username(username: str):
         user = cur.fetchone()
         print(f"Resultado da consulta para {username}: {user if user else 'Nenhum usuário encontrado'}")
         
-        # Fechar cursor e conexão
         cur.close()
-        conn.close()
-        
         return user
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = f"Erro ao buscar usuário: {e}"
         print(error_msg)
         
-        # Garantir que a conexão seja fechada em caso de erro
-        if conn is not None:
-            try:
-                conn.close()
-            except Exception as close_error:
-                print(f"Erro ao fechar conexão: {close_error}")
-        
         # Retornar erro HTTP
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao buscar usuário no banco de dados: {str(e)}"
         )
+    finally:
+        # Garantir que a conexão seja devolvida ao pool também em caso de erro
+        if conn is not None:
+            conn.close()
 
 def check_user_active(username: str):
     """Verifica se um usuário está ativo."""
     conn = get_db_connection()
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    cursor.execute(
-        "SELECT ativo FROM login WHERE usuario = %s",
-        (username,)
-    )
-    
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
-    
-    return result
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        cursor.execute(
+            "SELECT ativo FROM login WHERE usuario = %s",
+            (username,)
+        )
+        
+        result = cursor.fetchone()
+        cursor.close()
+        return result
+    finally:
+        # Devolve a conexão ao pool mesmo se a consulta falhar
+        conn.close()
@@ -1,5 +1,6 @@
 
 from pydantic import BaseModel
+from typing import Optional
 
 # Modelo para dados de login
 class UserLogin(BaseModel):
@@ -16,3 +17,11 @@ class User(BaseModel):
     id: str
     usuario: str
     isAdmin: bool
+
+# Modelo para renovação do token de acesso
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+# Modelo para logout (o refresh token, se enviado, também é revogado)
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
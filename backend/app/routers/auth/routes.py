@@ -6,16 +6,173 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 import json
 
-from .models import UserLogin, User
-from .security import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+
+from .models import UserLogin, User, RefreshRequest, LogoutRequest
+from .security import (
+    create_access_token, create_refresh_token, hash_refresh_token,
+    ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+)
 from .authentication import authenticate_user, get_current_user
-from .db import get_db_connection, check_user_active
+from .db import get_db_connection
+from app.services.health import require_diagnostics
+from app.services.ratelimit import rate_limit_ip
+from app.services.revocation import revocation_set, revoke_token
 
 router = APIRouter()
 
+# Um refresh token reapresentado logo após o uso (ex.: duas abas renovando juntas) é apenas
+# recusado; depois dessa janela a reutilização indica roubo e revoga toda a família
+REFRESH_REUSE_GRACE_SECONDS = 10
+
+def _issue_tokens(cur, user: dict, familia: Optional[str] = None) -> dict:
+    """Gera o token de acesso e grava um novo refresh token (na família informada, se houver)."""
+    access_token = create_access_token(
+        data={"sub": user["usuario"], "id": str(user["id"])},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token, token_hash = create_refresh_token()
+    cur.execute(
+        """
+        INSERT INTO refresh_tokens (token_hash, usuario_id, usuario, familia, expira_em)
+        VALUES (%s, %s, %s, COALESCE(%s::uuid, gen_random_uuid()), now() + make_interval(secs => %s))
+        """,
+        (psycopg2.Binary(token_hash), str(user["id"]), user["usuario"], familia, REFRESH_TOKEN_EXPIRE_DAYS * 86400)
+    )
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+def _issue_login_tokens(user: dict) -> dict:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        tokens = _issue_tokens(cur, user)
+        conn.commit()
+        cur.close()
+        return tokens
+    except Exception as e:
+        conn.rollback()
+        # Sem refresh token o cliente apenas volta a fazer login quando o token expirar
+        print(f"Erro ao gravar refresh token, login segue só com token de acesso: {e}")
+        return {
+            "access_token": create_access_token(
+                data={"sub": user["usuario"], "id": str(user["id"])},
+                expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            ),
+            "token_type": "bearer",
+            "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        }
+    finally:
+        conn.close()
+
+def _refresh_unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _rotate_refresh_token(refresh_token: str) -> dict:
+    """Troca o refresh token por um novo par de tokens, verificando se o usuário continua ativo."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(
+            """
+            SELECT r.id, r.usuario_id, r.usuario, r.familia::text AS familia,
+                   r.expira_em < now() AS expirado,
+                   r.revogado_em IS NOT NULL AS revogado,
+                   r.usado_em > now() - make_interval(secs => %s) AS usado_recentemente,
+                   r.usado_em IS NOT NULL AS usado,
+                   l.ativo, l.admin
+            FROM refresh_tokens r
+            LEFT JOIN login l ON l.usuario = r.usuario
+            WHERE r.token_hash = %s
+            FOR UPDATE OF r
+            """,
+            (REFRESH_REUSE_GRACE_SECONDS, psycopg2.Binary(hash_refresh_token(refresh_token)))
+        )
+        atual = cur.fetchone()
+        erro = None
+        if atual is None:
+            erro = "Refresh token inválido"
+        elif atual["revogado"] or (atual["usado"] and not atual["usado_recentemente"]):
+            # Reutilização de um token já trocado: revoga todos os tokens da família
+            cur.execute(
+                "UPDATE refresh_tokens SET revogado_em = now() WHERE familia = %s AND revogado_em IS NULL",
+                (atual["familia"],)
+            )
+            print(f"Refresh token reutilizado ou revogado para usuário: {atual['usuario']}")
+            erro = "Refresh token revogado"
+        elif atual["usado"]:
+            erro = "Refresh token já utilizado"
+        elif atual["expirado"]:
+            erro = "Refresh token expirado"
+        elif atual["ativo"] is not True:
+            cur.execute(
+                "UPDATE refresh_tokens SET revogado_em = now() WHERE familia = %s AND revogado_em IS NULL",
+                (atual["familia"],)
+            )
+            erro = "Usuário não está ativo"
+        if erro is not None:
+            conn.commit()
+            cur.close()
+            raise _refresh_unauthorized(erro)
+
+        cur.execute("UPDATE refresh_tokens SET usado_em = now() WHERE id = %s", (atual["id"],))
+        user = {"id": atual["usuario_id"], "usuario": atual["usuario"], "admin": atual["admin"]}
+        tokens = _issue_tokens(cur, user, atual["familia"])
+        conn.commit()
+        cur.close()
+        return {
+            "id": user["id"],
+            "usuario": user["usuario"],
+            "isAdmin": user.get("admin") or False,
+            **tokens
+        }
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _logout(current_user: dict, refresh_token: Optional[str]):
+    """Revoga o token de acesso atual e, se informado, a família do refresh token."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        revogacao = None
+        if current_user.get("jti") and current_user.get("exp"):
+            revogacao = revoke_token(cur, current_user["jti"], current_user["exp"])
+        if refresh_token:
+            cur.execute(
+                """
+                UPDATE refresh_tokens SET revogado_em = now()
+                WHERE revogado_em IS NULL AND usuario_id = %s AND familia = (
+                    SELECT familia FROM refresh_tokens WHERE token_hash = %s
+                )
+                """,
+                (str(current_user["id"]), psycopg2.Binary(hash_refresh_token(refresh_token)))
+            )
+        conn.commit()
+        cur.close()
+        return revogacao
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
 # Endpoint para verificar a conexão com o banco de dados
-@router.get("/db-test")
+# Consulta a tabela login: disponível apenas com diagnóstico habilitado
+@router.get("/db-test", dependencies=[Depends(require_diagnostics)])
 async def test_database_connection():
+    conn = None
     try:
         # Tentar conectar ao banco de dados
         conn = get_db_connection()
@@ -30,9 +187,6 @@ async def test_database_connection():
             cursor.execute("SELECT COUNT(*) as total_users FROM login")
             users_count = cursor.fetchone()
         
-        # Fechar conexão
-        conn.close()
-        
         # Retornar sucesso
         from .db import DB_HOST, DB_NAME
         return {
@@ -55,6 +209,9 @@ async def test_database_connection():
             "db_name": DB_NAME,
             "db_user": DB_USER
         }
+    finally:
+        if conn is not None:
+            conn.close()
 
 # Endpoint para verificação de sessão/usuário atual
 @router.get("/login")
@@ -69,27 +226,16 @@ async def verify_session(request: Request, current_user: dict = Depends(get_curr
         token_part = auth_header.replace('Bearer ', '')[:20] + '...' if auth_header else 'Não fornecido'
         print(f"Token (parcial): {token_part}")
         
-        # Consulta adicional para verificar se o usuário está ativo
-        result = check_user_active(current_user['usuario'])
-        
-        if result and result.get('ativo') is True:
-            # Usuário ativo, retornar informações
-            response = {
-                "id": current_user["id"],
-                "usuario": current_user["usuario"],
-                "isAdmin": current_user.get("admin", False),
-                "ativo": True
-            }
-            print(f"Sessão válida para: {current_user['usuario']}")
-            return response
-        else:
-            # Usuário inativo ou não encontrado
-            print(f"Sessão inválida: Usuário {current_user['usuario']} não está ativo")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Usuário não está ativo",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        # Usuários desativados têm os tokens revogados (verificado em memória por get_current_user),
+        # então a sessão não precisa mais consultar a tabela login
+        response = {
+            "id": current_user["id"],
+            "usuario": current_user["usuario"],
+            "isAdmin": current_user.get("admin", False),
+            "ativo": True
+        }
+        print(f"Sessão válida para: {current_user['usuario']}")
+        return response
     
     except Exception as e:
         import traceback
@@ -105,8 +251,8 @@ async def verify_session(request: Request, current_user: dict = Depends(get_curr
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-# Endpoint para login
-@router.post("/login")
+# Endpoint para login (limite próprio por IP, mais restrito que o das demais rotas)
+@router.post("/login", dependencies=[Depends(rate_limit_ip("login"))])
 async def login(request: Request, user_data: UserLogin):
     try:
         print(f"== NOVA TENTATIVA DE LOGIN ==")
@@ -126,12 +272,9 @@ async def login(request: Request, user_data: UserLogin):
         
         print(f"Usuário autenticado: {user_data.username}, gerando token")
         
-        # Gerar token JWT
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user["usuario"], "id": user["id"]},
-            expires_delta=access_token_expires
-        )
+        # Gerar token JWT e refresh token
+        tokens = await run_in_threadpool(_issue_login_tokens, user)
+        access_token = tokens["access_token"]
         
         # Log do token para debug
         token_part = access_token[:20] + '...' if access_token else 'Erro na geração do token'
@@ -142,8 +285,7 @@ async def login(request: Request, user_data: UserLogin):
             "id": user["id"],
             "usuario": user["usuario"],
             "isAdmin": user.get("admin", False),  # Usar get para evitar erro se admin não existir
-            "access_token": access_token,
-            "token_type": "bearer"
+            **tokens
         }
         
         print(f"Login bem-sucedido para: {user_data.username}")
@@ -161,3 +303,35 @@ async def login(request: Request, user_data: UserLogin):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro no processo de login: {str(e)}"
         )
+
+# Renovação do token de acesso: o refresh token é trocado por um novo a cada uso
+@router.post("/refresh", dependencies=[Depends(rate_limit_ip("login"))])
+async def refresh(dados: RefreshRequest):
+    try:
+        return await run_in_threadpool(_rotate_refresh_token, dados.refresh_token)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Erro ao renovar token: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao renovar token: {str(e)}"
+        )
+
+# Logout: revoga o token de acesso em uso (e o refresh token, se enviado) em todos os workers
+@router.post("/logout")
+async def logout(dados: Optional[LogoutRequest] = None, current_user: dict = Depends(get_current_user)):
+    try:
+        revogacao = await run_in_threadpool(_logout, current_user, dados.refresh_token if dados else None)
+        if revogacao is not None:
+            # Os demais workers recebem a revogação na próxima sincronização
+            revocation_set.apply([revogacao])
+        return {"message": "Logout realizado com sucesso"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Erro ao fazer logout: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao fazer logout: {str(e)}"
+        )
@@ -4,18 +4,21 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt, ExpiredSignatureError
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+import hashlib
 import os
-from dotenv import load_dotenv
+import secrets
+import time
 import traceback
-
-# Carregar variáveis de ambiente
-load_dotenv()
+import uuid
+from app import config  # Carrega as variáveis de ambiente (.env)
 
 # Configuração de segurança
 SECRET_KEY = os.getenv("SECRET_KEY", "chave_secreta_padrao_temporaria_nao_usar_em_producao")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))  # 24 horas
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))  # renovado pelo refresh token
+# Refresh tokens: opacos, guardados apenas como hash e trocados a cada uso
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
 # Contexto de criptografia para senhas
 pwd_context = CryptContext(
@@ -67,6 +70,10 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
+    # Identificador do token (revogação individual) e instante de emissão (revogação por usuário).
+    # iat em milissegundos: comparado com o instante da revogação, gravado com o mesmo relógio
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.setdefault("iat", round(time.time(), 3))
     
     # Só definir o campo "sub" se ele ainda não existir
     if "sub" not in to_encode:
@@ -93,6 +100,14 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
         traceback.print_exc()
         raise
 
+def create_refresh_token() -> Tuple[str, bytes]:
+    """Gera um refresh token opaco; retorna o token e o hash a ser gravado no banco."""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
+def hash_refresh_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
 def decode_token(token: str) -> Dict[str, Any]:
     """Decodifica e verifica um token JWT."""
     try:
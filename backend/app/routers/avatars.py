@@ -0,0 +1,41 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import RedirectResponse
+from app.services.avatars import (
+    AVATAR_CACHE_CONTROL, AVATAR_FORMAT, AVATAR_MEDIA_TYPE, AvatarNotFound, AvatarSourceError, avatar_service
+)
+
+router = APIRouter()
+
+# Miniatura do avatar de um atendente (URLs geradas nas listagens de tickets e atendentes)
+# Pública, pois é carregada por <img>; a chave é o hash da url_imagem cadastrada
+@router.get("/{tamanho}/{arquivo}")
+async def get_avatar(tamanho: int, arquivo: str, request: Request):
+    chave, _, extensao = arquivo.partition(".")
+    if extensao != AVATAR_FORMAT:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Avatar não encontrado")
+    etag = f'"{tamanho}-{chave}"'
+    # O conteúdo de uma URL nunca muda: basta a validação pelo ETag
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers={"ETag": etag, "Cache-Control": AVATAR_CACHE_CONTROL})
+    try:
+        dados = await avatar_service.get(chave, tamanho)
+    except AvatarNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Avatar não encontrado")
+    except AvatarSourceError as e:
+        print(f"Erro ao gerar avatar {chave}: {e}")
+        original = avatar_service.original_url(chave)
+        # Sem a miniatura, o navegador ainda pode carregar a imagem original
+        if original and original.startswith(("http://", "https://")):
+            return RedirectResponse(original, status_code=status.HTTP_302_FOUND,
+                                    headers={"Cache-Control": "no-store"})
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Erro ao carregar avatar: {str(e)}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao carregar avatar: {str(e)}"
+        )
+    return Response(content=dados, media_type=AVATAR_MEDIA_TYPE,
+                    headers={"ETag": etag, "Cache-Control": AVATAR_CACHE_CONTROL})
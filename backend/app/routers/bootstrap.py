@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from psycopg2.extras import RealDictCursor
+from .auth import get_read_connection, get_current_user
+from .etapas import query_etapas
+from .atendentes import query_atendentes
+from .tickets import query_tickets
+
+router = APIRouter()
+
+def _fetch_bootstrap(current_user: dict):
+    """Carrega sessão, etapas, atendentes e tickets com uma conexão e um único snapshot."""
+    conn = get_read_connection("tickets", "etapas", "atendentes")
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        # Todas as consultas enxergam o mesmo estado do banco (snapshot da transação)
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+
+        cur.execute("SELECT ativo FROM login WHERE usuario = %s", (current_user["usuario"],))
+        login = cur.fetchone()
+        if not login or login.get("ativo") is not True:
+            cur.close()
+            conn.close()
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Usuário não está ativo",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+        result = {
+            # Mesmo formato de GET /api/auth/login
+            "sessao": {
+                "id": current_user["id"],
+                "usuario": current_user["usuario"],
+                "isAdmin": current_user.get("admin", False),
+                "ativo": True
+            },
+            "etapas": query_etapas(cur),
+            "atendentes": query_atendentes(cur),
+            "tickets": query_tickets(cur),
+        }
+        conn.rollback()
+        cur.close()
+        conn.close()
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao carregar dados iniciais: {str(e)}"
+        )
+    finally:
+        conn.close()
+
+# Dados iniciais do dashboard em uma única requisição
+# Substitui as chamadas separadas a /auth/login, /etapas, /atendentes e /tickets ao carregar a página
+@router.get("/")
+async def bootstrap(current_user: dict = Depends(get_current_user)):
+    return await run_in_threadpool(_fetch_bootstrap, current_user)
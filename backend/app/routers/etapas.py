@@ -3,7 +3,11 @@ from typing import List, Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from pydantic import BaseModel
-from .auth import get_db_connection, oauth2_scheme, get_current_user
+from .auth import get_db_connection, get_read_connection, mark_primary_write, oauth2_scheme, get_current_user
+from app.services.singleflight import singleflight
+from app.services.cache import response_cache
+from app.services.invalidation import publish_invalidation
+from .tickets import TICKETS_CACHE_NAMESPACE
 
 router = APIRouter()
 
@@ -29,26 +33,37 @@ class Etapa(EtapaBase):
     data_atualizado: str
 
 # Listar todas as etapas
+# Rajadas de chamadas simultâneas (ex.: várias abas recarregando) compartilham uma única consulta
 @router.get("/")
 async def list_etapas(current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
+    return await _fetch_etapas()
+
+def query_etapas(cur):
+    """Consulta todas as etapas ordenadas por número no cursor informado."""
+    cur.execute("""
+        SELECT id, nome, numero, numero_sistema, cor, data_criado, data_atualizado
+        FROM etapas
+        ORDER BY numero
+    """)
+    return cur.fetchall()
+
+@singleflight("list_etapas")
+def _fetch_etapas():
+    """Consulta todas as etapas ordenadas por número."""
+    conn = get_read_connection("etapas")
     try:
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        cur.execute("""
-            SELECT id, nome, numero, numero_sistema, cor, data_criado, data_atualizado
-            FROM etapas
-            ORDER BY numero
-        """)
-        etapas = cur.fetchall()
+        etapas = query_etapas(cur)
         cur.close()
         conn.close()
         return etapas  # Retorna diretamente a lista, para compatibilidade com o frontend
     except Exception as e:
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao listar etapas: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Obter etapa por ID
 @router.get("/{etapa_id}")
@@ -72,12 +87,15 @@ async def get_etapa(etapa_id: str, current_user: dict = Depends(get_current_user
             )
             
         return etapa
+    except HTTPException:
+        raise
     except Exception as e:
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao buscar etapa: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Criar nova etapa
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -102,21 +120,27 @@ async def create_etapa(etapa: EtapaCreate, current_user: dict = Depends(get_curr
         """, (etapa.nome, etapa.numero, etapa.numero_sistema, etapa.cor))
         
         new_etapa = cur.fetchone()
+        # Tickets exibem nome e cor da etapa
+        publish_invalidation(cur, "etapas")
+        # Nenhuma linha de tickets muda: só as respostas em cache dos tickets
+        publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=[])
         conn.commit()
+        mark_primary_write(conn, "etapas", "tickets")
         cur.close()
         conn.close()
+        await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
         
         # Retorna a etapa completa para o frontend
         return new_etapa
     except HTTPException:
-        conn.close()
         raise
     except Exception as e:
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao criar etapa: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Atualizar etapa
 @router.put("/{etapa_id}")
@@ -173,20 +197,26 @@ async def update_etapa(etapa_id: str, etapa: EtapaUpdate, current_user: dict = D
         values.append(etapa_id)
         
         cur.execute(query, values)
+        # Tickets exibem nome e cor da etapa
+        publish_invalidation(cur, "etapas")
+        # Nenhuma linha de tickets muda: só as respostas em cache dos tickets
+        publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=[])
         conn.commit()
+        mark_primary_write(conn, "etapas", "tickets")
         cur.close()
         conn.close()
+        await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
         
         return {"message": "Etapa atualizada com sucesso"}
     except HTTPException:
-        conn.close()
         raise
     except Exception as e:
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao atualizar etapa: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Excluir etapa
 @router.delete("/{etapa_id}")
@@ -214,17 +244,23 @@ async def delete_etapa(etapa_id: str, current_user: dict = Depends(get_current_u
         
         # Excluir etapa
         cur.execute("DELETE FROM etapas WHERE id = %s", (etapa_id,))
+        # Tickets exibem nome e cor da etapa
+        publish_invalidation(cur, "etapas")
+        # Nenhuma linha de tickets muda: só as respostas em cache dos tickets
+        publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=[])
         conn.commit()
+        mark_primary_write(conn, "etapas", "tickets")
         cur.close()
         conn.close()
+        await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
         
         return {"message": "Etapa excluída com sucesso"}
     except HTTPException:
-        conn.close()
         raise
     except Exception as e:
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao excluir etapa: {str(e)}"
         )
+    finally:
+        conn.close()
@@ -0,0 +1,88 @@
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from .auth import get_current_user
+from app.services.arrival_cube import arrival_cube
+from app.services.queue_eta import ETA_SNAPSHOT_SECONDS, queue_estimator
+from app.services.sla import SLA_CRITICAL_MINUTES, SLA_ETAPAS, SLA_WARNING_MINUTES, sla_monitor
+
+router = APIRouter()
+
+def _cached_response(request: Request, etag: str, body: bytes, cache_control: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    # Telas que já têm a versão atual recebem apenas 304
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Posições e estimativa de espera de todos os tickets na fila, com estatísticas por setor/atendente
+# Servido da memória; nenhuma consulta ao banco por requisição
+@router.get("/eta")
+async def get_fila_eta(request: Request, current_user: dict = Depends(get_current_user)):
+    etag, body = queue_estimator.snapshot()
+    return _cached_response(request, etag, body, f"private, max-age={int(ETA_SNAPSHOT_SECONDS)}")
+
+# Posição e estimativa de um ticket
+@router.get("/eta/{ticket_id}")
+async def get_ticket_eta(ticket_id: str, current_user: dict = Depends(get_current_user)):
+    item = queue_estimator.ticket_eta(ticket_id)
+    if item is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Ticket com ID {ticket_id} não está na fila"
+        )
+    return item
+
+# Painel público (TVs da recepção): somente leitura, sem autenticação e sem dados pessoais
+# além do primeiro nome; pode ser cacheado por proxies
+@router.get("/painel")
+async def get_painel(request: Request):
+    etag, body = queue_estimator.snapshot(painel=True)
+    return _cached_response(request, etag, body, f"public, max-age={int(ETA_SNAPSHOT_SECONDS)}")
+
+# Tickets que já ultrapassaram os limites de SLA (calculado no servidor, em vez de cada tela
+# percorrer a lista de tickets)
+@router.get("/sla")
+async def get_sla(current_user: dict = Depends(get_current_user)):
+    return {
+        "limites_minutos": {"atencao": SLA_WARNING_MINUTES, "critico": SLA_CRITICAL_MINUTES},
+        "etapas": SLA_ETAPAS,
+        "em_violacao": sla_monitor.breaches(),
+        "ultimo_evento": sla_monitor.ultimo_seq,
+    }
+
+# Eventos de violação posteriores a `desde` (long polling: responde assim que houver
+# um evento novo ou após `espera` segundos)
+@router.get("/sla/eventos")
+async def get_sla_eventos(
+    desde: int = Query(0, ge=0),
+    espera: float = Query(25, ge=0, le=55),
+    current_user: dict = Depends(get_current_user)
+):
+    eventos = await sla_monitor.wait_events(desde, espera)
+    return {
+        "eventos": eventos,
+        "ultimo_evento": eventos[-1]["seq"] if eventos else max(desde, sla_monitor.ultimo_seq),
+    }
+
+# Mapas de calor de chegadas e atendimentos (dia da semana x hora) para planejamento de escala,
+# lidos do cubo pré-agregado: o custo depende do período, não do volume de tickets
+@router.get("/chegadas")
+async def get_chegadas(
+    inicio: Optional[date] = None,
+    fim: Optional[date] = None,
+    setor: Optional[str] = None,
+    tempo_atendimento: Optional[float] = Query(None, gt=0, le=480, description="minutos por ticket"),
+    current_user: dict = Depends(get_current_user)
+):
+    try:
+        return await arrival_cube.heatmap(inicio, fim, setor, tempo_atendimento)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao consultar chegadas: {str(e)}"
+        )
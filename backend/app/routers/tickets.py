@@ -1,11 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import os
-from datetime import datetime
+import re
+import io
+import csv
+import inspect
+import json
+import queue
+import threading
+import uuid
+from datetime import datetime, timedelta
 from pydantic import BaseModel
-from .auth import get_db_connection, oauth2_scheme, get_current_user
+from .auth import get_db_connection, get_read_connection, mark_primary_write, oauth2_scheme, get_current_user
+from app.services.cache import response_cache
+from app.services.avatars import avatar_service
+from app.services.idempotency import IDEMPOTENCY_HEADER, idempotency_store
+from app.services.invalidation import publish_invalidation
+from app.services.queue_eta import queue_estimator
+from app.services.sla import sla_monitor
+from app.services.group_commit import GroupCommitter
+from app.services.outbound_sync import enqueue_sync, outbound_sync
+from app.services.arrival_cube import schedule_fold
+from app.services.ticket_events import record_ticket_event, record_ticket_events, get_ticket_dwell_times, get_stage_dwell_stats
 
 router = APIRouter()
 
@@ -42,45 +63,473 @@ class Ticket(TicketBase):
     data_atualizado: datetime
     data_saida_etapa1: Optional[datetime] = None
 
+# Colunas retornadas pela API (a coluna search_vector é de uso interno da busca)
+TICKET_COLUMNS = """
+    id, nome, motivo, telefone, setor, user_ns, email_atendente, nome_atendente,
+    atendente_id, url_imagem_atendente, etapa_numero, numero_sistema,
+    data_criado, data_atualizado, data_saida_etapa1
+"""
+
+def _prefixed_columns(alias: str) -> str:
+    """Retorna TICKET_COLUMNS qualificadas com o alias da tabela."""
+    return ", ".join(f"{alias}.{col.strip()}" for col in TICKET_COLUMNS.split(","))
+
 # A função get_current_user foi movida para o módulo auth
 
-# Listar todos os tickets
+# Namespace do cache de respostas das listagens de tickets
+TICKETS_CACHE_NAMESPACE = "tickets"
+
+# Listar todos os tickets; com `horas`, apenas os abertos e os finalizados recentes
+# Respostas idênticas são compartilhadas pelo cache (TTL curto) e invalidadas a cada escrita
 @router.get("/")
-async def list_tickets(current_user: dict = Depends(get_current_user)):
-    conn = get_db_connection()
+async def list_tickets(
+    request: Request,
+    horas: Optional[float] = Query(None, gt=0, le=24 * 31, description="janela opcional dos tickets finalizados"),
+    current_user: dict = Depends(get_current_user)
+):
+    # Todos os usuários autenticados enxergam a mesma fila
+    return await response_cache.get_or_load(
+        TICKETS_CACHE_NAMESPACE,
+        scope="todos",
+        params=dict(request.query_params),
+        loader=lambda: run_in_threadpool(_fetch_tickets, horas),
+    )
+
+def query_tickets(cur, horas: Optional[float] = None):
+    """Consulta os tickets com dados da etapa e do atendente no cursor informado.
+
+    Sem `horas`, retorna todos os tickets. Com `horas`, apenas os que estão fora da
+    última etapa e os criados nesse período, usando os índices de etapa_numero e data_criado.
+    """
+    filtro, params = "", ()
+    if horas is not None:
+        # A última etapa vai como literal para o planejador estimar pelas estatísticas da coluna
+        cur.execute("SELECT COALESCE(MAX(numero), 0) AS ultima FROM etapas")
+        row = cur.fetchone()
+        ultima = row["ultima"] if row else 0
+        filtro = """
+        WHERE t.etapa_numero < %s
+           OR t.data_criado >= CURRENT_TIMESTAMP - make_interval(secs => %s)"""
+        params = (ultima, horas * 3600)
+    cur.execute("""
+        SELECT {ticket_columns}, e.nome as etapa_nome, e.cor as etapa_cor, 
+               a.nome as nome_atendente, a.email as email_atendente, a.url_imagem as url_imagem_atendente
+        FROM tickets t
+        LEFT JOIN etapas e ON t.etapa_numero = e.numero
+        LEFT JOIN atendentes a ON t.atendente_id = a.id{filtro}
+        ORDER BY 
+            CASE 
+                WHEN t.etapa_numero = 1 THEN 1
+                WHEN t.etapa_numero = 2 THEN 2
+                WHEN t.etapa_numero = 3 THEN 3
+                ELSE t.etapa_numero
+            END,
+            t.data_criado DESC
+    """.format(ticket_columns=_prefixed_columns("t"), filtro=filtro), params)
+    # Miniatura do avatar (url_imagem_atendente continua com a imagem original)
+    return avatar_service.add_urls(cur.fetchall(), "url_imagem_atendente", "url_avatar_atendente")
+
+def _fetch_tickets(horas: Optional[float] = None):
+    """Consulta os tickets com dados da etapa e do atendente."""
+    conn = get_read_connection("tickets")
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        tickets = query_tickets(cur, horas)
+        cur.close()
+        conn.close()
+        return tickets
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao listar tickets: {str(e)}"
+        )
+    finally:
+        conn.close()
+
+# Buscar tickets por nome, motivo, telefone ou user_ns
+# Usa o vetor de busca (GIN) e índices de trigramas criados em init-scripts/03-ticket-search.sql
+# (bancos existentes: migração 0007)
+@router.get("/search")
+async def search_tickets(
+    q: str = Query(..., min_length=2, max_length=200),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    termo = q.strip()
+    # Telefones são comparados apenas pelos dígitos
+    digitos = re.sub(r"\D", "", termo)
+    params = {
+        "q": termo,
+        "telefone": f"%{digitos}%" if len(digitos) >= 3 else None,
+        "limit": page_size,
+        "offset": (page - 1) * page_size,
+    }
+
+    conn = get_read_connection("tickets")
     try:
         cur = conn.cursor(cursor_factory=RealDictCursor)
         cur.execute("""
-            SELECT t.*, e.nome as etapa_nome, e.cor as etapa_cor, 
-                   a.nome as nome_atendente, a.email as email_atendente, a.url_imagem as url_imagem_atendente
+            WITH busca AS (
+                SELECT websearch_to_tsquery('portuguese', %(q)s) AS consulta
+            )
+            SELECT {ticket_columns}, e.nome as etapa_nome, e.cor as etapa_cor,
+                   a.nome as nome_atendente, a.email as email_atendente, a.url_imagem as url_imagem_atendente,
+                   ts_rank_cd(t.search_vector, busca.consulta)
+                       + word_similarity(%(q)s, t.nome)
+                       + word_similarity(%(q)s, coalesce(t.user_ns, '')) as relevancia,
+                   COUNT(*) OVER() as total
             FROM tickets t
+            CROSS JOIN busca
             LEFT JOIN etapas e ON t.etapa_numero = e.numero
             LEFT JOIN atendentes a ON t.atendente_id = a.id
-            ORDER BY 
-                CASE 
-                    WHEN t.etapa_numero = 1 THEN 1
-                    WHEN t.etapa_numero = 2 THEN 2
-                    WHEN t.etapa_numero = 3 THEN 3
-                    ELSE t.etapa_numero
-                END,
-                t.data_criado DESC
-        """)
-        tickets = cur.fetchall()
+            WHERE t.search_vector @@ busca.consulta
+               OR %(q)s <%% t.nome
+               OR %(q)s <%% t.user_ns
+               OR (%(telefone)s IS NOT NULL
+                   AND regexp_replace(coalesce(t.telefone, ''), '\\D', '', 'g') LIKE %(telefone)s)
+            ORDER BY relevancia DESC, t.data_criado DESC
+            LIMIT %(limit)s OFFSET %(offset)s
+        """.format(ticket_columns=_prefixed_columns("t")), params)
+        rows = cur.fetchall()
         cur.close()
         conn.close()
-        return tickets
+
+        total = rows[0]["total"] if rows else 0
+        for row in rows:
+            row.pop("total", None)
+        avatar_service.add_urls(rows, "url_imagem_atendente", "url_avatar_atendente")
+
+        return {
+            "items": rows,
+            "total": total,
+            "page": page,
+            "page_size": page_size
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao buscar tickets: {str(e)}"
+        )
+    finally:
+        conn.close()
+
+# Quantidade de linhas buscadas por ida ao banco durante a exportação
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+def _json_default(value):
+    """Serializa datas e demais tipos não suportados pelo json."""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+def _export_rows(conn, cur, formato: str):
+    """Gera o conteúdo da exportação em blocos, lendo do cursor nomeado (server-side)."""
+    try:
+        colunas = None
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+
+            if formato == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                if colunas is None:
+                    colunas = list(rows[0].keys())
+                    writer.writerow(colunas)
+                for row in rows:
+                    writer.writerow([_json_default(v) if v is not None else "" for v in row.values()])
+                yield buffer.getvalue()
+            else:
+                yield "".join(json.dumps(row, default=_json_default, ensure_ascii=False) + "\n" for row in rows)
+    except Exception as e:
+        print(f"Erro durante a exportação de tickets: {e}")
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+class _CopyQueueWriter:
+    """Objeto tipo arquivo que repassa os blocos do COPY para uma fila limitada."""
+
+    def __init__(self, fila: queue.Queue):
+        self.fila = fila
+
+    def write(self, data):
+        self.fila.put(data)
+        return len(data)
+
+def _export_copy(conn, sql: str):
+    """Gera a exportação CSV usando COPY ... TO STDOUT em uma thread auxiliar."""
+    fila = queue.Queue(maxsize=64)
+    fim = object()
+    erro = []
+
+    def executar_copy():
+        try:
+            cur = conn.cursor()
+            cur.copy_expert(sql, _CopyQueueWriter(fila))
+            cur.close()
+        except Exception as e:
+            print(f"Erro durante o COPY de tickets: {e}")
+            erro.append(e)
+        finally:
+            fila.put(fim)
+
+    thread = threading.Thread(target=executar_copy, daemon=True)
+    thread.start()
+    try:
+        while True:
+            bloco = fila.get()
+            if bloco is fim:
+                break
+            yield bloco.decode("utf-8") if isinstance(bloco, bytes) else bloco
+        if erro:
+            raise erro[0]
+    finally:
+        # Cliente desconectou no meio do COPY: cancelar e esvaziar a fila para liberar a thread
+        if thread.is_alive():
+            conn.cancel()
+            while fila.get() is not fim:
+                pass
+        thread.join()
+        conn.close()
+
+def _export_response(conn, gerador, media_type: str, headers: dict) -> StreamingResponse:
+    """Resposta de streaming que sempre devolve a conexão ao pool.
+
+    O gerador fecha a conexão no seu finally, mas só se chegar a ser iniciado: se o
+    cliente desconectar antes do primeiro bloco, a tarefa ao fim da resposta fecha.
+    """
+    def liberar():
+        if inspect.getgeneratorstate(gerador) == inspect.GEN_CREATED:
+            conn.close()
+        else:
+            gerador.close()
+    return StreamingResponse(gerador, media_type=media_type, headers=headers, background=BackgroundTask(liberar))
+
+# Exportar histórico de tickets em NDJSON ou CSV, sem carregar tudo em memória
+@router.get("/export")
+async def export_tickets(
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    data_inicio: Optional[datetime] = None,
+    data_fim: Optional[datetime] = None,
+    etapa: Optional[int] = None,
+    usar_copy: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if usar_copy and formato != "csv":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A exportação via COPY está disponível apenas no formato csv"
+        )
+
+    # Montar filtros dinamicamente
+    filtros = []
+    values = []
+
+    if data_inicio is not None:
+        filtros.append("t.data_criado >= %s")
+        values.append(data_inicio)
+
+    if data_fim is not None:
+        filtros.append("t.data_criado < %s")
+        values.append(data_fim)
+
+    if etapa is not None:
+        filtros.append("t.etapa_numero = %s")
+        values.append(etapa)
+
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+    query = f"""
+        SELECT {_prefixed_columns("t")}, e.nome as etapa_nome
+        FROM tickets t
+        LEFT JOIN etapas e ON t.etapa_numero = e.numero
+        {where}
+        ORDER BY t.data_criado
+    """
+
+    nome_arquivo = f"tickets_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{'csv' if formato == 'csv' else 'ndjson'}"
+    headers = {"Content-Disposition": f'attachment; filename="{nome_arquivo}"'}
+    media_type = "text/csv" if formato == "csv" else "application/x-ndjson"
+
+    conn = get_read_connection("tickets")
+    try:
+        if usar_copy:
+            cur = conn.cursor()
+            sql = cur.mogrify(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", values).decode("utf-8")
+            cur.close()
+            return _export_response(conn, _export_copy(conn, sql), media_type, headers)
+
+        # Cursor nomeado: as linhas ficam no servidor e são buscadas em blocos
+        cur = conn.cursor(name="export_tickets", cursor_factory=RealDictCursor)
+        cur.itersize = EXPORT_BATCH_SIZE
+        cur.execute(query, values)
+        return _export_response(conn, _export_rows(conn, cur, formato), media_type, headers)
     except Exception as e:
         conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erro ao listar tickets: {str(e)}"
+            detail=f"Erro ao exportar tickets: {str(e)}"
+        )
+
+# Tempo de permanência por etapa de um conjunto de tickets (a partir do histórico de eventos)
+@router.get("/tempos")
+async def get_tempos_etapa(
+    ids: List[uuid.UUID] = Query(...),
+    current_user: dict = Depends(get_current_user)
+):
+    if len(ids) > 500:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe no máximo 500 tickets por consulta"
+        )
+    try:
+        return await run_in_threadpool(get_ticket_dwell_times, [str(ticket_id) for ticket_id in ids])
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao calcular tempos por etapa: {str(e)}"
+        )
+
+# Estatísticas de permanência por etapa no período (padrão: últimos 30 dias)
+@router.get("/analytics/tempo-por-etapa")
+async def get_tempo_por_etapa(
+    data_inicio: Optional[datetime] = None,
+    data_fim: Optional[datetime] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    data_fim = data_fim or datetime.now().astimezone()
+    data_inicio = data_inicio or data_fim - timedelta(days=30)
+    try:
+        return await run_in_threadpool(get_stage_dwell_stats, data_inicio, data_fim)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao calcular estatísticas por etapa: {str(e)}"
+        )
+
+# Criação agrupada (group commit): criações concorrentes são gravadas com um único
+# INSERT de várias linhas, uma consulta de atendentes e um commit por lote
+def _insert_tickets(cur, pedidos: list) -> list:
+    """Insere os tickets dos pedidos (ticket, usuario) e retorna as linhas na mesma ordem."""
+    ids_atendentes = list({ticket.atendente_id.lower() for ticket, _ in pedidos if ticket.atendente_id})
+    atendentes = {}
+    if ids_atendentes:
+        cur.execute(
+            "SELECT id::text AS id, nome, email, url_imagem FROM atendentes WHERE id = ANY(%s::uuid[])",
+            (ids_atendentes,)
         )
+        atendentes = {row["id"]: row for row in cur.fetchall()}
+
+    linhas = []
+    for ticket, _ in pedidos:
+        atendente = atendentes.get(ticket.atendente_id.lower()) if ticket.atendente_id else None
+        linhas.append((
+            str(uuid.uuid4()), ticket.nome, ticket.motivo, ticket.telefone, ticket.setor, ticket.user_ns,
+            ticket.atendente_id, atendente and atendente["nome"], atendente and atendente["email"],
+            atendente and atendente["url_imagem"], ticket.etapa_numero
+        ))
+    # ids gerados aqui associam cada linha retornada ao seu pedido; clock_timestamp()
+    # mantém a ordem de chegada dentro do lote
+    criados = execute_values(
+        cur,
+        """
+        INSERT INTO tickets (id, nome, motivo, telefone, setor, user_ns, atendente_id,
+                             nome_atendente, email_atendente, url_imagem_atendente,
+                             etapa_numero, data_criado)
+        VALUES %s
+        RETURNING """ + TICKET_COLUMNS,
+        linhas,
+        template="(%s::uuid, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, clock_timestamp())",
+        page_size=len(linhas),
+        fetch=True
+    )
+    por_id = {str(row["id"]): row for row in criados}
+    novos = [por_id[linha[0]] for linha in linhas]
+
+    record_ticket_events(cur, [
+        (novo["id"], "criado", None, novo["etapa_numero"], novo["atendente_id"], usuario)
+        for novo, (_, usuario) in zip(novos, pedidos)
+    ])
+    # Agregação do cubo de chegadas: vai para a fila de jobs na mesma transação
+    schedule_fold(cur)
+    return novos
+
+def _create_tickets_batch(pedidos: list) -> list:
+    """Grava um lote de criações em uma transação; retorna um ticket (ou exceção) por pedido."""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            resultados = _insert_tickets(cur, pedidos)
+        except psycopg2.Error:
+            conn.rollback()
+            # Um pedido inválido não derruba o lote: cada um é refeito em seu próprio savepoint
+            resultados = []
+            for pedido in pedidos:
+                cur.execute("SAVEPOINT pedido")
+                try:
+                    resultados.extend(_insert_tickets(cur, [pedido]))
+                    cur.execute("RELEASE SAVEPOINT pedido")
+                except psycopg2.Error as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT pedido")
+                    resultados.append(e)
+        criados = [r["id"] for r in resultados if not isinstance(r, Exception)]
+        if criados:
+            publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=criados)
+        conn.commit()
+        mark_primary_write(conn, "tickets")
+        cur.close()
+        return resultados
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+async def _after_tickets_batch(novos: list):
+    for novo in novos:
+        queue_estimator.ticket_created(novo)
+        sla_monitor.ticket_created(novo)
+    await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
+
+ticket_ingestor = GroupCommitter("tickets", _create_tickets_batch, _after_tickets_batch)
 
 # Criar novo ticket
 @router.post("/", status_code=status.HTTP_201_CREATED)
-async def create_ticket(ticket: TicketCreate, current_user: dict = Depends(get_current_user)):
+async def create_ticket(
+    ticket: TicketCreate,
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
+):
+    # Retentativas com o mesmo Idempotency-Key recebem a resposta original sem criar outro ticket
+    idem = idempotency_store.request(current_user, "tickets.criar", idempotency_key, ticket.dict())
+    if idem is not None:
+        resposta = idem.cached()
+        if resposta is not None:
+            return resposta
+    elif ticket_ingestor.running:
+        # Sem chave de idempotência, a criação entra no próximo lote do group commit
+        try:
+            return await ticket_ingestor.submit((ticket, current_user.get("usuario")))
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Erro ao criar ticket: {str(e)}"
+            )
     conn = get_db_connection()
     try:
+        if idem is not None:
+            resposta = idem.claim(conn.cursor(cursor_factory=RealDictCursor))
+            if resposta is not None:
+                conn.rollback()
+                conn.close()
+                return resposta
+
         # Se um atendente_id foi fornecido, buscar informações do atendente
         nome_atendente = None
         email_atendente = None
@@ -103,42 +552,74 @@ async def create_ticket(ticket: TicketCreate, current_user: dict = Depends(get_c
                               nome_atendente, email_atendente, url_imagem_atendente, 
                               etapa_numero, data_criado)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-            RETURNING *
-            """,
+            RETURNING """ + TICKET_COLUMNS,
             (ticket.nome, ticket.motivo, ticket.telefone, ticket.setor, ticket.user_ns,
              ticket.atendente_id, nome_atendente, email_atendente, url_imagem_atendente,
              ticket.etapa_numero)
         )
         new_ticket = cur.fetchone()
+        record_ticket_event(
+            cur, new_ticket["id"], "criado",
+            etapa_numero=new_ticket["etapa_numero"],
+            atendente_id=new_ticket["atendente_id"],
+            usuario=current_user.get("usuario")
+        )
+        # Agregação do cubo de chegadas: vai para a fila de jobs na mesma transação
+        schedule_fold(cur)
+        if idem is not None:
+            idem.save(cur, status.HTTP_201_CREATED, new_ticket)
+        # Avisa os demais workers no commit
+        publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=[new_ticket["id"]])
         conn.commit()
+        mark_primary_write(conn, "tickets")
         cur.close()
         conn.close()
+        queue_estimator.ticket_created(new_ticket)
+        sla_monitor.ticket_created(new_ticket)
+        await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
         return new_ticket
     except Exception as e:
         conn.rollback()
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao criar ticket: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Atualizar ticket
 @router.put("/{ticket_id}")
 async def update_ticket(
     ticket_id: str, 
     ticket_update: TicketUpdate, 
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
 ):
+    # Retentativas com o mesmo Idempotency-Key recebem a resposta original sem repetir a transição
+    idem = idempotency_store.request(
+        current_user, "tickets.atualizar", idempotency_key,
+        {"ticket_id": ticket_id, **ticket_update.dict()}
+    )
+    if idem is not None:
+        resposta = idem.cached()
+        if resposta is not None:
+            return resposta
     conn = get_db_connection()
     try:
         cur = conn.cursor(cursor_factory=RealDictCursor)
+        if idem is not None:
+            resposta = idem.claim(cur)
+            if resposta is not None:
+                conn.rollback()
+                cur.close()
+                conn.close()
+                return resposta
         # Verificar se o ticket existe
         cur.execute("SELECT * FROM tickets WHERE id = %s", (ticket_id,))
         existing_ticket = cur.fetchone()
         
         if not existing_ticket:
             cur.close()
-            conn.close()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Ticket com ID {ticket_id} não encontrado"
@@ -205,22 +686,50 @@ async def update_ticket(
             return {"message": "Nenhum campo fornecido para atualização"}
             
         # Construir e executar query de update
-        query = f"UPDATE tickets SET {', '.join(update_fields)} WHERE id = %s RETURNING *"
+        query = f"UPDATE tickets SET {', '.join(update_fields)} WHERE id = %s RETURNING {TICKET_COLUMNS}"
         values.append(ticket_id)
         
         cur.execute(query, values)
         updated_ticket = cur.fetchone()
+        # Histórico de transições de etapa (mesma transação do update)
+        if updated_ticket["etapa_numero"] != existing_ticket["etapa_numero"]:
+            record_ticket_event(
+                cur, ticket_id, "etapa",
+                etapa_numero=updated_ticket["etapa_numero"],
+                etapa_anterior=existing_ticket["etapa_numero"],
+                atendente_id=updated_ticket["atendente_id"],
+                usuario=current_user.get("usuario")
+            )
+            schedule_fold(cur)
+        # Mudanças de etapa de tickets mapeados no sistema externo são enviadas em lote
+        mudou_etapa = updated_ticket["etapa_numero"] != existing_ticket["etapa_numero"]
+        mudou_numero = updated_ticket["numero_sistema"] != existing_ticket["numero_sistema"]
+        if updated_ticket["numero_sistema"] is not None and (mudou_etapa or mudou_numero):
+            enqueue_sync(cur, ticket_id)
+        if idem is not None:
+            idem.save(cur, status.HTTP_200_OK, updated_ticket)
+        # Avisa os demais workers no commit
+        publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=[ticket_id])
         conn.commit()
+        mark_primary_write(conn, "tickets")
         cur.close()
         conn.close()
+        outbound_sync.notify()
+        queue_estimator.ticket_updated(existing_ticket["etapa_numero"], updated_ticket)
+        sla_monitor.ticket_updated(existing_ticket["etapa_numero"], updated_ticket)
+        await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
         return updated_ticket
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao atualizar ticket: {str(e)}"
         )
+    finally:
+        conn.close()
 
 # Deletar ticket
 @router.delete("/{ticket_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -234,22 +743,31 @@ async def delete_ticket(ticket_id: str, current_user: dict = Depends(get_current
         
         if not existing_ticket:
             cur.close()
-            conn.close()
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Ticket com ID {ticket_id} não encontrado"
             )
             
-        # Deletar ticket
+        # Deletar ticket (o histórico é mantido e recebe o evento de remoção)
         cur.execute("DELETE FROM tickets WHERE id = %s", (ticket_id,))
+        record_ticket_event(cur, ticket_id, "removido", usuario=current_user.get("usuario"))
+        publish_invalidation(cur, TICKETS_CACHE_NAMESPACE, ids=[ticket_id])
         conn.commit()
+        mark_primary_write(conn, "tickets")
         cur.close()
         conn.close()
+        queue_estimator.ticket_removed(ticket_id)
+        sla_monitor.ticket_removed(ticket_id)
+        await response_cache.invalidate(TICKETS_CACHE_NAMESPACE)
         return None
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
-        conn.close()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro ao deletar ticket: {str(e)}"
         )
+    finally:
+        conn.close()
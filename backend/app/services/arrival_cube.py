@@ -0,0 +1,372 @@
+import asyncio
+import collections
+import os
+import time
+from datetime import date, timedelta
+from typing import Optional
+
+from psycopg2.extras import RealDictCursor
+from starlette.concurrency import run_in_threadpool
+
+from app.services.jobs import JOBS_ENABLED, enqueue_job, job_handler, job_queue
+
+# Cubo de chegadas e atendimentos por dia x hora x setor, para os mapas de calor de escala
+CUBE_ENABLED = os.getenv("CUBE_ENABLED", "true").lower() == "true"
+# Com a fila de jobs ligada, o cubo é agregado por jobs enfileirados pelas escritas de
+# tickets; sem ela, cada worker agrega periodicamente neste intervalo
+CUBE_INTERVAL_SECONDS = float(os.getenv("CUBE_INTERVAL_SECONDS", "30"))
+# Eventos agregados por transação (a carga inicial do histórico é feita em vários lotes)
+CUBE_BATCH = int(os.getenv("CUBE_BATCH", "20000"))
+# Eventos mais recentes que isso aguardam a próxima rodada: ids gravados por transações
+# ainda abertas podem ser confirmados fora de ordem
+CUBE_LAG_SECONDS = float(os.getenv("CUBE_LAG_SECONDS", "30"))
+# Fuso usado para o dia da semana e a hora do dia
+CUBE_TIMEZONE = os.getenv("CUBE_TIMEZONE", "America/Sao_Paulo")
+CUBE_DEFAULT_WEEKS = int(os.getenv("CUBE_DEFAULT_WEEKS", "12"))
+CUBE_MAX_DAYS = int(os.getenv("CUBE_MAX_DAYS", "730"))
+# Tempo médio de atendimento usado na sugestão de atendentes por hora
+CUBE_SERVICE_MINUTES = float(os.getenv("CUBE_SERVICE_MINUTES", "15"))
+
+# Etapa em que os tickets aguardam atendimento (a saída dela é o início do atendimento)
+ETAPA_FILA = 1
+DIAS_SEMANA = ["seg", "ter", "qua", "qui", "sex", "sab", "dom"]
+
+CUBE_JOB = "cubo.agregar"
+
+_FOLD_SQL = """
+    INSERT INTO tickets_cubo (dia, hora, setor, chegadas, atendimentos, espera_total, espera_max)
+    SELECT (ev.data_evento AT TIME ZONE %(tz)s)::date,
+           EXTRACT(HOUR FROM ev.data_evento AT TIME ZONE %(tz)s)::smallint,
+           COALESCE(t.setor, ''),
+           COUNT(*) FILTER (WHERE ev.tipo = 'criado'),
+           COUNT(*) FILTER (WHERE ev.tipo = 'etapa'),
+           COALESCE(SUM(EXTRACT(EPOCH FROM ev.data_evento - t.data_criado)) FILTER (WHERE ev.tipo = 'etapa'), 0),
+           COALESCE(MAX(EXTRACT(EPOCH FROM ev.data_evento - t.data_criado)) FILTER (WHERE ev.tipo = 'etapa'), 0)
+    FROM ticket_events ev
+    LEFT JOIN tickets t ON t.id = ev.ticket_id
+    WHERE ev.id > %(desde)s AND ev.id <= %(ate)s
+      AND (ev.tipo = 'criado'
+           OR (ev.tipo = 'etapa' AND ev.etapa_anterior = %(fila)s AND ev.etapa_numero <> %(fila)s))
+    GROUP BY 1, 2, 3
+    ON CONFLICT (dia, hora, setor) DO UPDATE SET
+        chegadas = tickets_cubo.chegadas + EXCLUDED.chegadas,
+        atendimentos = tickets_cubo.atendimentos + EXCLUDED.atendimentos,
+        espera_total = tickets_cubo.espera_total + EXCLUDED.espera_total,
+        espera_max = GREATEST(tickets_cubo.espera_max, EXCLUDED.espera_max)
+"""
+
+
+def fold_batch(conn, batch: int = CUBE_BATCH) -> Optional[int]:
+    """Agrega o próximo lote de ticket_events no cubo e avança a marca d'água.
+
+    Cubo e marca d'água mudam na mesma transação, então cada evento é contado uma vez.
+    Retorna o avanço da marca d'água (ids consumidos), ou None se outro worker está agregando.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT ultimo_evento FROM tickets_cubo_estado FOR UPDATE SKIP LOCKED")
+        row = cur.fetchone()
+        if row is None:
+            conn.rollback()
+            return None
+        desde = row[0]
+        cur.execute(
+            "SELECT max(id) FROM (SELECT id FROM ticket_events WHERE id > %s ORDER BY id LIMIT %s) lote",
+            (desde, batch)
+        )
+        ate = cur.fetchone()[0]
+        if ate is not None:
+            # Para no primeiro evento recente demais (ver CUBE_LAG_SECONDS)
+            cur.execute(
+                """
+                SELECT min(id) FROM ticket_events
+                WHERE id > %s AND id <= %s AND data_evento > now() - make_interval(secs => %s)
+                """,
+                (desde, ate, CUBE_LAG_SECONDS)
+            )
+            recente = cur.fetchone()[0]
+            if recente is not None:
+                ate = recente - 1
+        if ate is None or ate <= desde:
+            conn.rollback()
+            return 0
+        cur.execute(_FOLD_SQL, {"tz": CUBE_TIMEZONE, "desde": desde, "ate": ate, "fila": ETAPA_FILA})
+        cur.execute(
+            "UPDATE tickets_cubo_estado SET ultimo_evento = %s, atualizado_em = now()",
+            (ate,)
+        )
+        conn.commit()
+        return ate - desde
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def reset_cube(conn):
+    """Descarta o cubo para reconstruí-lo do início de ticket_events (ex.: troca de CUBE_TIMEZONE)."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT ultimo_evento FROM tickets_cubo_estado FOR UPDATE")
+        cur.execute("TRUNCATE tickets_cubo")
+        cur.execute("UPDATE tickets_cubo_estado SET ultimo_evento = 0, atualizado_em = now()")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _por_dia_semana(valores: "np.ndarray", dias_semana: "np.ndarray", fn) -> "np.ndarray":
+    """Aplica `fn` (eixo 0) aos dias de cada dia da semana; resultado 7 x 24."""
+    import numpy as np
+    resultado = np.zeros((7, 24))
+    for dia in range(7):
+        linhas = valores[dias_semana == dia]
+        if len(linhas):
+            resultado[dia] = fn(linhas)
+    return resultado
+
+
+def summarize(rows, inicio: date, fim: date, tempo_atendimento_min: float) -> dict:
+    """Mapas de calor 7 x 24 (dia da semana x hora) a partir das células do cubo no período.
+
+    Dias sem nenhuma célula contam como zero chegadas, para que médias e percentis
+    reflitam todos os dias do período.
+    """
+    # Importado ao montar os mapas de calor, não ao carregar o módulo (que os routers importam)
+    import numpy as np
+
+    n_dias = (fim - inicio).days + 1
+    chegadas = np.zeros((n_dias, 24))
+    atendimentos = np.zeros((n_dias, 24))
+    espera_total = np.zeros((n_dias, 24))
+    espera_max = np.zeros((n_dias, 24))
+    setores = collections.Counter()
+    if rows:
+        dia_idx = np.fromiter(((row["dia"] - inicio).days for row in rows), dtype=np.int64, count=len(rows))
+        hora = np.fromiter((row["hora"] for row in rows), dtype=np.int64, count=len(rows))
+        np.add.at(chegadas, (dia_idx, hora), np.fromiter((row["chegadas"] for row in rows), dtype=float))
+        np.add.at(atendimentos, (dia_idx, hora), np.fromiter((row["atendimentos"] for row in rows), dtype=float))
+        np.add.at(espera_total, (dia_idx, hora), np.fromiter((row["espera_total"] for row in rows), dtype=float))
+        np.maximum.at(espera_max, (dia_idx, hora), np.fromiter((row["espera_max"] for row in rows), dtype=float))
+        for row in rows:
+            setores[row["setor"]] += row["chegadas"]
+
+    # date.weekday(): 0 = segunda-feira
+    dias_semana = (np.arange(n_dias) + inicio.weekday()) % 7
+    ocorrencias = np.bincount(dias_semana, minlength=7)
+
+    def media(valores):
+        return _por_dia_semana(valores, dias_semana, lambda v: v.mean(axis=0))
+
+    def percentil(valores, p):
+        return _por_dia_semana(valores, dias_semana, lambda v: np.percentile(v, p, axis=0))
+
+    soma_atendimentos = _por_dia_semana(atendimentos, dias_semana, lambda v: v.sum(axis=0))
+    soma_espera = _por_dia_semana(espera_total, dias_semana, lambda v: v.sum(axis=0))
+    espera_media = np.divide(soma_espera, soma_atendimentos, out=np.zeros((7, 24)), where=soma_atendimentos > 0)
+    chegadas_p90 = percentil(chegadas, 90)
+    # Carga oferecida (chegadas por hora x tempo de atendimento), arredondada para cima
+    atendentes = np.ceil(chegadas_p90 * tempo_atendimento_min / 60)
+
+    def matriz(valores, casas=2):
+        return np.round(valores, casas).tolist()
+
+    return {
+        "inicio": inicio.isoformat(),
+        "fim": fim.isoformat(),
+        "dias": n_dias,
+        "fuso": CUBE_TIMEZONE,
+        "dias_semana": DIAS_SEMANA,
+        "ocorrencias_dia_semana": ocorrencias.tolist(),
+        "total_chegadas": int(chegadas.sum()),
+        "total_atendimentos": int(atendimentos.sum()),
+        # Chegadas no período por setor ("" = tickets sem setor)
+        "setores": dict(setores.most_common()),
+        # Matrizes [dia da semana][hora]
+        "chegadas": {
+            "media": matriz(media(chegadas)),
+            "p50": matriz(percentil(chegadas, 50)),
+            "p90": matriz(chegadas_p90),
+            "max": matriz(_por_dia_semana(chegadas, dias_semana, lambda v: v.max(axis=0)), 0),
+        },
+        "atendimentos": {
+            "media": matriz(media(atendimentos)),
+            "p90": matriz(percentil(atendimentos, 90)),
+        },
+        "espera_media_segundos": matriz(espera_media, 0),
+        "espera_max_segundos": matriz(_por_dia_semana(espera_max, dias_semana, lambda v: v.max(axis=0)), 0),
+        "tempo_atendimento_minutos": tempo_atendimento_min,
+        "atendentes_sugeridos": atendentes.astype(int).tolist(),
+    }
+
+
+def schedule_fold(cur):
+    """Agenda a agregação dos eventos de tickets gravados na transação do cursor.
+
+    O job roda após CUBE_LAG_SECONDS (eventos mais recentes ainda não são agregados) e
+    um único job pendente atende todas as escritas até lá.
+    """
+    if CUBE_ENABLED and JOBS_ENABLED:
+        enqueue_job(cur, CUBE_JOB, {}, delay_seconds=CUBE_LAG_SECONDS, unico=True)
+
+
+class ArrivalCube:
+    """Mantém o cubo tickets_cubo atualizado a partir de ticket_events.
+
+    Cada rodada agrega os eventos novos (id acima da marca d'água) em lotes; na primeira
+    execução isso carrega todo o histórico. Só um worker agrega por vez (SKIP LOCKED na
+    linha da marca d'água), os demais apenas pulam a rodada.
+
+    Com a fila de jobs, as rodadas são jobs CUBE_JOB: um na inicialização (histórico e
+    eventos gravados fora da API) e os agendados pelas escritas com schedule_fold.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.folded_at: Optional[float] = None
+        self.counters = collections.Counter()
+
+    async def start(self):
+        if not CUBE_ENABLED or self.task is not None:
+            return
+        if JOBS_ENABLED:
+            try:
+                await run_in_threadpool(self._schedule, 0)
+                job_queue.notify()
+            except Exception as e:
+                print(f"Erro ao agendar agregação do cubo de chegadas: {getattr(e, 'detail', e)}")
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+    def _fold_pending(self) -> int:
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        total = 0
+        try:
+            while True:
+                consumidos = fold_batch(conn)
+                if consumidos is None:
+                    self.counters["rodadas_puladas"] += 1
+                    return total
+                total += consumidos
+                if consumidos < CUBE_BATCH:
+                    return total
+        finally:
+            conn.close()
+
+    def _schedule(self, delay_seconds: float):
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            enqueue_job(cur, CUBE_JOB, {}, delay_seconds=delay_seconds, unico=True)
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+
+    def _pending_events(self) -> bool:
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT EXISTS (
+                    SELECT 1 FROM ticket_events
+                    WHERE id > (SELECT ultimo_evento FROM tickets_cubo_estado)
+                )
+            """)
+            pendentes = cur.fetchone()[0]
+            cur.close()
+            conn.commit()
+            return pendentes
+        finally:
+            conn.close()
+
+    def run_job(self, payload: dict):
+        """Handler de CUBE_JOB: agrega os eventos pendentes e reagenda se sobrarem eventos recentes."""
+        inicio = time.perf_counter()
+        eventos = self._fold_pending()
+        self.folded_at = time.time()
+        self.counters["rodadas"] += 1
+        self.counters["eventos"] += eventos
+        if eventos >= CUBE_BATCH:
+            print(f"Cubo de chegadas: {eventos} eventos agregados em {time.perf_counter() - inicio:.1f}s")
+        # Eventos dentro de CUBE_LAG_SECONDS (ou com outro worker agregando) ficam para o próximo job
+        if self._pending_events():
+            self._schedule(CUBE_LAG_SECONDS)
+
+    async def _run(self):
+        while True:
+            try:
+                inicio = time.perf_counter()
+                eventos = await run_in_threadpool(self._fold_pending)
+                self.folded_at = time.time()
+                self.counters["rodadas"] += 1
+                self.counters["eventos"] += eventos
+                if eventos >= CUBE_BATCH:
+                    print(f"Cubo de chegadas: {eventos} eventos agregados em {time.perf_counter() - inicio:.1f}s")
+            except Exception as e:
+                self.counters["erros"] += 1
+                print(f"Erro ao atualizar cubo de chegadas: {getattr(e, 'detail', e)}")
+            await asyncio.sleep(CUBE_INTERVAL_SECONDS)
+
+    def _load(self, inicio: date, fim: date, setor: Optional[str]):
+        from app.routers.auth.db import get_read_connection
+        conn = get_read_connection("tickets_cubo")
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            filtro = "" if setor is None else "AND setor = %(setor)s"
+            cur.execute(f"""
+                SELECT dia, hora, setor, chegadas, atendimentos, espera_total, espera_max
+                FROM tickets_cubo
+                WHERE dia BETWEEN %(inicio)s AND %(fim)s {filtro}
+            """, {"inicio": inicio, "fim": fim, "setor": setor})
+            rows = cur.fetchall()
+            cur.execute("SELECT ultimo_evento, atualizado_em FROM tickets_cubo_estado")
+            estado = cur.fetchone()
+            cur.close()
+            return rows, estado
+        finally:
+            conn.close()
+
+    async def heatmap(self, inicio: Optional[date], fim: Optional[date], setor: Optional[str],
+                      tempo_atendimento_min: Optional[float]) -> dict:
+        fim = fim or date.today()
+        inicio = inicio or fim - timedelta(weeks=CUBE_DEFAULT_WEEKS) + timedelta(days=1)
+        if inicio > fim:
+            raise ValueError("inicio deve ser anterior ou igual a fim")
+        if (fim - inicio).days + 1 > CUBE_MAX_DAYS:
+            raise ValueError(f"Período máximo de {CUBE_MAX_DAYS} dias")
+        rows, estado = await run_in_threadpool(self._load, inicio, fim, setor)
+        resultado = summarize(rows, inicio, fim, tempo_atendimento_min or CUBE_SERVICE_MINUTES)
+        resultado["setor"] = setor
+        resultado["atualizado_em"] = estado["atualizado_em"] if estado else None
+        return resultado
+
+    def stats(self) -> dict:
+        return {
+            "ativo": CUBE_ENABLED,
+            "modo": "jobs" if JOBS_ENABLED else "periodico",
+            "agregado_em": self.folded_at,
+            "contadores": dict(self.counters),
+        }
+
+
+arrival_cube = ArrivalCube()
+
+
+@job_handler(CUBE_JOB)
+def _agregar_cubo(payload: dict):
+    arrival_cube.run_job(payload)
@@ -0,0 +1,293 @@
+import collections
+import hashlib
+import io
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from starlette.concurrency import run_in_threadpool
+
+from app.services.singleflight import get_group
+
+# Proxy de avatares dos atendentes: miniaturas servidas com URLs imutáveis
+AVATAR_ENABLED = os.getenv("AVATAR_ENABLED", "true").lower() == "true"
+# http: baixa a url_imagem do atendente; local: lê o caminho da url_imagem em AVATAR_LOCAL_DIR
+AVATAR_SOURCE = os.getenv("AVATAR_SOURCE", "http")
+AVATAR_LOCAL_DIR = os.getenv("AVATAR_LOCAL_DIR", "./avatars")
+# Prefixo das URLs geradas (vazio = relativo ao mesmo host da API)
+AVATAR_BASE_URL = os.getenv("AVATAR_BASE_URL", "").rstrip("/")
+AVATAR_SIZE = int(os.getenv("AVATAR_SIZE", "96"))
+AVATAR_SIZES = sorted({int(n) for n in os.getenv("AVATAR_SIZES", "48,96,192").split(",") if n.strip()} | {AVATAR_SIZE})
+AVATAR_QUALITY = int(os.getenv("AVATAR_QUALITY", "80"))
+AVATAR_FETCH_TIMEOUT = float(os.getenv("AVATAR_FETCH_TIMEOUT", "5"))
+AVATAR_MAX_SOURCE_BYTES = int(os.getenv("AVATAR_MAX_SOURCE_BYTES", str(5 * 1024 * 1024)))
+AVATAR_MAX_SOURCE_PIXELS = int(os.getenv("AVATAR_MAX_SOURCE_PIXELS", str(40_000_000)))
+AVATAR_CACHE_DIR = os.getenv("AVATAR_CACHE_DIR", "/tmp/filasling-avatars")
+AVATAR_DISK_CACHE_MB = float(os.getenv("AVATAR_DISK_CACHE_MB", "200"))
+AVATAR_MEMORY_CACHE_MB = float(os.getenv("AVATAR_MEMORY_CACHE_MB", "16"))
+# Falhas ao buscar a origem não são repetidas antes disso
+AVATAR_ERROR_TTL_SECONDS = float(os.getenv("AVATAR_ERROR_TTL_SECONDS", "60"))
+# Chaves desconhecidas releem as imagens cadastradas no máximo uma vez neste intervalo;
+# até lá, respondem 404 sem consultar o banco
+AVATAR_RESOLVE_INTERVAL_SECONDS = float(os.getenv("AVATAR_RESOLVE_INTERVAL_SECONDS", "5"))
+
+# Muda quando o processamento muda, gerando URLs novas para os navegadores
+AVATAR_VERSION = "1"
+AVATAR_FORMAT = "webp"
+AVATAR_MEDIA_TYPE = "image/webp"
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class AvatarNotFound(Exception):
+    pass
+
+
+class AvatarSourceError(Exception):
+    pass
+
+
+def avatar_key(url: str) -> str:
+    return hashlib.sha256(f"{AVATAR_VERSION}\x00{url}".encode("utf-8")).hexdigest()[:24]
+
+
+class AvatarService:
+    """Gera e guarda miniaturas dos avatares.
+
+    A URL pública é derivada do hash da url_imagem (e da versão do processamento), então
+    pode ser montada nas listagens sem baixar nada e servida com cache imutável; trocar a
+    imagem de um atendente significa trocar a url_imagem, o que gera uma URL nova. Só são
+    buscadas imagens cadastradas em atendentes: a rota não é um proxy aberto.
+
+    Cache em dois níveis: memória (LRU limitado em bytes) e disco (limitado em bytes,
+    removendo os arquivos menos usados).
+    """
+
+    def __init__(self):
+        self.sources: Dict[str, str] = {}  # chave -> url_imagem
+        self.memory: "collections.OrderedDict[tuple, bytes]" = collections.OrderedDict()
+        self.memory_bytes = 0
+        self.disk_bytes: Optional[int] = None
+        self.errors: Dict[str, float] = {}
+        self.resolved_at = 0.0
+        self.lock = threading.Lock()
+        self.resolve_lock = threading.Lock()
+        self.counters = collections.Counter()
+
+    # -- URLs -----------------------------------------------------------------
+
+    def proxied(self, url: Optional[str]) -> bool:
+        if not AVATAR_ENABLED or not url:
+            return False
+        if AVATAR_SOURCE == "local":
+            return True
+        return urlparse(url).scheme in ("http", "https")
+
+    def url_for(self, url: Optional[str], tamanho: int = AVATAR_SIZE) -> Optional[str]:
+        """URL da miniatura; imagens que não passam pelo proxy mantêm a URL original."""
+        if not self.proxied(url):
+            return url
+        chave = avatar_key(url)
+        self.sources[chave] = url
+        return f"{AVATAR_BASE_URL}/api/avatars/{tamanho}/{chave}.{AVATAR_FORMAT}"
+
+    def add_urls(self, rows: List[dict], origem: str, destino: str) -> List[dict]:
+        """Acrescenta às linhas o campo `destino` com a URL da miniatura de `origem`."""
+        for row in rows:
+            if origem in row:
+                row[destino] = self.url_for(row[origem])
+        return rows
+
+    def _resolve(self, chave: str) -> Optional[str]:
+        url = self.sources.get(chave)
+        if url is not None:
+            return url
+        # Outro worker gerou a URL: procura entre as imagens cadastradas. Chaves inexistentes
+        # (ou inventadas) não disparam uma consulta por requisição
+        with self.resolve_lock:
+            url = self.sources.get(chave)
+            if url is not None or time.time() - self.resolved_at < AVATAR_RESOLVE_INTERVAL_SECONDS:
+                if url is None:
+                    self.counters["nao_encontrados_sem_consulta"] += 1
+                return url
+            from app.routers.auth.db import get_read_connection
+            conn = get_read_connection("atendentes")
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT DISTINCT url_imagem FROM atendentes WHERE url_imagem IS NOT NULL")
+                for (url_imagem,) in cur.fetchall():
+                    if self.proxied(url_imagem):
+                        self.sources[avatar_key(url_imagem)] = url_imagem
+                cur.close()
+            finally:
+                conn.close()
+            self.resolved_at = time.time()
+            self.counters["releituras_origens"] += 1
+        return self.sources.get(chave)
+
+    # -- origem e processamento -----------------------------------------------
+
+    def _read_source(self, url: str) -> bytes:
+        if AVATAR_SOURCE == "local":
+            base = os.path.realpath(AVATAR_LOCAL_DIR)
+            caminho = os.path.realpath(os.path.join(base, urlparse(url).path.lstrip("/")))
+            if not caminho.startswith(base + os.sep) or not os.path.isfile(caminho):
+                raise AvatarSourceError(f"arquivo não encontrado: {url}")
+            if os.path.getsize(caminho) > AVATAR_MAX_SOURCE_BYTES:
+                raise AvatarSourceError("imagem de origem grande demais")
+            with open(caminho, "rb") as f:
+                return f.read()
+        request = urllib.request.Request(url, headers={"User-Agent": "FilaSling-Avatares/1.0"})
+        try:
+            with urllib.request.urlopen(request, timeout=AVATAR_FETCH_TIMEOUT) as response:
+                dados = response.read(AVATAR_MAX_SOURCE_BYTES + 1)
+        except (urllib.error.URLError, OSError) as e:
+            raise AvatarSourceError(f"erro ao baixar {url}: {e}")
+        if len(dados) > AVATAR_MAX_SOURCE_BYTES:
+            raise AvatarSourceError("imagem de origem grande demais")
+        return dados
+
+    def _thumbnail(self, dados: bytes, tamanho: int) -> bytes:
+        # Importação adiada: o Pillow só é necessário ao gerar uma miniatura nova
+        from PIL import Image, ImageOps
+        try:
+            imagem = Image.open(io.BytesIO(dados))
+            largura, altura = imagem.size
+            if largura * altura > AVATAR_MAX_SOURCE_PIXELS:
+                raise AvatarSourceError("imagem de origem grande demais")
+            # JPEG: decodifica já reduzido (bem mais rápido para fotos grandes)
+            imagem.draft("RGB", (tamanho * 2, tamanho * 2))
+            imagem = ImageOps.exif_transpose(imagem)
+            imagem = imagem.convert("RGBA" if imagem.mode in ("RGBA", "LA", "P") else "RGB")
+            imagem = ImageOps.fit(imagem, (tamanho, tamanho), Image.LANCZOS)
+            saida = io.BytesIO()
+            imagem.save(saida, "WEBP", quality=AVATAR_QUALITY, method=4)
+            return saida.getvalue()
+        except AvatarSourceError:
+            raise
+        except Exception as e:
+            raise AvatarSourceError(f"imagem inválida: {e}")
+
+    # -- cache ----------------------------------------------------------------
+
+    def _disk_path(self, chave: str, tamanho: int) -> str:
+        return os.path.join(AVATAR_CACHE_DIR, f"{tamanho}-{chave}.{AVATAR_FORMAT}")
+
+    def _remember(self, item: tuple, dados: bytes):
+        with self.lock:
+            if item in self.memory:
+                self.memory.move_to_end(item)
+                return
+            self.memory[item] = dados
+            self.memory_bytes += len(dados)
+            while self.memory_bytes > AVATAR_MEMORY_CACHE_MB * 1024 * 1024 and len(self.memory) > 1:
+                _, antigo = self.memory.popitem(last=False)
+                self.memory_bytes -= len(antigo)
+
+    def _scan_disk(self) -> List[os.DirEntry]:
+        try:
+            return [e for e in os.scandir(AVATAR_CACHE_DIR) if e.is_file() and e.name.endswith(f".{AVATAR_FORMAT}")]
+        except FileNotFoundError:
+            return []
+
+    def _store_disk(self, chave: str, tamanho: int, dados: bytes):
+        os.makedirs(AVATAR_CACHE_DIR, exist_ok=True)
+        caminho = self._disk_path(chave, tamanho)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(dados)
+        os.replace(temporario, caminho)
+        with self.lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(e.stat().st_size for e in self._scan_disk())
+            else:
+                self.disk_bytes += len(dados)
+            excedeu = self.disk_bytes > AVATAR_DISK_CACHE_MB * 1024 * 1024
+        if excedeu:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Remove os arquivos menos usados (mtime é atualizado a cada leitura) até 90% do limite."""
+        arquivos = sorted(self._scan_disk(), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in arquivos)
+        alvo = AVATAR_DISK_CACHE_MB * 1024 * 1024 * 0.9
+        for entrada in arquivos:
+            if total <= alvo:
+                break
+            try:
+                tamanho = entrada.stat().st_size
+                os.remove(entrada.path)
+                total -= tamanho
+                self.counters["removidos_disco"] += 1
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.disk_bytes = total
+
+    def _load(self, chave: str, tamanho: int) -> bytes:
+        caminho = self._disk_path(chave, tamanho)
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            os.utime(caminho)
+            self.counters["disco"] += 1
+            return dados
+        except FileNotFoundError:
+            pass
+
+        falhou_em = self.errors.get(chave)
+        if falhou_em is not None and time.time() - falhou_em < AVATAR_ERROR_TTL_SECONDS:
+            raise AvatarSourceError("falha recente ao buscar a imagem de origem")
+        url = self._resolve(chave)
+        if url is None:
+            raise AvatarNotFound(chave)
+        try:
+            inicio = time.perf_counter()
+            dados = self._thumbnail(self._read_source(url), tamanho)
+        except AvatarSourceError:
+            self.errors[chave] = time.time()
+            self.counters["erros_origem"] += 1
+            raise
+        self.errors.pop(chave, None)
+        self.counters["geradas"] += 1
+        print(f"Avatar {chave} ({tamanho}px) gerado em {(time.perf_counter() - inicio) * 1000:.0f}ms: {len(dados)} bytes")
+        try:
+            self._store_disk(chave, tamanho, dados)
+        except OSError as e:
+            print(f"Erro ao gravar avatar no cache em disco: {e}")
+        return dados
+
+    async def get(self, chave: str, tamanho: int) -> bytes:
+        """Bytes da miniatura: memória, disco ou geração (chamadas simultâneas compartilham a geração)."""
+        if tamanho not in AVATAR_SIZES:
+            raise AvatarNotFound(chave)
+        item = (chave, tamanho)
+        with self.lock:
+            dados = self.memory.get(item)
+            if dados is not None:
+                self.memory.move_to_end(item)
+        if dados is not None:
+            self.counters["memoria"] += 1
+            return dados
+        dados = await get_group("avatares").do(item, lambda: run_in_threadpool(self._load, chave, tamanho))
+        self._remember(item, dados)
+        return dados
+
+    def original_url(self, chave: str) -> Optional[str]:
+        return self.sources.get(chave)
+
+    def stats(self) -> dict:
+        return {
+            "ativo": AVATAR_ENABLED,
+            "origem": AVATAR_SOURCE,
+            "memoria_itens": len(self.memory),
+            "memoria_bytes": self.memory_bytes,
+            "disco_bytes": self.disk_bytes,
+            "contadores": dict(self.counters),
+        }
+
+
+avatar_service = AvatarService()
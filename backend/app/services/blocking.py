@@ -0,0 +1,133 @@
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Optional
+
+# Modo de diagnóstico: detecta callbacks que bloqueiam o event loop (psycopg2, bcrypt, ...)
+BLOCKING_DETECTOR_ENABLED = os.getenv("BLOCKING_DETECTOR_ENABLED", "false").lower() == "true"
+BLOCKING_THRESHOLD_MS = float(os.getenv("BLOCKING_THRESHOLD_MS", "100"))
+BLOCKING_CHECK_INTERVAL_MS = float(os.getenv("BLOCKING_CHECK_INTERVAL_MS", "20"))
+BLOCKING_MAX_FINDINGS = int(os.getenv("BLOCKING_MAX_FINDINGS", "50"))
+
+# Escopo ASGI da requisição sendo processada por cada task
+_scopes_by_task: "weakref.WeakKeyDictionary[asyncio.Task, dict]" = weakref.WeakKeyDictionary()
+
+
+class RouteTrackingMiddleware:
+    """Middleware ASGI que associa cada task à requisição que ela está atendendo."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        task = asyncio.current_task()
+        _scopes_by_task[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _scopes_by_task.pop(task, None)
+
+
+def _route_name(scope: Optional[dict]) -> str:
+    if scope is None:
+        return "(fora de requisição)"
+    endpoint = scope.get("endpoint")
+    nome = getattr(endpoint, "__name__", None)
+    rota = f"{scope.get('method', '')} {scope.get('path', '')}"
+    return f"{rota} [{nome}]" if nome else rota
+
+
+class BlockingDetector:
+    """Mede o atraso do event loop e registra a pilha de quem o bloqueou.
+
+    Uma task no event loop atualiza um batimento a cada intervalo; uma thread
+    de vigilância percebe quando o batimento atrasa além do limite e captura,
+    nesse momento, a pilha da thread do event loop e a rota em execução.
+    """
+
+    def __init__(self, threshold_ms: float, interval_ms: float, max_findings: int):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.findings = collections.deque(maxlen=max_findings)
+        self.by_route = collections.Counter()
+        self.total = 0
+        self.max_lag = 0.0
+        self.last_tick = time.monotonic()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.tick_task: Optional[asyncio.Task] = None
+        self.stopped = threading.Event()
+        self.current: Optional[dict] = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self.stopped.clear()
+        self.tick_task = asyncio.create_task(self._tick())
+        threading.Thread(target=self._watch, name="blocking-detector", daemon=True).start()
+        print(f"Detector de bloqueio do event loop ativo (limite {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self.stopped.set()
+        if self.tick_task:
+            self.tick_task.cancel()
+            await asyncio.gather(self.tick_task, return_exceptions=True)
+
+    async def _tick(self):
+        while True:
+            self.last_tick = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _capture(self, atraso: float) -> dict:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        task = asyncio.tasks._current_tasks.get(self.loop)
+        return {
+            "rota": _route_name(_scopes_by_task.get(task) if task is not None else None),
+            "inicio": time.time() - atraso,
+            "duracao_ms": atraso * 1000,
+            "pilha": [linha.rstrip() for linha in stack[-15:]],
+        }
+
+    def _finish(self):
+        finding = self.current
+        self.current = None
+        self.total += 1
+        self.by_route[finding["rota"]] += 1
+        finding["duracao_ms"] = round(finding["duracao_ms"], 1)
+        self.findings.append(finding)
+        print(f"[bloqueio] event loop bloqueado por {finding['duracao_ms']} ms em {finding['rota']}\n" + "\n".join(finding["pilha"]))
+
+    def _watch(self):
+        while not self.stopped.wait(self.interval):
+            # Desconta o próprio intervalo do batimento
+            atraso = time.monotonic() - self.last_tick - self.interval
+            if atraso > self.threshold:
+                self.max_lag = max(self.max_lag, atraso)
+                if self.current is None:
+                    self.current = self._capture(atraso)
+                else:
+                    self.current["duracao_ms"] = atraso * 1000
+            elif self.current is not None:
+                self._finish()
+
+    def stats(self) -> dict:
+        return {
+            "ativo": self.tick_task is not None and not self.stopped.is_set(),
+            "limite_ms": self.threshold * 1000,
+            "total": self.total,
+            "maior_atraso_ms": round(self.max_lag * 1000, 1),
+            "por_rota": dict(self.by_route.most_common()),
+            "recentes": list(self.findings),
+        }
+
+
+blocking_detector = BlockingDetector(BLOCKING_THRESHOLD_MS, BLOCKING_CHECK_INTERVAL_MS, BLOCKING_MAX_FINDINGS)
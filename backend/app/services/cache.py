@@ -0,0 +1,160 @@
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from app.services.singleflight import get_group
+
+# Configurações do cache de respostas
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # memory ou redis
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "2"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_PREFIX = "filasling:cache"
+
+
+class MemoryBackend:
+    """Armazena as respostas no próprio processo, com expiração e limite de entradas."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: Dict[str, Tuple[float, bytes]] = {}
+        self.versions: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, body = entry
+        if expires < time.monotonic():
+            self.entries.pop(key, None)
+            return None
+        return body
+
+    async def set(self, key: str, body: bytes, ttl: float):
+        if len(self.entries) >= self.max_entries:
+            # Remover primeiro as entradas expiradas; se não bastar, a mais antiga
+            agora = time.monotonic()
+            for k in [k for k, (exp, _) in self.entries.items() if exp < agora]:
+                del self.entries[k]
+            if len(self.entries) >= self.max_entries:
+                self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (time.monotonic() + ttl, body)
+
+    async def get_version(self, namespace: str) -> int:
+        return self.versions.get(namespace, 0)
+
+    async def bump_version(self, namespace: str):
+        self.versions[namespace] = self.versions.get(namespace, 0) + 1
+
+
+class RedisBackend:
+    """Armazena as respostas em um Redis (ou compatível) compartilhado entre processos."""
+
+    def __init__(self, url: str):
+        import redis.asyncio as aioredis
+        self.client = aioredis.from_url(url)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(f"{CACHE_PREFIX}:{key}")
+
+    async def set(self, key: str, body: bytes, ttl: float):
+        await self.client.set(f"{CACHE_PREFIX}:{key}", body, px=max(int(ttl * 1000), 1))
+
+    async def get_version(self, namespace: str) -> int:
+        version = await self.client.get(f"{CACHE_PREFIX}:versao:{namespace}")
+        return int(version) if version else 0
+
+    async def bump_version(self, namespace: str):
+        await self.client.incr(f"{CACHE_PREFIX}:versao:{namespace}")
+
+
+def _create_backend():
+    """Cria o backend configurado, voltando para memória se o Redis não estiver disponível."""
+    if CACHE_BACKEND == "redis":
+        try:
+            backend = RedisBackend(REDIS_URL)
+            print(f"Cache de respostas usando Redis em {REDIS_URL}")
+            return backend
+        except ImportError:
+            print("Pacote 'redis' não instalado. Cache de respostas usando memória local.")
+    return MemoryBackend(CACHE_MAX_ENTRIES)
+
+
+class ResponseCache:
+    """Cache de respostas JSON com TTL curto, invalidação por namespace e coalescência de requisições."""
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.flight = get_group("response_cache")
+
+    async def _build_key(self, namespace: str, scope: str, params: dict) -> str:
+        # A versão do namespace entra na chave: invalidar é apenas incrementá-la
+        version = await self.backend.get_version(namespace)
+        params_key = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{namespace}:v{version}:{scope}:{params_key}"
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        scope: str,
+        params: dict,
+        loader: Callable[[], Awaitable],
+    ) -> Response:
+        """Retorna a resposta em cache ou executa o loader uma única vez para chamadas concorrentes."""
+        try:
+            key = await self._build_key(namespace, scope, params)
+            body = await self.backend.get(key)
+        except Exception as e:
+            # Falha no backend de cache não pode derrubar a requisição
+            print(f"Erro ao consultar cache '{namespace}': {e}")
+            data = await loader()
+            return Response(
+                content=json.dumps(jsonable_encoder(data), ensure_ascii=False).encode("utf-8"),
+                media_type="application/json",
+                headers={"X-Cache": "BYPASS"},
+            )
+
+        if body is not None:
+            return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+        async def load_and_store() -> bytes:
+            data = await loader()
+            encoded = json.dumps(jsonable_encoder(data), ensure_ascii=False).encode("utf-8")
+            try:
+                await self.backend.set(key, encoded, self.ttl)
+            except Exception as e:
+                print(f"Erro ao gravar cache '{namespace}': {e}")
+            return encoded
+
+        # Chamadas concorrentes com a mesma chave compartilham uma única consulta
+        body = await self.flight.do(key, load_and_store)
+        return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+    async def invalidate(self, namespace: str):
+        """Invalida imediatamente todas as respostas do namespace."""
+        try:
+            await self.backend.bump_version(namespace)
+        except Exception as e:
+            print(f"Erro ao invalidar cache '{namespace}': {e}")
+
+    @property
+    def shared(self) -> bool:
+        """Indica se o cache é compartilhado entre processos (Redis)."""
+        return not isinstance(self.backend, MemoryBackend)
+
+    async def invalidate_local(self, namespace: Optional[str] = None):
+        """Invalida o cache deste processo por aviso de outro worker (None = tudo)."""
+        if self.shared:
+            return
+        if namespace is None:
+            self.backend.entries.clear()
+        else:
+            await self.invalidate(namespace)
+
+
+response_cache = ResponseCache(_create_backend(), CACHE_TTL_SECONDS)
@@ -0,0 +1,162 @@
+import collections
+import threading
+import time
+from typing import Optional
+
+import psycopg2
+import psycopg2.extensions
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo limite."""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Conexão cujo close() devolve a conexão ao pool em vez de encerrá-la.
+
+    Assim o código existente (que sempre chama conn.close()) passa a reutilizar
+    conexões sem nenhuma alteração.
+    """
+
+    _pool = None
+    _idle_since = 0.0
+    # Devolvida ao pool: o objeto pode já estar com outro usuário (ou ocioso), então
+    # close()/rollback() repetidos não podem encerrá-lo nem desfazer a transação alheia
+    _released = False
+
+    def close(self):
+        if self._released:
+            return
+        pool = self._pool
+        if pool is None or self.closed:
+            return super().close()
+        self._pool = None
+        self._released = True
+        pool.release(self)
+
+    def rollback(self):
+        if self._released:
+            return
+        return super().rollback()
+
+    def commit(self):
+        if self._released:
+            raise psycopg2.InterfaceError("commit em conexão já devolvida ao pool")
+        return super().commit()
+
+
+class ConnectionPool:
+    """Pool de conexões thread-safe com limite de conexões simultâneas."""
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, max_idle_seconds: float, **connect_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_idle_seconds = max_idle_seconds
+        self.connect_kwargs = connect_kwargs
+        self.idle = collections.deque()
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(maxconn)
+        self.in_use = 0
+        self.waiting = 0
+        self.opened = 0
+        self.timeouts = 0
+        self.last_ok: Optional[float] = None
+
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.connect_kwargs)
+        with self.lock:
+            self.opened += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            psycopg2.extensions.connection.close(conn)
+        except Exception:
+            pass
+
+    def prefill(self):
+        """Abre antecipadamente as conexões mínimas do pool."""
+        while True:
+            with self.lock:
+                if len(self.idle) + self.in_use >= self.minconn:
+                    return
+            conn = self._connect()
+            conn._idle_since = time.monotonic()
+            with self.lock:
+                self.idle.append(conn)
+
+    def acquire(self) -> PooledConnection:
+        with self.lock:
+            self.waiting += 1
+        acquired = self.slots.acquire(timeout=self.timeout)
+        with self.lock:
+            self.waiting -= 1
+            if not acquired:
+                self.timeouts += 1
+        if not acquired:
+            raise PoolTimeoutError(f"Nenhuma conexão livre em {self.timeout}s (máximo {self.maxconn})")
+
+        try:
+            conn = None
+            agora = time.monotonic()
+            while conn is None:
+                with self.lock:
+                    candidate = self.idle.pop() if self.idle else None
+                if candidate is None:
+                    conn = self._connect()
+                elif candidate.closed or agora - candidate._idle_since > self.max_idle_seconds:
+                    # Conexões paradas por muito tempo podem ter sido encerradas pelo servidor
+                    self._discard(candidate)
+                else:
+                    conn = candidate
+        except Exception:
+            self.slots.release()
+            raise
+
+        conn._pool = self
+        conn._released = False
+        with self.lock:
+            self.in_use += 1
+        return conn
+
+    def release(self, conn: PooledConnection):
+        try:
+            if not conn.closed:
+                transaction_status = conn.info.transaction_status
+                if transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    self._discard(conn)
+                elif transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    psycopg2.extensions.connection.rollback(conn)
+            if not conn.closed:
+                conn._idle_since = time.monotonic()
+                with self.lock:
+                    self.idle.append(conn)
+                    # Conexão devolvida íntegra: o banco respondeu recentemente
+                    self.last_ok = time.time()
+        except Exception:
+            self._discard(conn)
+        finally:
+            with self.lock:
+                self.in_use -= 1
+            self.slots.release()
+
+    def closeall(self):
+        with self.lock:
+            conns = list(self.idle)
+            self.idle.clear()
+        for conn in conns:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "max": self.maxconn,
+                "em_uso": self.in_use,
+                "ociosas": len(self.idle),
+                "aguardando": self.waiting,
+                "abertas_total": self.opened,
+                "timeouts": self.timeouts,
+                "saturacao": round(self.in_use / self.maxconn, 3) if self.maxconn else 0,
+                "ultima_devolucao_ok": self.last_ok,
+            }
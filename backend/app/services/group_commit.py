@@ -0,0 +1,172 @@
+import asyncio
+import collections
+import os
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Agrupamento de escritas (group commit) na criação de tickets; desligado por padrão,
+# vale a pena apenas com integrações criando tickets em rajadas
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "false").lower() == "true"
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", "100"))
+INGEST_MAX_DELAY_MS = float(os.getenv("INGEST_MAX_DELAY_MS", "5"))
+INGEST_FLUSHERS = int(os.getenv("INGEST_FLUSHERS", "2"))
+
+
+class GroupCommitter:
+    """Agrupa escritas concorrentes em lotes gravados com uma única transação.
+
+    Cada chamador de submit() aguarda o resultado do seu próprio item. Um lote é gravado
+    quando atinge max_batch itens ou quando o primeiro item espera max_delay segundos;
+    itens que chegam enquanto um lote está sendo gravado formam o próximo lote.
+
+    write_batch(itens) roda em uma thread e retorna um resultado por item, na mesma
+    ordem; um resultado que seja uma exceção falha apenas o item correspondente.
+    after_commit(resultados) roda no event loop com os resultados bem-sucedidos.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        write_batch: Callable[[List[Any]], List[Any]],
+        after_commit: Optional[Callable[[List[Any]], Awaitable]] = None,
+        max_batch: int = INGEST_MAX_BATCH,
+        max_delay: float = INGEST_MAX_DELAY_MS / 1000,
+        flushers: int = INGEST_FLUSHERS,
+    ):
+        self.name = name
+        self.write_batch = write_batch
+        self.after_commit = after_commit
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay)
+        self.flushers = max(1, flushers)
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        self.pending = set()
+        self.lotes = 0
+        self.itens = 0
+        self.falhas = 0
+        self.maior_lote = 0
+        self.tamanhos = collections.deque(maxlen=1000)
+        self.latencias = collections.deque(maxlen=1000)
+
+    @property
+    def running(self) -> bool:
+        return bool(self.tasks)
+
+    async def start(self):
+        if self.tasks:
+            return
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._flusher()) for _ in range(self.flushers)]
+        print(f"Group commit '{self.name}' iniciado: lotes de até {self.max_batch} itens, "
+              f"espera máxima de {self.max_delay * 1000:.0f} ms")
+
+    async def stop(self):
+        """Encerra os flushers e grava o que ainda estiver na fila."""
+        if not self.tasks:
+            return
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await asyncio.gather(*self.pending, return_exceptions=True)
+        self.tasks = []
+        while not self.queue.empty():
+            lote = []
+            while not self.queue.empty() and len(lote) < self.max_batch:
+                lote.append(self.queue.get_nowait())
+            await self._flush(lote)
+
+    async def submit(self, item) -> Any:
+        """Enfileira o item e retorna o seu resultado depois do commit do lote."""
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        lote = [await self.queue.get()]
+        prazo = loop.time() + self.max_delay
+        try:
+            while len(lote) < self.max_batch:
+                try:
+                    lote.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                restante = prazo - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(await asyncio.wait_for(self.queue.get(), restante))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Encerramento: os itens voltam para a fila e são gravados por stop()
+            for entrada in lote:
+                self.queue.put_nowait(entrada)
+            raise
+        return lote
+
+    async def _flusher(self):
+        while True:
+            lote = await self._collect()
+            # shield: o encerramento não interrompe um lote já em gravação
+            task = asyncio.ensure_future(self._flush(lote))
+            self.pending.add(task)
+            task.add_done_callback(self.pending.discard)
+            await asyncio.shield(task)
+
+    async def _flush(self, lote: list):
+        itens = [item for item, _, _ in lote]
+        try:
+            resultados = await run_in_threadpool(self.write_batch, itens)
+        except Exception as e:
+            self.falhas += len(lote)
+            for _, future, _ in lote:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.lotes += 1
+        self.itens += len(lote)
+        self.maior_lote = max(self.maior_lote, len(lote))
+        self.tamanhos.append(len(lote))
+        sucesso = [r for r in resultados if not isinstance(r, Exception)]
+        if sucesso and self.after_commit is not None:
+            try:
+                await self.after_commit(sucesso)
+            except Exception as e:
+                print(f"Erro após gravar lote '{self.name}': {e}")
+
+        agora = time.perf_counter()
+        for (_, future, chegada), resultado in zip(lote, resultados):
+            self.latencias.append(agora - chegada)
+            # O chamador pode ter desistido (ex.: cliente desconectou); o item já foi gravado
+            if future.done():
+                continue
+            if isinstance(resultado, Exception):
+                self.falhas += 1
+                future.set_exception(resultado)
+            else:
+                future.set_result(resultado)
+
+    def stats(self) -> dict:
+        latencias = sorted(self.latencias)
+
+        def percentil(p: float):
+            if not latencias:
+                return None
+            return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000, 2)
+
+        return {
+            "ativo": self.running,
+            "lotes": self.lotes,
+            "itens": self.itens,
+            "falhas": self.falhas,
+            "na_fila": self.queue.qsize() if self.queue is not None else 0,
+            "maior_lote": self.maior_lote,
+            "lote_medio": round(sum(self.tamanhos) / len(self.tamanhos), 2) if self.tamanhos else None,
+            "latencia_ms": {"p50": percentil(0.5), "p99": percentil(0.99)},
+        }
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from typing import List, Optional
+
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+
+# Configurações das sondas de saúde (liveness/readiness)
+HEALTH_HEARTBEAT_SECONDS = float(os.getenv("HEALTH_HEARTBEAT_SECONDS", "10"))
+HEALTH_MAX_QUERY_AGE_SECONDS = float(os.getenv("HEALTH_MAX_QUERY_AGE_SECONDS", "30"))
+HEALTH_LOOP_LAG_INTERVAL = float(os.getenv("HEALTH_LOOP_LAG_INTERVAL", "0.5"))
+HEALTH_MAX_LOOP_LAG_SECONDS = float(os.getenv("HEALTH_MAX_LOOP_LAG_SECONDS", "1"))
+
+# Diagnósticos que abrem conexões e consultam o catálogo só ficam disponíveis com esta flag
+DIAGNOSTICS_ENABLED = os.getenv("DIAGNOSTICS_ENABLED", "false").lower() == "true"
+DIAGNOSTICS_TOKEN = os.getenv("DIAGNOSTICS_TOKEN", "")
+
+
+def require_diagnostics(request: Request):
+    """Dependência que libera os endpoints de diagnóstico pesados apenas para administradores."""
+    token = request.headers.get("x-diagnostics-token", "")
+    if DIAGNOSTICS_ENABLED or (DIAGNOSTICS_TOKEN and token == DIAGNOSTICS_TOKEN):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Diagnóstico do banco desabilitado (DIAGNOSTICS_ENABLED ou X-Diagnostics-Token)"
+    )
+
+
+class HealthMonitor:
+    """Mantém em memória o estado usado pelas sondas, sem abrir conexões por requisição."""
+
+    def __init__(self):
+        self.tasks: List[asyncio.Task] = []
+        self.last_query_ok: Optional[float] = None
+        self.last_query_error: Optional[str] = None
+        self.loop_lag = 0.0
+        self.loop_lag_max = 0.0
+
+    async def start(self):
+        if self.tasks:
+            return
+        self.tasks = [
+            asyncio.create_task(self._heartbeat()),
+            asyncio.create_task(self._measure_loop_lag()),
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def _ping(self):
+        # Usa uma conexão do pool; nenhuma conexão nova é aberta pela sonda
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            cur.close()
+        finally:
+            conn.close()
+
+    async def _heartbeat(self):
+        while True:
+            try:
+                await run_in_threadpool(self._ping)
+                self.last_query_ok = time.time()
+                self.last_query_error = None
+            except Exception as e:
+                self.last_query_error = str(getattr(e, "detail", e))
+            await asyncio.sleep(HEALTH_HEARTBEAT_SECONDS)
+
+    async def _measure_loop_lag(self):
+        # O atraso para acordar de um sleep mede quanto o event loop ficou bloqueado
+        while True:
+            inicio = time.monotonic()
+            await asyncio.sleep(HEALTH_LOOP_LAG_INTERVAL)
+            self.loop_lag = max(0.0, time.monotonic() - inicio - HEALTH_LOOP_LAG_INTERVAL)
+            self.loop_lag_max = max(self.loop_lag_max * 0.9, self.loop_lag)
+
+    def liveness(self) -> dict:
+        return {
+            "status": "ok",
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "loop_lag_max_ms": round(self.loop_lag_max * 1000, 1),
+        }
+
+    def readiness(self) -> dict:
+        from app.routers.auth.db import db_pool
+        from app.services.warmup import warmup_state
+
+        pool = db_pool.stats()
+        ultima_consulta = max(filter(None, [self.last_query_ok, pool["ultima_devolucao_ok"]]), default=None)
+        idade_consulta = time.time() - ultima_consulta if ultima_consulta else None
+
+        checks = {
+            "aquecido": warmup_state.ready,
+            "banco": idade_consulta is not None and idade_consulta <= HEALTH_MAX_QUERY_AGE_SECONDS,
+            "pool": not (pool["em_uso"] >= pool["max"] and pool["aguardando"] > 0),
+            "event_loop": self.loop_lag <= HEALTH_MAX_LOOP_LAG_SECONDS,
+        }
+        return {
+            "ready": all(checks.values()),
+            "checks": checks,
+            "ultima_consulta_ok_ha_segundos": round(idade_consulta, 3) if idade_consulta is not None else None,
+            "ultimo_erro_banco": self.last_query_error,
+            "pool": pool,
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+        }
+
+
+health_monitor = HealthMonitor()
@@ -0,0 +1,214 @@
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from psycopg2.extras import Json
+from starlette.concurrency import run_in_threadpool
+
+# Chaves de idempotência (header Idempotency-Key) das escritas de tickets
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_CACHE_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_ENTRIES", "2048"))
+IDEMPOTENCY_CLEANUP_SECONDS = float(os.getenv("IDEMPOTENCY_CLEANUP_SECONDS", "600"))
+IDEMPOTENCY_CLEANUP_BATCH = int(os.getenv("IDEMPOTENCY_CLEANUP_BATCH", "1000"))
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def _json_bytes(data) -> bytes:
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False).encode("utf-8")
+
+
+class IdempotentRequest:
+    """Uma escrita identificada por (usuário, rota, Idempotency-Key).
+
+    A chave é guardada apenas como hash de 16 bytes; o fingerprint (hash dos parâmetros)
+    detecta a reutilização da mesma chave para uma requisição diferente.
+    """
+
+    def __init__(self, store: "IdempotencyStore", usuario: str, rota: str, chave: str, parametros):
+        self.store = store
+        self.rota = rota
+        self.chave = hashlib.sha256(f"{usuario}\x00{rota}\x00{chave}".encode("utf-8")).digest()[:16]
+        self.fingerprint = hashlib.sha256(_json_bytes(parametros)).digest()[:16]
+
+    def _replay(self, status_code: int, body: bytes) -> Response:
+        self.store.counters[self.rota]["repeticoes"] += 1
+        return Response(
+            content=body,
+            status_code=status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    def _mismatch(self) -> Response:
+        self.store.counters[self.rota]["conflitos"] += 1
+        return Response(
+            content=_json_bytes({"detail": f"{IDEMPOTENCY_HEADER} já utilizada em uma requisição diferente"}),
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            media_type="application/json",
+        )
+
+    def cached(self) -> Optional[Response]:
+        """Resposta já conhecida por este worker (sem consultar o banco)."""
+        entry = self.store.recent.get(self.chave)
+        if entry is None:
+            return None
+        expira, fingerprint, status_code, body = entry
+        if expira < time.time():
+            self.store.recent.pop(self.chave, None)
+            return None
+        self.store.recent.move_to_end(self.chave)
+        self.store.counters[self.rota]["respondidas_da_memoria"] += 1
+        if fingerprint != self.fingerprint:
+            return self._mismatch()
+        return self._replay(status_code, body)
+
+    def claim(self, cur) -> Optional[Response]:
+        """Reserva a chave na transação da escrita (cursor RealDictCursor).
+
+        Retorna None quando a escrita deve prosseguir; caso contrário, a resposta a devolver
+        (a resposta original ou 422 se a chave foi usada com outros parâmetros). Se outra
+        requisição com a mesma chave ainda estiver em andamento, o INSERT aguarda o commit dela.
+        """
+        cur.execute(
+            """
+            INSERT INTO idempotency_keys (chave, rota, fingerprint, expira_em)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+            ON CONFLICT (chave) DO UPDATE
+              SET rota = EXCLUDED.rota, fingerprint = EXCLUDED.fingerprint,
+                  status_code = NULL, resposta = NULL, expira_em = EXCLUDED.expira_em
+              WHERE idempotency_keys.expira_em < CURRENT_TIMESTAMP
+            RETURNING chave
+            """,
+            (self.chave, self.rota, self.fingerprint, IDEMPOTENCY_TTL_HOURS * 3600)
+        )
+        if cur.fetchone() is not None:
+            return None
+
+        cur.execute(
+            """
+            SELECT fingerprint, status_code, resposta, EXTRACT(EPOCH FROM expira_em)::float AS expira
+            FROM idempotency_keys WHERE chave = %s
+            """,
+            (self.chave,)
+        )
+        row = cur.fetchone()
+        fingerprint = bytes(row["fingerprint"])
+        if fingerprint != self.fingerprint:
+            return self._mismatch()
+        body = _json_bytes(row["resposta"])
+        self.store.remember(self.chave, row["expira"], fingerprint, row["status_code"], body)
+        return self._replay(row["status_code"], body)
+
+    def save(self, cur, status_code: int, resposta):
+        """Grava a resposta na mesma transação da escrita (confirmadas ou descartadas juntas)."""
+        cur.execute(
+            "UPDATE idempotency_keys SET status_code = %s, resposta = %s WHERE chave = %s",
+            (status_code, Json(jsonable_encoder(resposta)), self.chave)
+        )
+
+
+class IdempotencyStore:
+    """Chaves de idempotência no banco (válidas entre workers e reinícios) com um LRU local.
+
+    Registros expirados são ignorados na reserva e removidos em lotes por uma tarefa periódica.
+    """
+
+    def __init__(self):
+        self.recent = collections.OrderedDict()  # chave -> (expira, fingerprint, status_code, body)
+        self.counters = collections.defaultdict(collections.Counter)
+        self.removidas = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def request(self, current_user: dict, rota: str, chave: Optional[str], parametros) -> Optional[IdempotentRequest]:
+        if chave is None:
+            self.counters[rota]["sem_chave"] += 1
+            return None
+        chave = chave.strip()
+        if not chave or len(chave) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{IDEMPOTENCY_HEADER} deve ter entre 1 e {MAX_KEY_LENGTH} caracteres"
+            )
+        self.counters[rota]["com_chave"] += 1
+        return IdempotentRequest(self, current_user.get("usuario") or "", rota, chave, parametros)
+
+    def remember(self, chave: bytes, expira: float, fingerprint: bytes, status_code: int, body: bytes):
+        self.recent[chave] = (expira, fingerprint, status_code, body)
+        self.recent.move_to_end(chave)
+        while len(self.recent) > IDEMPOTENCY_CACHE_ENTRIES:
+            self.recent.popitem(last=False)
+
+    async def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def _cleanup(self) -> int:
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            total = 0
+            # Lotes pequenos para não segurar bloqueios nem gerar uma transação longa
+            while True:
+                cur.execute(
+                    """
+                    DELETE FROM idempotency_keys
+                    WHERE chave IN (
+                        SELECT chave FROM idempotency_keys
+                        WHERE expira_em < CURRENT_TIMESTAMP
+                        LIMIT %s
+                    )
+                    """,
+                    (IDEMPOTENCY_CLEANUP_BATCH,)
+                )
+                removidas = cur.rowcount
+                conn.commit()
+                total += removidas
+                if removidas < IDEMPOTENCY_CLEANUP_BATCH:
+                    break
+            cur.close()
+            return total
+        finally:
+            conn.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_CLEANUP_SECONDS)
+            try:
+                self.removidas += await run_in_threadpool(self._cleanup)
+            except Exception as e:
+                print(f"Erro ao remover chaves de idempotência expiradas: {getattr(e, 'detail', e)}")
+
+    def stats(self) -> dict:
+        rotas = {}
+        for rota, contadores in self.counters.items():
+            com_chave = contadores["com_chave"]
+            rotas[rota] = {
+                **contadores,
+                # Fração das requisições com chave que eram retentativas
+                "taxa_repeticao": round(contadores["repeticoes"] / com_chave, 4) if com_chave else None,
+            }
+        return {
+            "ttl_horas": IDEMPOTENCY_TTL_HOURS,
+            "em_memoria": len(self.recent),
+            "expiradas_removidas": self.removidas,
+            "rotas": rotas,
+        }
+
+
+idempotency_store = IdempotencyStore()
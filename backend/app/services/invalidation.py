@@ -0,0 +1,251 @@
+import asyncio
+import collections
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Iterable, Optional
+
+import psycopg2
+import psycopg2.extensions
+from starlette.concurrency import run_in_threadpool
+
+from app.services.cache import response_cache
+
+# Barramento de invalidação entre workers via LISTEN/NOTIFY do Postgres
+INVALIDATION_BUS_ENABLED = os.getenv("INVALIDATION_BUS_ENABLED", "true").lower() == "true"
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "filasling_invalidacao")
+INVALIDATION_RETRY_SECONDS = float(os.getenv("INVALIDATION_RETRY_SECONDS", "5"))
+# Avisos levam os ids alterados (até este limite; o payload do NOTIFY tem no máximo 8000 bytes)
+INVALIDATION_MAX_IDS = int(os.getenv("INVALIDATION_MAX_IDS", "100"))
+
+
+def publish_invalidation(cur, *namespaces: str, ids: Optional[Iterable] = None):
+    """Publica a invalidação dos namespaces na transação do cursor.
+
+    O NOTIFY só é entregue aos outros workers no commit (e descartado no rollback).
+    A versão é o id da transação que fez a escrita. `ids` identifica os registros
+    alterados, para quem escuta atualizar só esses registros; sem ids (ou com ids
+    demais) o aviso vale para o namespace inteiro.
+    """
+    if not INVALIDATION_BUS_ENABLED:
+        return
+    ids = [str(i) for i in ids] if ids is not None else None
+    if ids is not None and len(ids) > INVALIDATION_MAX_IDS:
+        ids = None
+    for namespace in namespaces:
+        cur.execute(
+            """
+            SELECT pg_notify(%s, json_build_object(
+                'ns', %s::text,
+                'v', txid_current(),
+                'origem', %s::text,
+                'ts', extract(epoch FROM clock_timestamp()),
+                'ids', %s::json
+            )::text)
+            """,
+            (INVALIDATION_CHANNEL, namespace, invalidation_bus.origin,
+             json.dumps(ids) if ids is not None else None)
+        )
+
+
+class InvalidationBus:
+    """Escuta as invalidações publicadas pelos outros workers e as aplica ao cache local.
+
+    Garantia de atraso máximo: com o barramento conectado, uma escrita deixa de ser
+    servida do cache assim que o aviso chega (ver latências em stats()); com o
+    barramento desconectado, as entradas expiram pelo TTL do cache, e todo o cache
+    local é descartado a cada (re)conexão, pois avisos podem ter sido perdidos.
+    """
+
+    def __init__(self):
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.conn = None
+        self.task: Optional[asyncio.Task] = None
+        self.lost: Optional[asyncio.Future] = None
+        self.pending = set()
+        self.latencies = collections.deque(maxlen=500)
+        self.counters = collections.Counter()
+        self.last_versions = {}
+        self.connected_since: Optional[float] = None
+        self.listeners = collections.defaultdict(list)
+        # Namespaces alterados por outros workers aguardando o LSN do primário (réplicas)
+        self.lsn_pending = set()
+        self.lsn_task: Optional[asyncio.Task] = None
+
+    def subscribe(self, namespace: str, callback):
+        """Registra um callback (no event loop) para avisos de outros workers no namespace.
+
+        O callback recebe o namespace e os ids alterados (None quando o aviso vale para
+        o namespace inteiro, inclusive a cada reconexão).
+        """
+        self.listeners[namespace].append(callback)
+
+    async def start(self):
+        if not INVALIDATION_BUS_ENABLED or self.task is not None:
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, *self.pending, return_exceptions=True)
+        self.task = None
+
+    def _connect(self):
+        from app.routers.auth.db import db_pool
+        # NOTIFY só existe no primário; keepalives detectam conexões mortas silenciosamente
+        conn = psycopg2.connect(**db_pool.connect_kwargs, keepalives=1, keepalives_idle=30,
+                                keepalives_interval=10, keepalives_count=3)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cur = conn.cursor()
+        cur.execute(f"LISTEN {INVALIDATION_CHANNEL}")
+        cur.close()
+        return conn
+
+    def _close(self, loop):
+        if self.conn is None:
+            return
+        try:
+            loop.remove_reader(self.conn.fileno())
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self.conn = None
+        self.connected_since = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self.conn = await run_in_threadpool(self._connect)
+                self.lost = loop.create_future()
+                loop.add_reader(self.conn.fileno(), self._on_readable)
+                self.connected_since = time.time()
+                self.counters["conexoes"] += 1
+                # Avisos emitidos enquanto não estávamos escutando foram perdidos
+                await response_cache.invalidate_local()
+                for namespace, callbacks in self.listeners.items():
+                    for callback in callbacks:
+                        callback(namespace, None)
+                print(f"Barramento de invalidação escutando o canal '{INVALIDATION_CHANNEL}'")
+                await self.lost
+            except asyncio.CancelledError:
+                self._close(loop)
+                raise
+            except Exception as e:
+                self.counters["erros"] += 1
+                print(f"Erro no barramento de invalidação: {e}")
+            self._close(loop)
+            await asyncio.sleep(INVALIDATION_RETRY_SECONDS)
+
+    def _on_readable(self):
+        try:
+            self.conn.poll()
+        except Exception as e:
+            if self.lost is not None and not self.lost.done():
+                self.lost.set_exception(e)
+            return
+        while self.conn.notifies:
+            self._handle(self.conn.notifies.pop(0).payload)
+
+    def _handle(self, payload: str):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            self.counters["invalidas"] += 1
+            return
+        if message.get("origem") == self.origin:
+            # O próprio worker já invalidou o cache local ao escrever
+            self.counters["proprias"] += 1
+            return
+
+        namespace = message.get("ns")
+        self.counters["recebidas"] += 1
+        self.last_versions[namespace] = message.get("v")
+        if message.get("ts"):
+            self.latencies.append(max(0.0, time.time() - float(message["ts"])))
+        self._mark_replica_write(namespace)
+        task = asyncio.create_task(response_cache.invalidate_local(namespace))
+        self.pending.add(task)
+        task.add_done_callback(self.pending.discard)
+        ids = message.get("ids")
+        for callback in self.listeners.get(namespace, []):
+            try:
+                callback(namespace, ids)
+            except Exception as e:
+                print(f"Erro ao processar invalidação de '{namespace}': {e}")
+
+    def _mark_replica_write(self, namespace: str):
+        """Impede que este worker releia de uma réplica que ainda não tem a escrita avisada.
+
+        O aviso só é entregue após o commit, então o LSN atual do primário, lido depois
+        do aviso, cobre a escrita; até lá as leituras do namespace vão para o primário.
+        """
+        from app.routers.auth.db import replica_router
+        if not replica_router.enabled:
+            return
+        replica_router.mark_remote_write(namespace)
+        self.lsn_pending.add(namespace)
+        if self.lsn_task is None or self.lsn_task.done():
+            self.lsn_task = asyncio.create_task(self._resolve_replica_lsn())
+            self.pending.add(self.lsn_task)
+            self.lsn_task.add_done_callback(self.pending.discard)
+
+    def _primary_lsn(self) -> str:
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_current_wal_lsn()::text")
+            lsn = cur.fetchone()[0]
+            cur.close()
+            return lsn
+        finally:
+            conn.close()
+
+    async def _resolve_replica_lsn(self):
+        from app.routers.auth.db import replica_router
+        # Uma consulta cobre todos os avisos recebidos até ela; os que chegarem durante
+        # a consulta ficam para a próxima volta
+        while self.lsn_pending:
+            namespaces, self.lsn_pending = self.lsn_pending, set()
+            try:
+                lsn = await run_in_threadpool(self._primary_lsn)
+            except Exception as e:
+                # Sem o LSN os namespaces seguem no primário até o fim da janela
+                self.counters["erros_lsn"] += 1
+                print(f"Erro ao obter LSN do primário após invalidação: {getattr(e, 'detail', e)}")
+                continue
+            replica_router.resolve_remote_write(namespaces - self.lsn_pending, lsn)
+            self.counters["lsn_resolvidos"] += 1
+
+    def stats(self) -> dict:
+        latencias = sorted(self.latencies)
+
+        def percentil(p: float):
+            if not latencias:
+                return None
+            return round(latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000, 2)
+
+        return {
+            "ativo": INVALIDATION_BUS_ENABLED,
+            "conectado": self.connected_since is not None,
+            "conectado_desde": self.connected_since,
+            "cache_compartilhado": response_cache.shared,
+            "contadores": dict(self.counters),
+            "ultimas_versoes": self.last_versions,
+            "latencia_ms": {
+                "p50": percentil(0.5),
+                "p99": percentil(0.99),
+                "max": round(latencias[-1] * 1000, 2) if latencias else None,
+            },
+        }
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,287 @@
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from psycopg2.extras import Json, RealDictCursor, execute_values
+from starlette.concurrency import run_in_threadpool
+
+from app.routers.auth.db import get_db_connection
+
+# Configurações da fila de tarefas em segundo plano
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() == "true"
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+JOBS_POLL_INTERVAL = float(os.getenv("JOBS_POLL_INTERVAL", "5"))
+JOBS_RETRY_BASE_SECONDS = float(os.getenv("JOBS_RETRY_BASE_SECONDS", "2"))
+JOBS_STALE_SECONDS = int(os.getenv("JOBS_STALE_SECONDS", "300"))
+# Jobs que esgotaram as tentativas ficam para diagnóstico por este período e depois são removidos
+JOBS_FAILED_RETENTION_DAYS = float(os.getenv("JOBS_FAILED_RETENTION_DAYS", "7"))
+JOBS_CLEANUP_SECONDS = float(os.getenv("JOBS_CLEANUP_SECONDS", "3600"))
+
+# Handlers registrados por tipo de job
+_handlers: Dict[str, List[Callable[[dict], None]]] = {}
+
+
+def job_handler(tipo: str):
+    """Registra uma função síncrona para processar jobs do tipo informado.
+
+    Um job pode ser executado mais de uma vez (retentativas), então os handlers
+    devem ser idempotentes.
+    """
+    def decorator(func):
+        _handlers.setdefault(tipo, []).append(func)
+        return func
+    return decorator
+
+
+def enqueue_job(cur, tipo: str, payload: dict, delay_seconds: float = 0, unico: bool = False):
+    """Enfileira um job usando o cursor da transação corrente.
+
+    O job só fica visível para os workers quando a transação da escrita principal
+    for confirmada, e é descartado junto com ela em caso de rollback. Com `unico`,
+    não enfileira se já houver um job pendente do mesmo tipo (jobs de manutenção que
+    processam tudo o que estiver pendente); escritas concorrentes ainda podem gerar
+    duplicatas, que os handlers idempotentes absorvem.
+    """
+    cur.execute(
+        """
+        INSERT INTO jobs (tipo, payload, max_tentativas, executar_em)
+        SELECT %(tipo)s, %(payload)s, %(max)s, CURRENT_TIMESTAMP + make_interval(secs => %(atraso)s)
+        WHERE NOT %(unico)s
+           OR NOT EXISTS (SELECT 1 FROM jobs WHERE tipo = %(tipo)s AND status = 'pendente')
+        """,
+        {"tipo": tipo, "payload": Json(payload), "max": JOBS_MAX_ATTEMPTS,
+         "atraso": delay_seconds, "unico": unico}
+    )
+
+
+def enqueue_jobs(cur, tipo: str, payloads: List[dict]):
+    """Enfileira vários jobs do mesmo tipo em um único INSERT, na transação corrente."""
+    execute_values(
+        cur,
+        "INSERT INTO jobs (tipo, payload, max_tentativas) VALUES %s",
+        [(tipo, Json(payload), JOBS_MAX_ATTEMPTS) for payload in payloads],
+        page_size=max(len(payloads), 1)
+    )
+
+
+class JobQueue:
+    """Pool limitado de workers assíncronos que consome a tabela jobs."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.tasks: List[asyncio.Task] = []
+        self.running = False
+        self.wakeup = asyncio.Event()
+        self.executados = 0
+        self.falhas = 0
+        self.retentativas = 0
+        self.ultimo_lag: Optional[float] = None
+        self.cleaned_at = 0.0
+
+    def notify(self):
+        """Acorda os workers após uma escrita que enfileirou jobs."""
+        self.wakeup.set()
+
+    async def start(self):
+        if not JOBS_ENABLED or self.tasks:
+            return
+        try:
+            await run_in_threadpool(self._requeue_stale)
+        except Exception as e:
+            print(f"Erro ao recuperar jobs interrompidos: {getattr(e, 'detail', e)}")
+        await self._cleanup_failed()
+        if not _handlers:
+            # Sem handlers não há o que consumir: evita workers consultando a tabela à toa
+            print("Fila de jobs sem handlers registrados: workers não iniciados")
+            return
+        self.running = True
+        self.tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        print(f"Fila de jobs iniciada com {self.workers} workers")
+
+    async def stop(self):
+        """Encerra os workers, aguardando os jobs em execução terminarem."""
+        self.running = False
+        self.notify()
+        if self.tasks:
+            _, pendentes = await asyncio.wait(self.tasks, timeout=JOBS_POLL_INTERVAL * 2)
+            for task in pendentes:
+                task.cancel()
+        self.tasks = []
+
+    async def _worker(self, n: int):
+        while self.running:
+            self.wakeup.clear()
+            try:
+                job = await run_in_threadpool(self._claim)
+            except Exception as e:
+                print(f"Worker {n}: erro ao buscar job: {getattr(e, 'detail', e)}")
+                await asyncio.sleep(JOBS_POLL_INTERVAL)
+                continue
+
+            if job is None:
+                if n == 0 and time.time() - self.cleaned_at >= JOBS_CLEANUP_SECONDS:
+                    await self._cleanup_failed()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Falha ao registrar o resultado: o job volta para a fila após JOBS_STALE_SECONDS
+                print(f"Worker {n}: erro ao finalizar job {job['id']}: {e}")
+
+    async def _run(self, job: dict):
+        self.ultimo_lag = job["lag"]
+        try:
+            for handler in _handlers.get(job["tipo"], []):
+                await run_in_threadpool(handler, job["payload"])
+        except Exception as e:
+            print(f"Erro ao executar job {job['id']} ({job['tipo']}): {e}")
+            self.falhas += 1
+            await run_in_threadpool(self._fail, job, str(e))
+            return
+
+        self.executados += 1
+        await run_in_threadpool(self._finish, job["id"])
+
+    def _claim(self) -> Optional[dict]:
+        """Reserva o próximo job pronto; SKIP LOCKED evita disputa entre workers e processos."""
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute("""
+                UPDATE jobs
+                SET status = 'executando', iniciado_em = CURRENT_TIMESTAMP, tentativas = tentativas + 1
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'pendente' AND executar_em <= CURRENT_TIMESTAMP
+                    ORDER BY executar_em
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, tipo, payload, tentativas, max_tentativas,
+                          EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - executar_em)::float AS lag
+            """)
+            job = cur.fetchone()
+            conn.commit()
+            cur.close()
+            return job
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: int):
+        """Jobs concluídos são removidos para manter a tabela pequena."""
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM jobs WHERE id = %s", (job_id,))
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+
+    def _fail(self, job: dict, erro: str):
+        """Reagenda o job com backoff exponencial ou marca como falho após o limite de tentativas."""
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            if job["tentativas"] < job["max_tentativas"]:
+                self.retentativas += 1
+                atraso = JOBS_RETRY_BASE_SECONDS * (2 ** (job["tentativas"] - 1))
+                cur.execute("""
+                    UPDATE jobs
+                    SET status = 'pendente', erro = %s,
+                        executar_em = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    WHERE id = %s
+                """, (erro, atraso, job["id"]))
+            else:
+                cur.execute("UPDATE jobs SET status = 'falhou', erro = %s WHERE id = %s", (erro, job["id"]))
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+
+    def _requeue_stale(self):
+        """Devolve para a fila jobs que ficaram 'executando' após uma queda do processo."""
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                UPDATE jobs SET status = 'pendente'
+                WHERE status = 'executando'
+                  AND iniciado_em < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            """, (JOBS_STALE_SECONDS,))
+            if cur.rowcount:
+                print(f"{cur.rowcount} jobs interrompidos devolvidos para a fila")
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+
+    def _delete_failed(self) -> int:
+        """Remove jobs falhos mais antigos que JOBS_FAILED_RETENTION_DAYS."""
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                DELETE FROM jobs
+                WHERE status = 'falhou'
+                  AND COALESCE(iniciado_em, data_criado) < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            """, (JOBS_FAILED_RETENTION_DAYS * 86400,))
+            removidos = cur.rowcount
+            conn.commit()
+            cur.close()
+            return removidos
+        finally:
+            conn.close()
+
+    async def _cleanup_failed(self):
+        try:
+            removidos = await run_in_threadpool(self._delete_failed)
+            self.cleaned_at = time.time()
+            if removidos:
+                print(f"Limpeza da fila de jobs: {removidos} jobs falhos removidos")
+        except Exception as e:
+            print(f"Erro ao limpar jobs falhos: {getattr(e, 'detail', e)}")
+
+    def _db_metrics(self) -> dict:
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute("""
+                SELECT
+                    COUNT(*) FILTER (WHERE status = 'pendente') AS profundidade,
+                    COUNT(*) FILTER (WHERE status = 'executando') AS executando,
+                    COUNT(*) FILTER (WHERE status = 'falhou') AS falhos,
+                    COALESCE(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(executar_em)
+                        FILTER (WHERE status = 'pendente' AND executar_em <= CURRENT_TIMESTAMP)), 0)::float AS lag_segundos
+                FROM jobs
+            """)
+            result = cur.fetchone()
+            cur.close()
+            return dict(result)
+        finally:
+            conn.close()
+
+    async def metrics(self) -> dict:
+        """Profundidade e atraso da fila (banco) e contadores deste processo."""
+        result = {
+            "workers": len(self.tasks),
+            "executados": self.executados,
+            "falhas": self.falhas,
+            "retentativas": self.retentativas,
+            "ultimo_lag_segundos": self.ultimo_lag,
+        }
+        try:
+            result.update(await run_in_threadpool(self._db_metrics))
+        except Exception as e:
+            result["erro"] = str(e)
+        return result
+
+
+job_queue = JobQueue(JOBS_WORKERS)
@@ -0,0 +1,361 @@
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, Dict, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from psycopg2.extras import RealDictCursor
+from starlette.concurrency import run_in_threadpool
+
+from app.services.ratelimit import TokenBucket
+
+# Sincronização de saída com o sistema externo (tickets.numero_sistema / etapas.numero_sistema)
+SYNC_ENABLED = os.getenv("SYNC_ENABLED", "false").lower() == "true"
+SYNC_TRANSPORT = os.getenv("SYNC_TRANSPORT", "http")
+SYNC_URL = os.getenv("SYNC_URL", "")
+SYNC_TOKEN = os.getenv("SYNC_TOKEN", "")
+SYNC_TIMEOUT_SECONDS = float(os.getenv("SYNC_TIMEOUT_SECONDS", "10"))
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "100"))
+SYNC_LINGER_SECONDS = float(os.getenv("SYNC_LINGER_SECONDS", "2"))
+SYNC_INTERVAL_SECONDS = float(os.getenv("SYNC_INTERVAL_SECONDS", "5"))
+SYNC_MAX_ATTEMPTS = int(os.getenv("SYNC_MAX_ATTEMPTS", "10"))
+SYNC_RETRY_BASE_SECONDS = float(os.getenv("SYNC_RETRY_BASE_SECONDS", "2"))
+SYNC_RETRY_MAX_SECONDS = float(os.getenv("SYNC_RETRY_MAX_SECONDS", "300"))
+SYNC_LEASE_SECONDS = float(os.getenv("SYNC_LEASE_SECONDS", "60"))
+SYNC_MAX_REQUESTS_PER_SECOND = float(os.getenv("SYNC_MAX_REQUESTS_PER_SECOND", "2"))
+
+
+def enqueue_sync(cur, ticket_id: str):
+    """Marca o ticket para envio ao sistema externo, na transação da escrita.
+
+    Várias mudanças do mesmo ticket antes do envio viram um único envio com o estado
+    mais recente (a linha guarda apenas o ticket e uma versão; o conteúdo é lido no envio).
+    Um ticket em espera após falha temporária continua respeitando a espera.
+    """
+    if not SYNC_ENABLED:
+        return
+    cur.execute(
+        """
+        INSERT INTO sync_saida (ticket_id, proximo_envio)
+        VALUES (%s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+        ON CONFLICT (ticket_id) DO UPDATE
+          SET versao = sync_saida.versao + 1,
+              status = 'pendente',
+              -- Um item que havia falhado recomeça do zero com a nova mudança
+              tentativas = CASE WHEN sync_saida.status = 'falhou' THEN 0 ELSE sync_saida.tentativas END,
+              proximo_envio = CASE WHEN sync_saida.status = 'falhou' THEN EXCLUDED.proximo_envio
+                                   ELSE GREATEST(sync_saida.proximo_envio, EXCLUDED.proximo_envio) END
+        """,
+        (ticket_id, SYNC_LINGER_SECONDS)
+    )
+
+
+class SyncRejected(Exception):
+    """O sistema externo recusou o lote de forma definitiva (não adianta tentar de novo)."""
+
+
+class SyncRetry(Exception):
+    """Falha temporária; retry_after (segundos) quando o sistema externo informar."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class HttpTransport:
+    """Envia o lote como JSON via POST para SYNC_URL.
+
+    2xx confirma o lote; a resposta pode trazer {"rejeitados": [ticket_id, ...]} para
+    recusar itens específicos. 429/5xx e erros de rede são temporários (Retry-After é
+    respeitado); os demais 4xx recusam o lote.
+    """
+
+    def __init__(self, url: str = SYNC_URL, token: str = SYNC_TOKEN, timeout: float = SYNC_TIMEOUT_SECONDS):
+        if not url:
+            raise ValueError("SYNC_URL não configurada")
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+
+    def send(self, itens: List[dict]) -> Dict[str, str]:
+        corpo = json.dumps({"tickets": itens}, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url, data=corpo, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                conteudo = response.read()
+        except urllib.error.HTTPError as e:
+            retry_after = e.headers.get("Retry-After") if e.headers else None
+            if e.code == 429 or e.code >= 500:
+                raise SyncRetry(f"HTTP {e.code}", float(retry_after) if retry_after and retry_after.isdigit() else None)
+            raise SyncRejected(f"HTTP {e.code}: {e.read()[:200].decode('utf-8', 'replace')}")
+        except (urllib.error.URLError, OSError) as e:
+            raise SyncRetry(str(getattr(e, "reason", e)))
+        try:
+            resposta = json.loads(conteudo) if conteudo else {}
+        except ValueError:
+            resposta = {}
+        rejeitados = resposta.get("rejeitados", []) if isinstance(resposta, dict) else []
+        return {str(ticket_id): "recusado pelo sistema externo" for ticket_id in rejeitados}
+
+
+class LogTransport:
+    """Apenas registra os lotes no log (desenvolvimento)."""
+
+    def send(self, itens: List[dict]) -> Dict[str, str]:
+        print(f"[sync] lote com {len(itens)} tickets: {[item['numero_sistema'] for item in itens]}")
+        return {}
+
+
+# Transportes disponíveis (SYNC_TRANSPORT); novos podem ser registrados com register_transport
+_transports: Dict[str, Callable[[], object]] = {
+    "http": HttpTransport,
+    "log": LogTransport,
+}
+
+
+def register_transport(nome: str, factory: Callable[[], object]):
+    """Registra um transporte: factory() retorna um objeto com send(itens) -> {ticket_id: motivo}."""
+    _transports[nome] = factory
+
+
+class OutboundSync:
+    """Envia as mudanças de etapa pendentes em sync_saida, em lotes e com limite de taxa.
+
+    Os itens são reservados por SYNC_LEASE_SECONDS (vários workers podem rodar o envio).
+    Após o envio, só são removidos os itens cuja versão não mudou; uma mudança feita
+    durante o envio é enviada no lote seguinte. Falhas temporárias reagendam o lote com
+    espera exponencial e jitter; após SYNC_MAX_ATTEMPTS o item fica com status 'falhou'.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup = asyncio.Event()
+        self.bucket = TokenBucket(SYNC_MAX_REQUESTS_PER_SECOND, 1) if SYNC_MAX_REQUESTS_PER_SECOND > 0 else None
+        self.counters = collections.Counter()
+        self.last_error: Optional[str] = None
+        self.last_success: Optional[float] = None
+
+    def notify(self):
+        """Acorda o envio após uma escrita que marcou tickets (o envio ainda aguarda SYNC_LINGER_SECONDS)."""
+        self.wakeup.set()
+
+    async def start(self):
+        if not SYNC_ENABLED or self.task is not None:
+            return
+        try:
+            self.transport = _transports[SYNC_TRANSPORT]()
+        except Exception as e:
+            print(f"Erro ao configurar sincronização externa ({SYNC_TRANSPORT}): {e}")
+            return
+        self.task = asyncio.create_task(self._run())
+        print(f"Sincronização externa iniciada (transporte {SYNC_TRANSPORT})")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                enviados = await self.sync_once()
+            except Exception as e:
+                enviados = 0
+                self.counters["erros"] += 1
+                print(f"Erro na sincronização externa: {getattr(e, 'detail', e)}")
+            if enviados >= SYNC_BATCH_SIZE:
+                # Ainda há itens prontos: segue no ritmo do limite de taxa
+                continue
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=SYNC_INTERVAL_SECONDS)
+                await asyncio.sleep(SYNC_LINGER_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self) -> List[dict]:
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            # Itens de tickets removidos não têm o que enviar
+            cur.execute("""
+                DELETE FROM sync_saida s
+                WHERE NOT EXISTS (SELECT 1 FROM tickets t WHERE t.id = s.ticket_id)
+            """)
+            cur.execute("""
+                WITH prontos AS (
+                    SELECT ticket_id FROM sync_saida
+                    WHERE status = 'pendente' AND proximo_envio <= CURRENT_TIMESTAMP
+                    ORDER BY proximo_envio
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE sync_saida s
+                SET proximo_envio = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                    tentativas = s.tentativas + 1
+                FROM prontos
+                WHERE s.ticket_id = prontos.ticket_id
+                RETURNING s.ticket_id, s.versao, s.tentativas
+            """, (SYNC_BATCH_SIZE, SYNC_LEASE_SECONDS))
+            reservados = {str(row["ticket_id"]): row for row in cur.fetchall()}
+            itens = []
+            if reservados:
+                # Estado atual do ticket (a última escrita vence), com a etapa no sistema externo
+                cur.execute("""
+                    SELECT t.id::text AS ticket_id, t.numero_sistema, t.etapa_numero,
+                           e.numero_sistema AS etapa_numero_sistema, t.email_atendente,
+                           t.data_atualizado
+                    FROM tickets t
+                    LEFT JOIN etapas e ON e.numero = t.etapa_numero
+                    WHERE t.id = ANY(%s::uuid[])
+                """, (list(reservados),))
+                for row in cur.fetchall():
+                    reserva = reservados[row["ticket_id"]]
+                    itens.append({**row, "_versao": reserva["versao"], "_tentativas": reserva["tentativas"]})
+            conn.commit()
+            cur.close()
+            return itens
+        finally:
+            conn.close()
+
+    def _finish(self, enviados: List[dict], recusados: Dict[str, str]):
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            for item in enviados:
+                if item["ticket_id"] in recusados:
+                    cur.execute(
+                        "UPDATE sync_saida SET status = 'falhou', erro = %s WHERE ticket_id = %s AND versao = %s",
+                        (recusados[item["ticket_id"]], item["ticket_id"], item["_versao"])
+                    )
+                    continue
+                # Mudança feita durante o envio (versão nova) permanece e sai no próximo lote
+                cur.execute(
+                    "DELETE FROM sync_saida WHERE ticket_id = %s AND versao = %s",
+                    (item["ticket_id"], item["_versao"])
+                )
+                if cur.rowcount == 0:
+                    cur.execute(
+                        "UPDATE sync_saida SET proximo_envio = CURRENT_TIMESTAMP, tentativas = 0 WHERE ticket_id = %s",
+                        (item["ticket_id"],)
+                    )
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+
+    def _retry(self, itens: List[dict], erro: str, retry_after: Optional[float]):
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            for item in itens:
+                tentativas = item["_tentativas"]
+                if tentativas >= SYNC_MAX_ATTEMPTS:
+                    cur.execute(
+                        "UPDATE sync_saida SET status = 'falhou', erro = %s WHERE ticket_id = %s",
+                        (erro, item["ticket_id"])
+                    )
+                    continue
+                # Espera exponencial com jitter: os itens não voltam todos ao mesmo tempo
+                espera = min(SYNC_RETRY_MAX_SECONDS, SYNC_RETRY_BASE_SECONDS * 2 ** (tentativas - 1))
+                espera = max(espera * random.uniform(0.5, 1.0), retry_after or 0)
+                cur.execute(
+                    """
+                    UPDATE sync_saida
+                    SET proximo_envio = CURRENT_TIMESTAMP + make_interval(secs => %s), erro = %s
+                    WHERE ticket_id = %s
+                    """,
+                    (espera, erro, item["ticket_id"])
+                )
+            conn.commit()
+            cur.close()
+        finally:
+            conn.close()
+
+    async def sync_once(self) -> int:
+        """Envia um lote; retorna o número de itens reservados."""
+        if self.bucket is not None:
+            espera = self.bucket.take()
+            while espera > 0:
+                await asyncio.sleep(espera)
+                espera = self.bucket.take()
+
+        itens = await run_in_threadpool(self._claim)
+        if not itens:
+            return 0
+        payload = [
+            {k: v for k, v in item.items() if not k.startswith("_")}
+            for item in jsonable_encoder(itens)
+        ]
+        inicio = time.perf_counter()
+        try:
+            recusados = await run_in_threadpool(self.transport.send, payload)
+        except SyncRejected as e:
+            self.counters["lotes_recusados"] += 1
+            self.last_error = str(e)
+            await run_in_threadpool(self._finish, itens, {item["ticket_id"]: str(e) for item in itens})
+            return len(itens)
+        except Exception as e:
+            self.counters["lotes_com_falha"] += 1
+            self.last_error = str(e)
+            await run_in_threadpool(self._retry, itens, str(e), getattr(e, "retry_after", None))
+            return len(itens)
+
+        await run_in_threadpool(self._finish, itens, recusados or {})
+        self.counters["lotes_enviados"] += 1
+        self.counters["tickets_enviados"] += len(itens) - len(recusados or {})
+        self.counters["tickets_recusados"] += len(recusados or {})
+        # Mudanças agrupadas em um único envio (última escrita vence)
+        self.counters["mudancas_agrupadas"] += sum(item["_versao"] - 1 for item in itens)
+        self.counters["ultimo_envio_ms"] = round((time.perf_counter() - inicio) * 1000)
+        self.last_success = time.time()
+        return len(itens)
+
+    def _db_stats(self) -> dict:
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute("""
+                SELECT COUNT(*) FILTER (WHERE status = 'pendente') AS pendentes,
+                       COUNT(*) FILTER (WHERE status = 'falhou') AS falhos,
+                       COALESCE(EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(criado_em)
+                           FILTER (WHERE status = 'pendente')), 0)::float AS atraso_segundos
+                FROM sync_saida
+            """)
+            result = cur.fetchone()
+            cur.close()
+            return dict(result)
+        finally:
+            conn.close()
+
+    async def stats(self) -> dict:
+        result = {
+            "ativo": self.task is not None,
+            "transporte": SYNC_TRANSPORT if SYNC_ENABLED else None,
+            "contadores": dict(self.counters),
+            "ultimo_sucesso": self.last_success,
+            "ultimo_erro": self.last_error,
+        }
+        if SYNC_ENABLED:
+            try:
+                result.update(await run_in_threadpool(self._db_stats))
+            except Exception as e:
+                result["erro"] = str(e)
+        return result
+
+
+outbound_sync = OutboundSync()
@@ -0,0 +1,170 @@
+import collections
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Profiling por requisição (opt-in)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# sampling: todas as threads (inclui o threadpool); cprofile: apenas a thread do event loop
+PROFILING_MODE = os.getenv("PROFILING_MODE", "sampling")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "5"))
+PROFILING_OUTPUT_DIR = os.getenv("PROFILING_OUTPUT_DIR", "/tmp/filasling-profiles")
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+
+# Funções em que as threads ficam ociosas; amostras paradas nelas são descartadas
+_IDLE_FRAMES = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get")}
+
+# Apenas uma requisição é perfilada por vez (o cProfile é global por thread
+# e as amostras de threads não distinguem requisições concorrentes)
+_profile_lock = threading.Lock()
+
+
+class StackSampler:
+    """Profiler por amostragem: coleta as pilhas de todas as threads em intervalos fixos.
+
+    O resultado usa o formato "folded" (pilha;separada;por;ponto-e-vírgula contagem),
+    aceito por flamegraph.pl e speedscope.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = collections.Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self.stopped.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def output(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def _should_profile(scope: dict) -> bool:
+    headers = dict(scope.get("headers") or [])
+    header = headers.get(b"x-profile")
+    if header is not None:
+        return not PROFILING_TOKEN or header.decode("latin-1") == PROFILING_TOKEN
+    return PROFILING_SAMPLE_RATE > 0 and random.random() < PROFILING_SAMPLE_RATE
+
+
+def _route_tag(scope: dict) -> str:
+    endpoint = scope.get("endpoint")
+    nome = getattr(endpoint, "__name__", None) or scope.get("path", "")
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{scope.get('method', '')}_{nome}").strip("_")
+
+
+def _write_profile(nome_base: str, conteudo, modo: str) -> str:
+    os.makedirs(PROFILING_OUTPUT_DIR, exist_ok=True)
+    if modo == "cprofile":
+        caminho = os.path.join(PROFILING_OUTPUT_DIR, f"{nome_base}.prof")
+        conteudo.dump_stats(caminho)
+        # Resumo legível ao lado do arquivo binário (snakeviz/pstats leem o .prof)
+        resumo = io.StringIO()
+        pstats.Stats(conteudo, stream=resumo).sort_stats("cumulative").print_stats(30)
+        with open(os.path.join(PROFILING_OUTPUT_DIR, f"{nome_base}.txt"), "w") as f:
+            f.write(resumo.getvalue())
+    else:
+        caminho = os.path.join(PROFILING_OUTPUT_DIR, f"{nome_base}.folded")
+        with open(caminho, "w") as f:
+            f.write(conteudo.output())
+
+    # Manter apenas os arquivos mais recentes
+    arquivos = sorted(
+        (os.path.join(PROFILING_OUTPUT_DIR, nome) for nome in os.listdir(PROFILING_OUTPUT_DIR)),
+        key=os.path.getmtime
+    )
+    for antigo in arquivos[:-PROFILING_MAX_FILES]:
+        os.remove(antigo)
+    return caminho
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI que perfila requisições amostradas ou marcadas com o header X-Profile.
+
+    A resposta recebe os headers Server-Timing e X-Profile-Id; o perfil completo
+    é gravado em PROFILING_OUTPUT_DIR em um arquivo iniciado pelo X-Profile-Id,
+    seguido da rota e da duração.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _should_profile(scope):
+            return await self.app(scope, receive, send)
+        if not _profile_lock.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        nome_base = f"{time.strftime('%Y%m%d_%H%M%S')}_{int(inicio * 1000) % 100000}"
+        profiler: Optional[cProfile.Profile] = None
+        sampler: Optional[StackSampler] = None
+        if PROFILING_MODE == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            sampler = StackSampler(PROFILING_INTERVAL_MS / 1000)
+            sampler.start()
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                duracao_ms = (time.perf_counter() - inicio) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", f'app;dur={duracao_ms:.1f};desc="{PROFILING_MODE}"'.encode()))
+                headers.append((b"x-profile-id", nome_base.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+            _profile_lock.release()
+
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            nome_arquivo = f"{nome_base}_{_route_tag(scope)}_{duracao_ms:.0f}ms"
+            try:
+                caminho = await run_in_threadpool(
+                    _write_profile, nome_arquivo, profiler or sampler, PROFILING_MODE
+                )
+                print(f"[profiling] {scope.get('method')} {scope.get('path')} em {duracao_ms:.1f} ms: {caminho}")
+            except Exception as e:
+                print(f"Erro ao gravar profile da requisição: {e}")
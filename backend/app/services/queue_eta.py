@@ -0,0 +1,352 @@
+import asyncio
+import bisect
+import collections
+import json
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from psycopg2.extras import RealDictCursor
+from starlette.concurrency import run_in_threadpool
+
+# Estimativa de espera da fila (etapa 1)
+ETA_WINDOW_MINUTES = float(os.getenv("ETA_WINDOW_MINUTES", "60"))
+ETA_MIN_SAMPLES = int(os.getenv("ETA_MIN_SAMPLES", "3"))
+ETA_RESYNC_SECONDS = float(os.getenv("ETA_RESYNC_SECONDS", "30"))
+ETA_SNAPSHOT_SECONDS = float(os.getenv("ETA_SNAPSHOT_SECONDS", "5"))
+ETA_BOARD_MAX_ITEMS = int(os.getenv("ETA_BOARD_MAX_ITEMS", "50"))
+
+# Etapa em que os tickets aguardam atendimento
+ETAPA_FILA = 1
+
+
+def _epoch(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class QueueEstimator:
+    """Posições na fila e estimativa de espera mantidas em memória.
+
+    A fila (tickets na etapa 1) e as saídas recentes da etapa 1 são atualizadas
+    incrementalmente pelas escritas deste worker. Avisos de escritas de outros workers
+    relêem apenas os tickets informados; a reconstrução completa acontece periodicamente
+    e quando o aviso não traz os ids. A taxa de atendimento é o número de saídas da
+    etapa 1 na janela, por setor (ou geral, com poucas amostras).
+    """
+
+    def __init__(self):
+        self.waiting = []  # (data_criado, id) em ordem de chegada
+        self.tickets = {}  # id -> {"nome", "setor", "data_criado"}
+        # (saida, setor, atendente_id, espera_segundos, ticket_id) em ordem de saída
+        self.departures = collections.deque()
+        # Tickets com saída na janela: a mesma saída vista pela escrita local e pelo banco conta uma vez
+        self.departed = set()
+        self.version = 0
+        self.synced_at: Optional[float] = None
+        self.resyncs = 0
+        self.partial_resyncs = 0
+        self.resync_errors = 0
+        self.dirty = asyncio.Event()
+        self.full_resync = True
+        self.pending_ids = set()
+        self.task: Optional[asyncio.Task] = None
+        self.syncing = False
+        self.replay = []
+        self.snapshots = {}
+
+    async def start(self):
+        if self.task is None:
+            from app.services.invalidation import invalidation_bus
+            # Escritas em tickets feitas por outros workers disparam uma ressincronização
+            invalidation_bus.subscribe("tickets", self.request_resync)
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+    def request_resync(self, namespace: Optional[str] = None, ids: Optional[List[str]] = None):
+        """Agenda uma ressincronização (ex.: escrita feita por outro worker).
+
+        Com `ids`, relê apenas esses tickets; sem, reconstrói a fila inteira.
+        """
+        if ids is None:
+            self.full_resync = True
+        else:
+            self.pending_ids.update(str(i) for i in ids)
+        if self.full_resync or self.pending_ids:
+            self.dirty.set()
+
+    async def _run(self):
+        while True:
+            self.dirty.clear()
+            completa, ids = self.full_resync, list(self.pending_ids)
+            self.full_resync = False
+            self.pending_ids = set()
+            try:
+                if completa:
+                    await self.resync()
+                elif ids:
+                    await self.resync(ids)
+            except Exception as e:
+                self.resync_errors += 1
+                # Os tickets não relidos ficam para a próxima reconstrução completa
+                self.full_resync = True
+                print(f"Erro ao sincronizar estimativa da fila: {getattr(e, 'detail', e)}")
+            try:
+                await asyncio.wait_for(self.dirty.wait(), timeout=ETA_RESYNC_SECONDS)
+                # Agrupa rajadas de avisos em uma única consulta
+                await asyncio.sleep(0.5)
+            except asyncio.TimeoutError:
+                self.full_resync = True
+
+    def _load(self, ids: Optional[List[str]] = None):
+        from app.routers.auth.db import get_db_connection, get_read_connection
+        if ids is None:
+            conn = get_read_connection("tickets")
+            filtro_fila, filtro_saidas = "etapa_numero = %(etapa)s", ""
+        else:
+            # O aviso chega logo após o commit no primário: uma réplica ainda pode não ter a escrita
+            conn = get_db_connection()
+            filtro_fila, filtro_saidas = "id = ANY(%(ids)s::uuid[])", "AND ev.ticket_id = ANY(%(ids)s::uuid[])"
+        params = {"etapa": ETAPA_FILA, "ids": ids, "janela": ETA_WINDOW_MINUTES * 60}
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(f"""
+                SELECT id::text AS id, nome, setor, data_criado, etapa_numero
+                FROM tickets
+                WHERE {filtro_fila}
+                ORDER BY data_criado, id
+            """, params)
+            fila = cur.fetchall()
+            cur.execute(f"""
+                SELECT ev.data_evento, t.setor, ev.atendente_id::text AS atendente_id,
+                       EXTRACT(EPOCH FROM ev.data_evento - t.data_criado)::float AS espera,
+                       ev.ticket_id::text AS ticket_id
+                FROM ticket_events ev
+                LEFT JOIN tickets t ON t.id = ev.ticket_id
+                WHERE ev.data_evento >= CURRENT_TIMESTAMP - make_interval(secs => %(janela)s)
+                  AND ev.tipo = 'etapa' AND ev.etapa_anterior = %(etapa)s AND ev.etapa_numero <> %(etapa)s
+                  {filtro_saidas}
+                ORDER BY ev.data_evento
+            """, params)
+            saidas = cur.fetchall()
+            cur.close()
+            return fila, saidas
+        finally:
+            conn.close()
+
+    async def resync(self, ids: Optional[List[str]] = None):
+        """Reconcilia a fila e as saídas com o banco.
+
+        Com `ids`, relê apenas esses tickets; sem, reconstrói tudo.
+        """
+        self.syncing = True
+        self.replay = []
+        try:
+            fila, saidas = await run_in_threadpool(self._load, ids)
+        finally:
+            self.syncing = False
+        if ids is None:
+            self.waiting = []
+            self.tickets = {}
+            self.departures = collections.deque()
+            self.departed = set()
+        else:
+            # Tickets relidos que saíram da fila (ou foram excluídos) deixam de aparecer
+            for ticket_id in ids:
+                self._remove(ticket_id)
+        for row in fila:
+            if row["etapa_numero"] == ETAPA_FILA:
+                self._add(row["id"], row["nome"], row["setor"], _epoch(row["data_criado"]))
+        for row in saidas:
+            self._depart(row["ticket_id"], _epoch(row["data_evento"]), row["setor"], row["atendente_id"], row["espera"])
+        # Escritas locais feitas durante a consulta podem não estar no resultado
+        for operacao, args in self.replay:
+            operacao(*args)
+        self.replay = []
+        if ids is None:
+            self.synced_at = time.time()
+            self.resyncs += 1
+        else:
+            self.partial_resyncs += 1
+        self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self.snapshots = {}
+
+    def _add(self, ticket_id: str, nome: str, setor: Optional[str], chegada: float):
+        if ticket_id in self.tickets:
+            return
+        self.tickets[ticket_id] = {"nome": nome, "setor": setor, "data_criado": chegada}
+        bisect.insort(self.waiting, (chegada, ticket_id))
+
+    def _remove(self, ticket_id: str) -> Optional[dict]:
+        ticket = self.tickets.pop(ticket_id, None)
+        if ticket is not None:
+            indice = bisect.bisect_left(self.waiting, (ticket["data_criado"], ticket_id))
+            if indice < len(self.waiting) and self.waiting[indice][1] == ticket_id:
+                del self.waiting[indice]
+        return ticket
+
+    def _depart(self, ticket_id: str, saida: float, setor: Optional[str], atendente_id: Optional[str], espera):
+        if ticket_id in self.departed:
+            return
+        self.departed.add(ticket_id)
+        item = (saida, setor, atendente_id, espera, ticket_id)
+        if not self.departures or saida >= self.departures[-1][0]:
+            self.departures.append(item)
+        else:
+            self.departures.insert(bisect.bisect(self.departures, saida, key=lambda d: d[0]), item)
+
+    def _apply(self, operacao, *args):
+        operacao(*args)
+        if self.syncing:
+            self.replay.append((operacao, args))
+        self._changed()
+
+    def _created(self, ticket: dict):
+        if ticket.get("etapa_numero") == ETAPA_FILA:
+            self._add(str(ticket["id"]), ticket.get("nome"), ticket.get("setor"), _epoch(ticket["data_criado"]))
+
+    def _updated(self, etapa_anterior: int, ticket: dict):
+        ticket_id = str(ticket["id"])
+        if ticket.get("etapa_numero") == ETAPA_FILA:
+            self._remove(ticket_id)
+            self._add(ticket_id, ticket.get("nome"), ticket.get("setor"), _epoch(ticket["data_criado"]))
+        elif etapa_anterior == ETAPA_FILA:
+            removido = self._remove(ticket_id)
+            chegada = removido["data_criado"] if removido else _epoch(ticket["data_criado"])
+            agora = time.time()
+            self._depart(ticket_id, agora, ticket.get("setor"), ticket.get("atendente_id") and str(ticket["atendente_id"]), agora - chegada)
+
+    def ticket_created(self, ticket: dict):
+        """Atualiza a fila após create_ticket (chamado depois do commit)."""
+        self._apply(self._created, ticket)
+
+    def ticket_updated(self, etapa_anterior: int, ticket: dict):
+        """Atualiza a fila e as saídas após update_ticket (chamado depois do commit)."""
+        self._apply(self._updated, etapa_anterior, ticket)
+
+    def ticket_removed(self, ticket_id: str):
+        self._apply(self._remove, str(ticket_id))
+
+    def _rates(self, agora: float) -> dict:
+        """Saídas por segundo na janela, geral (chave None) e por setor."""
+        inicio = agora - ETA_WINDOW_MINUTES * 60
+        while self.departures and self.departures[0][0] < inicio:
+            self.departed.discard(self.departures.popleft()[4])
+        janela = ETA_WINDOW_MINUTES * 60
+        por_setor = collections.Counter(setor for _, setor, _, _, _ in self.departures)
+        taxas = {None: len(self.departures) / janela if len(self.departures) >= ETA_MIN_SAMPLES else None}
+        for setor, total in por_setor.items():
+            if setor is not None and total >= ETA_MIN_SAMPLES:
+                taxas[setor] = total / janela
+        return taxas
+
+    def _build(self, agora: float) -> dict:
+        taxas = self._rates(agora)
+        posicoes_setor = collections.Counter()
+        fila = []
+        for posicao, (chegada, ticket_id) in enumerate(self.waiting, start=1):
+            ticket = self.tickets[ticket_id]
+            setor = ticket["setor"]
+            posicoes_setor[setor] += 1
+            # Com taxa própria do setor, apenas a fila do setor conta; senão a fila inteira
+            if setor in taxas and setor is not None:
+                eta = posicoes_setor[setor] / taxas[setor]
+            elif taxas[None]:
+                eta = posicao / taxas[None]
+            else:
+                eta = None
+            fila.append({
+                "id": ticket_id,
+                "nome": ticket["nome"],
+                "setor": setor,
+                "posicao": posicao,
+                "posicao_setor": posicoes_setor[setor],
+                "espera_segundos": round(agora - chegada),
+                "eta_segundos": round(eta) if eta is not None else None,
+            })
+
+        esperas = collections.defaultdict(list)
+        atendentes = collections.Counter()
+        for _, setor, atendente_id, espera, _ in self.departures:
+            if espera is not None:
+                esperas[setor].append(espera)
+                esperas["__todos__"].append(espera)
+            if atendente_id:
+                atendentes[atendente_id] += 1
+        horas = ETA_WINDOW_MINUTES / 60
+
+        return {
+            "atualizado_em": agora,
+            "sincronizado_em": self.synced_at,
+            "janela_minutos": ETA_WINDOW_MINUTES,
+            "fila": fila,
+            "setores": {
+                setor or "sem_setor": {
+                    "atendimentos_por_hora": round(len(valores) / horas, 2),
+                    "espera_media_segundos": round(sum(valores) / len(valores)),
+                }
+                for setor, valores in esperas.items() if setor != "__todos__"
+            },
+            "atendentes": {atendente_id: {"atendimentos_por_hora": round(total / horas, 2)} for atendente_id, total in atendentes.items()},
+            "espera_media_segundos": round(sum(esperas["__todos__"]) / len(esperas["__todos__"])) if esperas["__todos__"] else None,
+        }
+
+    def _board(self, completo: dict) -> dict:
+        # Painel público: sem telefone/motivo e apenas o primeiro nome
+        return {
+            "atualizado_em": completo["atualizado_em"],
+            "espera_media_segundos": completo["espera_media_segundos"],
+            "total": len(completo["fila"]),
+            "fila": [
+                {
+                    "codigo": item["id"][:6].upper(),
+                    "nome": (item["nome"] or "").split(" ")[0],
+                    "setor": item["setor"],
+                    "posicao": item["posicao"],
+                    "eta_segundos": item["eta_segundos"],
+                }
+                for item in completo["fila"][:ETA_BOARD_MAX_ITEMS]
+            ],
+        }
+
+    def snapshot(self, painel: bool = False):
+        """Retorna (etag, corpo JSON) reaproveitado até haver mudança ou passar ETA_SNAPSHOT_SECONDS."""
+        agora = time.time()
+        chave = (self.version, int(agora // ETA_SNAPSHOT_SECONDS))
+        if chave not in self.snapshots:
+            completo = self._build(agora)
+            self.snapshots = {chave: {
+                False: json.dumps(jsonable_encoder(completo), ensure_ascii=False).encode("utf-8"),
+                True: json.dumps(jsonable_encoder(self._board(completo)), ensure_ascii=False).encode("utf-8"),
+                "itens": {item["id"]: item for item in completo["fila"]},
+            }}
+        etag = f'"{chave[0]}-{chave[1]}{"-p" if painel else ""}"'
+        return etag, self.snapshots[chave][painel]
+
+    def ticket_eta(self, ticket_id: str) -> Optional[dict]:
+        self.snapshot()
+        return next(iter(self.snapshots.values()))["itens"].get(ticket_id)
+
+    def stats(self) -> dict:
+        return {
+            "na_fila": len(self.waiting),
+            "saidas_na_janela": len(self.departures),
+            "sincronizado_em": self.synced_at,
+            "sincronizacoes": self.resyncs,
+            "sincronizacoes_parciais": self.partial_resyncs,
+            "erros": self.resync_errors,
+        }
+
+
+queue_estimator = QueueEstimator()
@@ -0,0 +1,213 @@
+import asyncio
+import collections
+import math
+import os
+import time
+from typing import Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+from app.routers.auth.authentication import get_current_user
+
+# Limites no formato "requisições_por_segundo/rajada"; taxa 0 desabilita o limite
+RATE_LIMITS = {
+    "tickets": os.getenv("RATE_LIMIT_TICKETS", "10/30"),
+    "etapas": os.getenv("RATE_LIMIT_ETAPAS", "5/20"),
+    "atendentes": os.getenv("RATE_LIMIT_ATENDENTES", "5/20"),
+    "bootstrap": os.getenv("RATE_LIMIT_BOOTSTRAP", "2/10"),
+    "login": os.getenv("RATE_LIMIT_LOGIN", "0.2/5"),  # por IP: 12 por minuto após a rajada
+}
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+# Proxies confiáveis à frente da API (nginx = 1). Cada proxy acrescenta o endereço de quem
+# o chamou ao fim do X-Forwarded-For, então só as últimas entradas são confiáveis; 0 usa o
+# endereço da conexão e ignora os cabeçalhos
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "1"))
+
+# Controle de admissão global: limite de requisições simultâneas antes de esgotar o pool
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "40"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "0.5"))
+ADMISSION_MAX_POOL_WAITING = int(os.getenv("ADMISSION_MAX_POOL_WAITING", "10"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "2"))
+# Rotas que nunca são rejeitadas (sondas precisam responder durante incidentes; respondem
+# com estado em memória). /api/metrics consulta o banco e passa pelo controle de admissão
+ADMISSION_EXEMPT_PREFIXES = ("/api/health",)
+# Long polling fica aberto até ~55s sem usar o banco: tem um limite próprio, sem fila de
+# espera, para não ocupar as vagas do limite global
+ADMISSION_LONG_POLL_PREFIXES = ("/api/fila/sla/eventos",)
+ADMISSION_MAX_LONG_POLL = int(os.getenv("ADMISSION_MAX_LONG_POLL", "200"))
+
+
+def _parse_limit(valor: str) -> Tuple[float, float]:
+    taxa, _, rajada = valor.partition("/")
+    taxa = float(taxa)
+    return taxa, float(rajada) if rajada else max(taxa, 1.0)
+
+
+class TokenBucket:
+    """Balde de tokens: repõe `rate` tokens por segundo até o limite `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consome um token; retorna 0 se permitido ou os segundos até o próximo token."""
+        agora = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (agora - self.updated) * self.rate)
+        self.updated = agora
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Baldes por chave com descarte dos menos usados recentemente (memória limitada)."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.buckets: "collections.OrderedDict[tuple, TokenBucket]" = collections.OrderedDict()
+        self.rejected = collections.Counter()
+
+    def hit(self, nome: str, key: tuple, rate: float, burst: float) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        espera = bucket.take()
+        if espera:
+            self.rejected[nome] += 1
+        return espera
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_MAX_KEYS)
+
+
+def _too_many_requests(espera: float):
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Muitas requisições, tente novamente em instantes",
+        headers={"Retry-After": str(max(1, math.ceil(espera)))}
+    )
+
+
+def _client_ip(request: Request) -> str:
+    direto = request.client.host if request.client else "desconhecido"
+    if TRUSTED_PROXY_COUNT <= 0:
+        return direto
+    # As entradas à esquerda são enviadas pelo próprio cliente e podem ser forjadas:
+    # o endereço real é o que o proxy confiável mais externo acrescentou
+    enderecos = [e.strip() for e in request.headers.get("x-forwarded-for", "").split(",") if e.strip()]
+    if len(enderecos) >= TRUSTED_PROXY_COUNT:
+        return enderecos[-TRUSTED_PROXY_COUNT]
+    # O nginx também envia o endereço de quem o chamou em X-Real-IP
+    return request.headers.get("x-real-ip", "").strip() or direto
+
+
+def rate_limit(nome: str):
+    """Dependência de router: limite por usuário e por rota, configurado em RATE_LIMITS[nome]."""
+    taxa, rajada = _parse_limit(RATE_LIMITS[nome])
+
+    async def dependency(request: Request, current_user: dict = Depends(get_current_user)):
+        if taxa <= 0:
+            return
+        endpoint = getattr(request.scope.get("endpoint"), "__name__", request.url.path)
+        espera = rate_limiter.hit(nome, (nome, current_user.get("id"), endpoint), taxa, rajada)
+        if espera:
+            _too_many_requests(espera)
+
+    return dependency
+
+
+def rate_limit_ip(nome: str):
+    """Dependência para rotas sem usuário autenticado (login): limite por IP de origem."""
+    taxa, rajada = _parse_limit(RATE_LIMITS[nome])
+
+    async def dependency(request: Request):
+        if taxa <= 0:
+            return
+        espera = rate_limiter.hit(nome, (nome, _client_ip(request)), taxa, rajada)
+        if espera:
+            _too_many_requests(espera)
+
+    return dependency
+
+
+class AdmissionState:
+    """Contadores do controle de admissão, compartilhados com /api/metrics."""
+
+    def __init__(self, max_concurrent: int):
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.long_polls = 0
+        self.rejected = collections.Counter()
+
+
+admission_state = AdmissionState(ADMISSION_MAX_CONCURRENT)
+
+
+class AdmissionControlMiddleware:
+    """Limita as requisições simultâneas e descarta carga com 503 antes de o pool esgotar."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def _reject(self, scope, receive, send, motivo: str):
+        admission_state.rejected[motivo] += 1
+        response = JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": f"Servidor sobrecarregado ({motivo}), tente novamente em instantes"},
+            headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(ADMISSION_EXEMPT_PREFIXES):
+            return await self.app(scope, receive, send)
+
+        if scope["path"].startswith(ADMISSION_LONG_POLL_PREFIXES):
+            if admission_state.long_polls >= ADMISSION_MAX_LONG_POLL:
+                return await self._reject(scope, receive, send, "limite de long polling")
+            admission_state.long_polls += 1
+            try:
+                return await self.app(scope, receive, send)
+            finally:
+                admission_state.long_polls -= 1
+
+        # Muitas threads já aguardando conexão: novas requisições só piorariam a fila
+        from app.routers.auth.db import db_pool
+        if db_pool.waiting >= ADMISSION_MAX_POOL_WAITING:
+            return await self._reject(scope, receive, send, "pool de conexões")
+
+        try:
+            await asyncio.wait_for(admission_state.slots.acquire(), timeout=ADMISSION_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return await self._reject(scope, receive, send, "limite de concorrência")
+
+        admission_state.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_state.in_flight -= 1
+            admission_state.slots.release()
+
+
+def admission_stats() -> dict:
+    """Estatísticas do controle de admissão e dos limites por usuário/rota."""
+    return {
+        "max_simultaneas": ADMISSION_MAX_CONCURRENT,
+        "em_andamento": admission_state.in_flight,
+        "max_long_polling": ADMISSION_MAX_LONG_POLL,
+        "long_polling_abertos": admission_state.long_polls,
+        "rejeitadas_503": dict(admission_state.rejected),
+        "rejeitadas_429": dict(rate_limiter.rejected),
+        "baldes_ativos": len(rate_limiter.buckets),
+    }
@@ -0,0 +1,225 @@
+import collections
+import itertools
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Iterable, List, Optional
+
+from starlette.requests import Request
+
+from app.services.db_pool import ConnectionPool, PoolTimeoutError
+
+# LSN levado pelo cliente entre requisições (cookie para o frontend, header para outros clientes)
+REPLICA_LSN_COOKIE = "filasling_lsn"
+REPLICA_LSN_HEADER = "X-Min-LSN"
+_LSN_PATTERN = re.compile(r"^[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}$")
+
+# LSN mínimo exigido pelo cliente na requisição atual e LSN da escrita feita nela
+_request_lsn: ContextVar[Optional[dict]] = ContextVar("replica_request_lsn", default=None)
+
+
+def _lsn_key(lsn: str) -> tuple:
+    return tuple(int(parte, 16) for parte in lsn.split("/"))
+
+
+class ReplicaRouter:
+    """Distribui leituras entre réplicas e garante leitura das próprias escritas.
+
+    Após uma escrita, o LSN do primário é registrado para cada chave afetada
+    (ex.: "tickets"). Até `sticky_seconds` depois, leituras dessas chaves só vão
+    para uma réplica que já tenha reproduzido esse LSN; caso contrário, para o primário.
+    Escritas de outros workers chegam pelos avisos de invalidação (mark_remote_write /
+    resolve_remote_write), e o LSN da escrita volta ao cliente, que o reenvia nas
+    leituras seguintes a qualquer worker (ReadYourWritesMiddleware).
+    """
+
+    def __init__(self, pools: List[ConnectionPool], sticky_seconds: float, retry_seconds: float):
+        self.pools = pools
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self.order = itertools.cycle(range(len(pools))) if pools else None
+        self.lock = threading.Lock()
+        self.sticky = {}
+        self.down_until = [0.0] * len(pools)
+        self.reads = collections.Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.pools)
+
+    def mark_write(self, conn, *keys):
+        """Registra o LSN do primário após o commit de uma escrita nas chaves informadas."""
+        if not self.pools or not keys:
+            return
+        lsn = None
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_current_wal_lsn()::text")
+            lsn = cur.fetchone()[0]
+            cur.close()
+        except Exception as e:
+            # Sem LSN a chave fica presa ao primário durante toda a janela
+            print(f"Erro ao obter LSN do primário: {e}")
+        prazo = time.monotonic() + self.sticky_seconds
+        with self.lock:
+            for key in keys:
+                self.sticky[key] = (prazo, lsn)
+        estado = _request_lsn.get()
+        if estado is not None and lsn is not None:
+            estado["escrita"] = lsn
+        return lsn
+
+    def mark_remote_write(self, *keys):
+        """Escrita de outro worker (aviso recebido após o commit): as chaves vão para o
+        primário até resolve_remote_write informar um LSN posterior ao aviso."""
+        if not self.pools or not keys:
+            return
+        prazo = time.monotonic() + self.sticky_seconds
+        with self.lock:
+            for key in keys:
+                self.sticky[key] = (prazo, None)
+
+    def resolve_remote_write(self, keys: Iterable[str], lsn: str):
+        """Troca a marca sem LSN das chaves pelo LSN do primário lido após os avisos."""
+        prazo = time.monotonic() + self.sticky_seconds
+        with self.lock:
+            for key in keys:
+                entrada = self.sticky.get(key)
+                # Uma escrita local posterior já registrou um LSN maior
+                if entrada is not None and entrada[1] is None:
+                    self.sticky[key] = (prazo, lsn)
+
+    def _required_lsn(self, keys):
+        """Retorna (precisa_verificar, lsn) para as chaves com escrita recente."""
+        agora = time.monotonic()
+        exigidos = []
+        estado = _request_lsn.get()
+        if estado is not None and estado.get("minimo"):
+            exigidos.append(estado["minimo"])
+        with self.lock:
+            for key in keys:
+                entrada = self.sticky.get(key)
+                if entrada is None:
+                    continue
+                if entrada[0] < agora:
+                    del self.sticky[key]
+                    continue
+                exigidos.append(entrada[1])
+        if not exigidos:
+            return False, None
+        if None in exigidos:
+            return True, None
+        # LSNs no formato "X/Y" são comparados pelo próprio Postgres; basta o maior
+        return True, max(exigidos, key=_lsn_key)
+
+    def _caught_up(self, conn, lsn: str) -> bool:
+        cur = conn.cursor()
+        cur.execute("SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, true)", (lsn,))
+        ok = cur.fetchone()[0]
+        cur.close()
+        # Encerra a transação da verificação: a consulta seguinte pode definir o isolamento
+        conn.rollback()
+        return ok
+
+    def acquire(self, *keys):
+        """Conexão de uma réplica apta para as chaves, ou None para usar o primário."""
+        if not self.pools:
+            return None
+        verificar, lsn = self._required_lsn(keys)
+        if verificar and lsn is None:
+            self.reads["primario_escrita_recente"] += 1
+            return None
+
+        with self.lock:
+            inicio = next(self.order)
+        agora = time.monotonic()
+        for deslocamento in range(len(self.pools)):
+            indice = (inicio + deslocamento) % len(self.pools)
+            if self.down_until[indice] > agora:
+                continue
+            pool = self.pools[indice]
+            try:
+                conn = pool.acquire()
+            except PoolTimeoutError:
+                continue
+            except Exception as e:
+                self.down_until[indice] = agora + self.retry_seconds
+                print(f"Réplica {indice} indisponível, usando as demais ou o primário: {e}")
+                continue
+            try:
+                if verificar and not self._caught_up(conn, lsn):
+                    conn.close()
+                    self.reads["replica_atrasada"] += 1
+                    continue
+            except Exception as e:
+                conn.close()
+                print(f"Erro ao verificar atraso da réplica {indice}: {e}")
+                continue
+            self.reads["replica"] += 1
+            return conn
+
+        self.reads["primario"] += 1
+        return None
+
+    def prefill(self):
+        for indice, pool in enumerate(self.pools):
+            try:
+                pool.prefill()
+            except Exception as e:
+                # Réplicas fora do ar não impedem o startup: as leituras vão para o primário
+                print(f"Erro ao abrir conexões da réplica {indice}: {e}")
+
+    def closeall(self):
+        for pool in self.pools:
+            pool.closeall()
+
+    def stats(self) -> dict:
+        agora = time.monotonic()
+        return {
+            "ativas": len(self.pools),
+            "leituras": dict(self.reads),
+            "pools": [
+                {**pool.stats(), "disponivel": self.down_until[indice] <= agora}
+                for indice, pool in enumerate(self.pools)
+            ],
+        }
+
+
+class ReadYourWritesMiddleware:
+    """Leva o LSN das escritas ao cliente e o exige nas leituras seguintes dele.
+
+    A resposta de uma escrita traz o LSN do commit no cookie REPLICA_LSN_COOKIE e no
+    header REPLICA_LSN_HEADER. Enquanto o cookie vale (`max_age`), as leituras do
+    cliente, em qualquer worker, só usam réplicas que já reproduziram esse LSN.
+    """
+
+    def __init__(self, app, max_age: float):
+        self.app = app
+        self.max_age = max(1, int(max_age))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request = Request(scope)
+        minimo = request.headers.get(REPLICA_LSN_HEADER) or request.cookies.get(REPLICA_LSN_COOKIE)
+        estado = {"minimo": minimo if minimo and _LSN_PATTERN.match(minimo) else None, "escrita": None}
+        token = _request_lsn.set(estado)
+
+        async def send_with_lsn(message):
+            if message["type"] == "http.response.start" and estado["escrita"]:
+                lsn = estado["escrita"]
+                headers = list(message.get("headers", []))
+                headers.append((REPLICA_LSN_HEADER.lower().encode(), lsn.encode()))
+                headers.append((
+                    b"set-cookie",
+                    f"{REPLICA_LSN_COOKIE}={lsn}; Max-Age={self.max_age}; Path=/; HttpOnly; SameSite=Lax".encode(),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_lsn)
+        finally:
+            _request_lsn.reset(token)
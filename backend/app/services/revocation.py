@@ -0,0 +1,243 @@
+import asyncio
+import collections
+import math
+import os
+import time
+from typing import Dict, Iterable, Optional
+
+from psycopg2.extras import RealDictCursor
+from starlette.concurrency import run_in_threadpool
+
+# Revogação de tokens de acesso mantida em memória por cada worker
+REVOCATION_ENABLED = os.getenv("REVOCATION_ENABLED", "true").lower() == "true"
+# Intervalo máximo entre sincronizações (o barramento de invalidação antecipa a sincronização)
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+# Revogações confirmadas fora da ordem do id (transações concorrentes) são relidas nesta janela
+REVOCATION_SYNC_OVERLAP_SECONDS = float(os.getenv("REVOCATION_SYNC_OVERLAP_SECONDS", "60"))
+REVOCATION_CLEANUP_SECONDS = float(os.getenv("REVOCATION_CLEANUP_SECONDS", "3600"))
+
+REVOCATION_NAMESPACE = "revogacoes"
+
+
+def revoke_token(cur, jti: str, expira_em: float):
+    """Revoga um token de acesso (jti) até a sua expiração, na transação do cursor."""
+    return _insert(cur, "jti", jti, "to_timestamp(%s)", expira_em)
+
+
+def revoke_user(cur, user_id: str, validade_segundos: float):
+    """Revoga todos os tokens de acesso do usuário emitidos até agora, na transação do cursor.
+
+    A entrada vale pelo tempo de vida de um token de acesso; os refresh tokens do usuário
+    são revogados no banco e não podem mais gerar tokens novos.
+    """
+    cur.execute(
+        "UPDATE refresh_tokens SET revogado_em = now() WHERE usuario_id = %s AND revogado_em IS NULL",
+        (str(user_id),)
+    )
+    return _insert(cur, "usuario", str(user_id), "now() + make_interval(secs => %s)", validade_segundos)
+
+
+def _insert(cur, tipo: str, valor: str, expiracao_sql: str, expiracao):
+    from app.services.invalidation import publish_invalidation
+    # O instante da revogação vem do relógio da aplicação, o mesmo do iat dos tokens:
+    # now() do banco (início da transação, em outro servidor) não é comparável com o iat
+    cur.execute(
+        f"""
+        INSERT INTO token_revogacoes (tipo, valor, revogado_em, expira_em)
+        VALUES (%s, %s, to_timestamp(%s), {expiracao_sql})
+        RETURNING id, tipo, valor,
+                  extract(epoch FROM revogado_em)::float AS revogado_em,
+                  extract(epoch FROM expira_em)::float AS expira_em
+        """,
+        (tipo, valor, time.time(), expiracao)
+    )
+    row = cur.fetchone()
+    if not isinstance(row, dict):
+        row = dict(zip(("id", "tipo", "valor", "revogado_em", "expira_em"), row))
+    publish_invalidation(cur, REVOCATION_NAMESPACE)
+    return row
+
+
+class RevocationSet:
+    """Conjunto de revogações (jti e usuário) consultado a cada requisição autenticada.
+
+    Começa com uma carga completa das revogações ainda válidas e depois lê apenas as
+    novas (id > último visto, relendo a janela de sobreposição). As entradas saem do
+    conjunto quando expiram, então o tamanho é limitado pelo número de revogações feitas
+    durante o tempo de vida de um token de acesso.
+    """
+
+    def __init__(self):
+        self.jtis: Dict[str, float] = {}  # jti -> expiração
+        self.usuarios: Dict[str, float] = {}  # id do usuário -> instante da revogação
+        self.usuarios_expiram: Dict[str, float] = {}
+        # Usuários desativados (login.ativo falso), relidos a cada sincronização: cobre
+        # desativações feitas direto no banco, sem passar por revoke_user
+        self.inativos: frozenset = frozenset()
+        self.last_id = 0
+        self.synced_at: Optional[float] = None
+        self.cleaned_at = 0.0
+        self.dirty = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.counters = collections.Counter()
+
+    async def start(self):
+        if not REVOCATION_ENABLED or self.task is not None:
+            return
+        from app.services.invalidation import invalidation_bus
+        invalidation_bus.subscribe(REVOCATION_NAMESPACE, self.request_sync)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+    def request_sync(self, *_):
+        self.dirty.set()
+
+    # -- consulta -------------------------------------------------------------
+
+    def is_revoked(self, payload: dict) -> bool:
+        """Verifica em memória se o token (payload já validado) foi revogado."""
+        jti = payload.get("jti")
+        if jti is not None and jti in self.jtis:
+            self.counters["recusados_jti"] += 1
+            return True
+        user_id = str(payload.get("id"))
+        if user_id in self.inativos:
+            self.counters["recusados_inativo"] += 1
+            return True
+        revogado_em = self.usuarios.get(user_id)
+        if revogado_em is not None and self._issued_before(payload.get("iat", 0), revogado_em):
+            self.counters["recusados_usuario"] += 1
+            return True
+        return False
+
+    @staticmethod
+    def _issued_before(iat, revogado_em: float) -> bool:
+        # Tokens antigos, sem iat, são tratados como emitidos antes da revogação
+        if isinstance(iat, int):
+            # iat em segundos inteiros (tokens emitidos antes do iat em milissegundos):
+            # no mesmo segundo da revogação não dá para saber a ordem, e o token vale
+            return iat < math.floor(revogado_em)
+        return iat <= revogado_em
+
+    # -- sincronização --------------------------------------------------------
+
+    def apply(self, entradas: Iterable[dict]):
+        """Aplica revogações (lidas do banco ou recém-gravadas por este worker)."""
+        agora = time.time()
+        for entrada in entradas:
+            if entrada["expira_em"] <= agora:
+                continue
+            if entrada["tipo"] == "jti":
+                self.jtis[entrada["valor"]] = entrada["expira_em"]
+            elif entrada["tipo"] == "usuario":
+                # Mantém a revogação mais recente do usuário
+                if entrada["revogado_em"] >= self.usuarios.get(entrada["valor"], 0):
+                    self.usuarios[entrada["valor"]] = entrada["revogado_em"]
+                    self.usuarios_expiram[entrada["valor"]] = entrada["expira_em"]
+            self.counters["aplicadas"] += 1
+
+    def _prune(self):
+        agora = time.time()
+        for jti in [j for j, expira in self.jtis.items() if expira <= agora]:
+            del self.jtis[jti]
+        for user_id in [u for u, expira in self.usuarios_expiram.items() if expira <= agora]:
+            del self.usuarios[user_id]
+            del self.usuarios_expiram[user_id]
+
+    def _load(self, last_id: int, completa: bool):
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            filtro = "TRUE" if completa else \
+                "(id > %(last_id)s OR revogado_em > now() - make_interval(secs => %(janela)s))"
+            cur.execute(f"""
+                SELECT id, tipo, valor,
+                       extract(epoch FROM revogado_em)::float AS revogado_em,
+                       extract(epoch FROM expira_em)::float AS expira_em
+                FROM token_revogacoes
+                WHERE expira_em > now() AND {filtro}
+                ORDER BY id
+            """, {"last_id": last_id, "janela": REVOCATION_SYNC_OVERLAP_SECONDS})
+            rows = cur.fetchall()
+            cur.execute("SELECT id::text AS id FROM login WHERE ativo IS NOT TRUE")
+            inativos = frozenset(row["id"] for row in cur.fetchall())
+            cur.close()
+            conn.commit()
+            return rows, inativos
+        finally:
+            conn.close()
+
+    def _cleanup(self):
+        """Remove do banco as revogações e refresh tokens que já expiraram."""
+        from app.routers.auth.db import get_db_connection
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM token_revogacoes WHERE expira_em < now() - interval '1 day'")
+            revogacoes = cur.rowcount
+            cur.execute("DELETE FROM refresh_tokens WHERE expira_em < now() - interval '1 day'")
+            refresh = cur.rowcount
+            conn.commit()
+            cur.close()
+            return revogacoes, refresh
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    async def sync(self):
+        completa = self.synced_at is None
+        rows, inativos = await run_in_threadpool(self._load, self.last_id, completa)
+        self.apply(rows)
+        self.inativos = inativos
+        if rows:
+            self.last_id = max(self.last_id, rows[-1]["id"])
+        self._prune()
+        if completa:
+            print(f"Revogações de tokens carregadas: {len(self.jtis)} tokens, {len(self.usuarios)} usuários "
+                  f"e {len(self.inativos)} usuários inativos")
+        self.synced_at = time.time()
+        self.counters["sincronizacoes"] += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                self.counters["erros_sincronizacao"] += 1
+                print(f"Erro ao sincronizar revogações de tokens: {getattr(e, 'detail', e)}")
+            if time.time() - self.cleaned_at >= REVOCATION_CLEANUP_SECONDS:
+                try:
+                    revogacoes, refresh = await run_in_threadpool(self._cleanup)
+                    self.cleaned_at = time.time()
+                    if revogacoes or refresh:
+                        print(f"Limpeza de tokens: {revogacoes} revogações e {refresh} refresh tokens expirados removidos")
+                except Exception as e:
+                    print(f"Erro ao limpar tokens expirados: {getattr(e, 'detail', e)}")
+            self.dirty.clear()
+            try:
+                await asyncio.wait_for(self.dirty.wait(), timeout=REVOCATION_SYNC_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "ativo": self.task is not None,
+            "tokens_revogados": len(self.jtis),
+            "usuarios_revogados": len(self.usuarios),
+            "usuarios_inativos": len(self.inativos),
+            "ultimo_id": self.last_id,
+            "sincronizado_em": self.synced_at,
+            "contadores": dict(self.counters),
+        }
+
+
+revocation_set = RevocationSet()
@@ -0,0 +1,109 @@
+import asyncio
+import functools
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+
+class SingleFlight:
+    """Executa uma única vez chamadas concorrentes com a mesma chave.
+
+    Quem chega enquanto uma execução está em andamento aguarda o mesmo resultado
+    (ou a mesma exceção). O resultado é compartilhado entre os chamadores, portanto
+    não deve ser modificado por eles.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        """Executa fn() para a chave, ou aguarda a execução já em andamento."""
+        self.calls += 1
+
+        pending = self.in_flight.get(key)
+        if pending is not None:
+            self.collapsed += 1
+            # shield: o cancelamento de um chamador não cancela a execução compartilhada
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        self.executions += 1
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.errors += 1
+            future.set_exception(e)
+            # Evitar aviso de exceção não recuperada quando ninguém aguardava
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self.in_flight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "collapsed": self.collapsed,
+            "errors": self.errors,
+            "in_flight": len(self.in_flight),
+        }
+
+
+# Grupos registrados por nome, para expor as estatísticas em /api/metrics
+_groups: Dict[str, SingleFlight] = {}
+
+
+def get_group(name: str) -> SingleFlight:
+    """Retorna (criando se necessário) o grupo de coalescência com o nome informado."""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+
+def singleflight_stats() -> dict:
+    """Estatísticas de todos os grupos registrados."""
+    return {name: group.stats() for name, group in _groups.items()}
+
+
+def _default_key(args: tuple, kwargs: dict) -> Hashable:
+    return (args, tuple(sorted(kwargs.items())))
+
+
+def singleflight(name: Optional[str] = None, key: Optional[Callable[..., Hashable]] = None):
+    """Decorador que coalesce chamadas concorrentes com os mesmos argumentos.
+
+    Funções síncronas (consultas com psycopg2, por exemplo) passam a ser executadas
+    no threadpool, e a função decorada passa a ser sempre assíncrona.
+    """
+    def decorator(func):
+        group = get_group(name or func.__qualname__)
+        is_coroutine = asyncio.iscoroutinefunction(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            call_key = key(*args, **kwargs) if key else _default_key(args, kwargs)
+            if is_coroutine:
+                return await group.do(call_key, lambda: func(*args, **kwargs))
+            return await group.do(call_key, lambda: run_in_threadpool(func, *args, **kwargs))
+
+        wrapper.group = group
+        return wrapper
+
+    return decorator
+
+
+def singleflight_dependency(name: str):
+    """Dependência do FastAPI que injeta o grupo de coalescência nomeado."""
+    def dependency() -> SingleFlight:
+        return get_group(name)
+    return dependency
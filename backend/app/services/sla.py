@@ -0,0 +1,394 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from psycopg2.extras import RealDictCursor
+from starlette.concurrency import run_in_threadpool
+
+# Detector de violação de SLA dos tickets aguardando atendimento
+SLA_ENABLED = os.getenv("SLA_ENABLED", "true").lower() == "true"
+# Mesmos padrões das configurações do frontend (warningTimeMinutes / criticalTimeMinutes)
+SLA_WARNING_MINUTES = float(os.getenv("SLA_WARNING_MINUTES", "10"))
+SLA_CRITICAL_MINUTES = float(os.getenv("SLA_CRITICAL_MINUTES", "20"))
+SLA_ETAPAS = [int(n) for n in os.getenv("SLA_ETAPAS", "1").split(",") if n.strip()]
+SLA_TICK_SECONDS = float(os.getenv("SLA_TICK_SECONDS", "1"))
+SLA_RESYNC_SECONDS = float(os.getenv("SLA_RESYNC_SECONDS", "300"))
+SLA_MAX_EVENTS = int(os.getenv("SLA_MAX_EVENTS", "1000"))
+
+
+def _epoch(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+class Timer:
+    __slots__ = ("expira", "ticket_id", "nivel", "posicao", "cancelado")
+
+    def __init__(self, expira: int, ticket_id: str, nivel: str):
+        self.expira = expira  # em ticks
+        self.ticket_id = ticket_id
+        self.nivel = nivel
+        self.posicao = None  # (nível da roda, slot) enquanto estiver em uma roda
+        self.cancelado = False
+
+    def __lt__(self, other):
+        return self.expira < other.expira
+
+
+class TimingWheel:
+    """Roda de tempo hierárquica (Varghese & Lauck).
+
+    A roda 0 tem `slots` posições de um tick; cada roda seguinte cobre `slots` voltas da
+    anterior. Inserir e cancelar são O(1); cada tick processa um slot da roda 0 e, nas
+    viradas, redistribui um slot da roda de cima (cada timer desce no máximo `levels`
+    vezes). Prazos além do horizonte ficam em um heap até entrarem no horizonte.
+    """
+
+    def __init__(self, tick_atual: int, slots: int = 64, levels: int = 4):
+        self.slots = slots
+        self.levels = levels
+        self.current = tick_atual
+        self.wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.spans = [slots ** level for level in range(levels + 1)]
+        self.overflow: List[Timer] = []
+        self.due: List[Timer] = []
+        self.size = 0
+
+    def add(self, timer: Timer):
+        self.size += 1
+        self._place(timer)
+
+    def _place(self, timer: Timer):
+        delta = timer.expira - self.current
+        if delta <= 0:
+            timer.posicao = None
+            self.due.append(timer)
+            return
+        for level in range(self.levels):
+            if delta < self.spans[level + 1]:
+                slot = (timer.expira // self.spans[level]) % self.slots
+                self.wheels[level][slot].add(timer)
+                timer.posicao = (level, slot)
+                return
+        timer.posicao = None
+        heapq.heappush(self.overflow, timer)
+
+    def cancel(self, timer: Timer):
+        if timer.cancelado:
+            return
+        timer.cancelado = True
+        self.size -= 1
+        if timer.posicao is not None:
+            level, slot = timer.posicao
+            self.wheels[level][slot].discard(timer)
+            timer.posicao = None
+        # No heap e na lista de vencidos a remoção é preguiçosa (ignorados ao sair)
+
+    def advance(self, tick_alvo: int) -> List[Timer]:
+        """Avança até tick_alvo e retorna os timers vencidos (não cancelados)."""
+        vencidos = []
+        while self.current < tick_alvo:
+            self.current += 1
+            # Viradas: o slot correspondente da roda de cima desce para as rodas de baixo
+            for level in range(1, self.levels):
+                if self.current % self.spans[level]:
+                    break
+                slot = (self.current // self.spans[level]) % self.slots
+                timers, self.wheels[level][slot] = self.wheels[level][slot], set()
+                for timer in timers:
+                    self._place(timer)
+            while self.overflow and self.overflow[0].expira - self.current < self.spans[self.levels]:
+                timer = heapq.heappop(self.overflow)
+                if not timer.cancelado:
+                    self._place(timer)
+            slot = self.current % self.slots
+            timers, self.wheels[0][slot] = self.wheels[0][slot], set()
+            self.due.extend(timers)
+            if self.due:
+                for timer in self.due:
+                    if not timer.cancelado:
+                        timer.posicao = None
+                        timer.cancelado = True
+                        self.size -= 1
+                        vencidos.append(timer)
+                self.due = []
+        return vencidos
+
+
+class SlaMonitor:
+    """Agenda os prazos de SLA de cada ticket aberto e emite eventos quando são ultrapassados.
+
+    Alimentado pelas escritas deste worker (ticket_created/updated/removed) e reconstruído
+    do banco no startup e periodicamente. Avisos de escrita de outros workers releem só
+    os tickets alterados; avisos sem ids (ou reconexão do barramento) disparam a
+    reconstrução completa. Prazos já vencidos na reconstrução entram como violações
+    atuais, sem novo evento.
+    """
+
+    def __init__(self):
+        self.limites = [("atencao", SLA_WARNING_MINUTES * 60), ("critico", SLA_CRITICAL_MINUTES * 60)]
+        self.wheel: Optional[TimingWheel] = None
+        self.timers: Dict[str, List[Timer]] = {}
+        self.tickets: Dict[str, dict] = {}
+        self.violacoes: Dict[str, str] = {}  # ticket_id -> nível mais alto já ultrapassado
+        self.events = collections.deque(maxlen=SLA_MAX_EVENTS)
+        self.seq = itertools.count(1)
+        self.ultimo_seq = 0
+        self.subscribers: List[Callable[[dict], None]] = []
+        self.novos_eventos: Optional[asyncio.Condition] = None
+        self.dirty = asyncio.Event()
+        self.full_resync = True
+        self.pending_ids = set()
+        self.tasks: List[asyncio.Task] = []
+        self.synced_at: Optional[float] = None
+        self.loading_since: Optional[float] = None
+        self.removed_while_loading = set()
+        self.counters = collections.Counter()
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        """Registra um callback (no event loop) chamado a cada violação."""
+        self.subscribers.append(callback)
+
+    def _tick(self, agora: Optional[float] = None) -> int:
+        return int((time.time() if agora is None else agora) // SLA_TICK_SECONDS)
+
+    async def start(self):
+        if not SLA_ENABLED or self.tasks:
+            return
+        from app.services.invalidation import invalidation_bus
+        self.wheel = TimingWheel(self._tick())
+        self.novos_eventos = asyncio.Condition()
+        invalidation_bus.subscribe("tickets", self.request_resync)
+        self.tasks = [asyncio.create_task(self._run_ticks()), asyncio.create_task(self._run_resync())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def request_resync(self, namespace: Optional[str] = None, ids: Optional[List[str]] = None):
+        if ids is None:
+            self.full_resync = True
+        else:
+            self.pending_ids.update(str(i) for i in ids)
+        if self.full_resync or self.pending_ids:
+            self.dirty.set()
+
+    # -- agenda ---------------------------------------------------------------
+
+    def _track(self, ticket_id: str, nome: Optional[str], setor: Optional[str], data_criado: float, silencioso: bool):
+        if ticket_id in self.timers:
+            return
+        self.tickets[ticket_id] = {"nome": nome, "setor": setor, "data_criado": data_criado, "desde": time.time()}
+        self.timers[ticket_id] = []
+        agora = time.time()
+        for nivel, segundos in self.limites:
+            prazo = data_criado + segundos
+            if silencioso and prazo <= agora:
+                # Violação anterior à reconstrução: já foi avisada (ou perdida) antes do restart
+                self.violacoes[ticket_id] = nivel
+                continue
+            timer = Timer(int(-(-prazo // SLA_TICK_SECONDS)), ticket_id, nivel)
+            self.timers[ticket_id].append(timer)
+            self.wheel.add(timer)
+
+    def _untrack(self, ticket_id: str):
+        for timer in self.timers.pop(ticket_id, []):
+            self.wheel.cancel(timer)
+        self.tickets.pop(ticket_id, None)
+        self.violacoes.pop(ticket_id, None)
+        if self.loading_since is not None:
+            self.removed_while_loading.add(ticket_id)
+
+    def ticket_created(self, ticket: dict):
+        if self.wheel is not None and ticket.get("etapa_numero") in SLA_ETAPAS:
+            self._track(str(ticket["id"]), ticket.get("nome"), ticket.get("setor"),
+                        _epoch(ticket["data_criado"]), silencioso=False)
+
+    def ticket_updated(self, etapa_anterior: int, ticket: dict):
+        if self.wheel is None:
+            return
+        ticket_id = str(ticket["id"])
+        if ticket.get("etapa_numero") in SLA_ETAPAS:
+            if etapa_anterior not in SLA_ETAPAS:
+                self._track(ticket_id, ticket.get("nome"), ticket.get("setor"),
+                            _epoch(ticket["data_criado"]), silencioso=False)
+            elif ticket_id in self.tickets:
+                self.tickets[ticket_id].update(nome=ticket.get("nome"), setor=ticket.get("setor"))
+        else:
+            self._untrack(ticket_id)
+
+    def ticket_removed(self, ticket_id: str):
+        if self.wheel is not None:
+            self._untrack(str(ticket_id))
+
+    # -- laços ----------------------------------------------------------------
+
+    async def _run_ticks(self):
+        while True:
+            proximo = (self.wheel.current + 1) * SLA_TICK_SECONDS
+            await asyncio.sleep(max(0.0, proximo - time.time()))
+            inicio = time.perf_counter()
+            vencidos = self.wheel.advance(self._tick())
+            for timer in vencidos:
+                self._emit(timer)
+            if vencidos:
+                async with self.novos_eventos:
+                    self.novos_eventos.notify_all()
+            self.counters["ticks"] += 1
+            self.counters["ultimo_tick_us"] = int((time.perf_counter() - inicio) * 1_000_000)
+
+    def _emit(self, timer: Timer):
+        ticket = self.tickets.get(timer.ticket_id, {})
+        self.violacoes[timer.ticket_id] = timer.nivel
+        self.ultimo_seq = next(self.seq)
+        evento = {
+            "seq": self.ultimo_seq,
+            "tipo": "sla",
+            "nivel": timer.nivel,
+            "ticket_id": timer.ticket_id,
+            "nome": ticket.get("nome"),
+            "setor": ticket.get("setor"),
+            "data_criado": ticket.get("data_criado"),
+            "limite_minutos": dict(self.limites)[timer.nivel] / 60,
+            "ts": time.time(),
+        }
+        self.events.append(evento)
+        self.counters[f"violacoes_{timer.nivel}"] += 1
+        for callback in self.subscribers:
+            try:
+                callback(evento)
+            except Exception as e:
+                print(f"Erro ao processar violação de SLA do ticket {timer.ticket_id}: {e}")
+
+    def _load(self, ids: Optional[List[str]] = None):
+        from app.routers.auth.db import get_db_connection, get_read_connection
+        if ids is None:
+            conn = get_read_connection("tickets")
+            filtro, params = "", (SLA_ETAPAS,)
+        else:
+            # O aviso chega logo após o commit no primário: uma réplica ainda pode não ter a escrita
+            conn = get_db_connection()
+            filtro, params = "AND id = ANY(%s::uuid[])", (SLA_ETAPAS, ids)
+        try:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute(f"""
+                SELECT id::text AS id, nome, setor, data_criado
+                FROM tickets
+                WHERE etapa_numero = ANY(%s) {filtro}
+            """, params)
+            rows = cur.fetchall()
+            cur.close()
+            return rows
+        finally:
+            conn.close()
+
+    async def resync(self, ids: Optional[List[str]] = None):
+        """Reconcilia a agenda com o banco, mantendo os timers dos tickets que continuam abertos.
+
+        Com `ids`, relê apenas esses tickets; sem, todos os tickets abertos.
+        """
+        self.loading_since = time.time()
+        self.removed_while_loading = set()
+        try:
+            rows = await run_in_threadpool(self._load, ids)
+        finally:
+            inicio, self.loading_since = self.loading_since, None
+        abertos = {row["id"]: row for row in rows}
+        candidatos = list(self.tickets) if ids is None else [t for t in ids if t in self.tickets]
+        # Escritas locais feitas durante a consulta podem não estar no resultado
+        for ticket_id in [t for t in candidatos if t not in abertos and self.tickets[t]["desde"] < inicio]:
+            self._untrack(ticket_id)
+        primeira = self.synced_at is None
+        for ticket_id, row in abertos.items():
+            if ticket_id in self.removed_while_loading:
+                continue
+            if ticket_id not in self.tickets:
+                # Na reconstrução (startup) prazos já vencidos não geram evento; depois, sim
+                self._track(ticket_id, row["nome"], row["setor"], _epoch(row["data_criado"]), silencioso=primeira)
+            elif ids is not None:
+                self.tickets[ticket_id].update(nome=row["nome"], setor=row["setor"])
+        if ids is None:
+            self.synced_at = time.time()
+            self.counters["sincronizacoes"] += 1
+        else:
+            self.counters["sincronizacoes_parciais"] += 1
+
+    async def _run_resync(self):
+        while True:
+            self.dirty.clear()
+            completa, ids = self.full_resync, list(self.pending_ids)
+            self.full_resync = False
+            self.pending_ids = set()
+            try:
+                if completa:
+                    await self.resync()
+                elif ids:
+                    await self.resync(ids)
+            except Exception as e:
+                self.counters["erros_sincronizacao"] += 1
+                # Os tickets não relidos ficam para a próxima reconstrução completa
+                self.full_resync = True
+                print(f"Erro ao sincronizar agenda de SLA: {getattr(e, 'detail', e)}")
+            try:
+                await asyncio.wait_for(self.dirty.wait(), timeout=SLA_RESYNC_SECONDS)
+                # Agrupa rajadas de avisos em uma única consulta
+                await asyncio.sleep(1)
+            except asyncio.TimeoutError:
+                self.full_resync = True
+
+    # -- consulta -------------------------------------------------------------
+
+    def events_after(self, desde: int) -> List[dict]:
+        return [evento for evento in self.events if evento["seq"] > desde]
+
+    async def wait_events(self, desde: int, timeout: float) -> List[dict]:
+        """Long polling: aguarda até `timeout` segundos por eventos posteriores a `desde`."""
+        eventos = self.events_after(desde)
+        if eventos or self.novos_eventos is None:
+            return eventos
+        try:
+            async with self.novos_eventos:
+                await asyncio.wait_for(
+                    self.novos_eventos.wait_for(lambda: self.ultimo_seq > desde), timeout
+                )
+        except asyncio.TimeoutError:
+            pass
+        return self.events_after(desde)
+
+    def breaches(self) -> List[dict]:
+        agora = time.time()
+        return sorted(
+            (
+                {
+                    "ticket_id": ticket_id,
+                    "nivel": nivel,
+                    "nome": self.tickets.get(ticket_id, {}).get("nome"),
+                    "setor": self.tickets.get(ticket_id, {}).get("setor"),
+                    "espera_segundos": round(agora - self.tickets[ticket_id]["data_criado"])
+                    if ticket_id in self.tickets else None,
+                }
+                for ticket_id, nivel in self.violacoes.items()
+            ),
+            key=lambda item: -(item["espera_segundos"] or 0)
+        )
+
+    def stats(self) -> dict:
+        return {
+            "ativo": bool(self.tasks),
+            "tickets_monitorados": len(self.tickets),
+            "timers": self.wheel.size if self.wheel is not None else 0,
+            "em_violacao": len(self.violacoes),
+            "sincronizado_em": self.synced_at,
+            "contadores": dict(self.counters),
+        }
+
+
+sla_monitor = SlaMonitor()
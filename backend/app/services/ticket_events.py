@@ -0,0 +1,111 @@
+from datetime import datetime
+from typing import List, Optional
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+from app.routers.auth.db import get_read_connection
+
+# Intervalos de permanência em cada etapa, reconstruídos a partir do histórico.
+# O intervalo aberto (etapa atual) termina em CURRENT_TIMESTAMP.
+_INTERVALOS_SQL = """
+    SELECT ticket_id, etapa_numero, data_evento AS entrada,
+           LEAD(data_evento) OVER (PARTITION BY ticket_id ORDER BY data_evento, id) AS saida
+    FROM ticket_events
+    WHERE {filtro}
+"""
+
+
+def record_ticket_event(
+    cur,
+    ticket_id: str,
+    tipo: str,
+    etapa_numero: Optional[int] = None,
+    etapa_anterior: Optional[int] = None,
+    atendente_id: Optional[str] = None,
+    usuario: Optional[str] = None,
+):
+    """Registra um evento do ticket usando o cursor da transação da escrita principal."""
+    cur.execute(
+        """
+        INSERT INTO ticket_events (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, usuario)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        """,
+        (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, usuario)
+    )
+
+
+def record_ticket_events(cur, eventos: List[tuple]):
+    """Registra vários eventos em um único INSERT.
+
+    Cada evento é (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, usuario).
+    """
+    execute_values(
+        cur,
+        """
+        INSERT INTO ticket_events (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, usuario)
+        VALUES %s
+        """,
+        eventos,
+        page_size=max(len(eventos), 1)
+    )
+
+
+def get_ticket_dwell_times(ticket_ids: List[str]) -> dict:
+    """Tempo de permanência por etapa de cada ticket, indexado pelo id do ticket."""
+    conn = get_read_connection("tickets")
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(f"""
+            WITH intervalos AS ({_INTERVALOS_SQL.format(filtro="ticket_id = ANY(%s::uuid[])")})
+            SELECT ticket_id::text AS ticket_id, etapa_numero,
+                   MIN(entrada) AS primeira_entrada,
+                   EXTRACT(EPOCH FROM SUM(COALESCE(saida, CURRENT_TIMESTAMP) - entrada))::float AS segundos,
+                   BOOL_OR(saida IS NULL) AS atual
+            FROM intervalos
+            WHERE etapa_numero IS NOT NULL
+            GROUP BY ticket_id, etapa_numero
+            ORDER BY ticket_id, MIN(entrada)
+        """, (ticket_ids,))
+        rows = cur.fetchall()
+        cur.close()
+    finally:
+        conn.close()
+
+    result = {ticket_id: [] for ticket_id in ticket_ids}
+    for row in rows:
+        result.setdefault(row.pop("ticket_id"), []).append(row)
+    return result
+
+
+def get_stage_dwell_stats(data_inicio: datetime, data_fim: datetime) -> list:
+    """Estatísticas de permanência por etapa para entradas ocorridas no período."""
+    # Relatório agregado: alguns segundos de atraso da réplica são aceitáveis
+    conn = get_read_connection()
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        # O filtro inferior usa o índice BRIN; a saída de cada intervalo pode estar após data_fim
+        cur.execute(f"""
+            WITH intervalos AS ({_INTERVALOS_SQL.format(filtro="data_evento >= %(inicio)s")}),
+            duracoes AS (
+                SELECT etapa_numero, saida IS NULL AS aberto,
+                       EXTRACT(EPOCH FROM COALESCE(saida, CURRENT_TIMESTAMP) - entrada) AS segundos
+                FROM intervalos
+                WHERE etapa_numero IS NOT NULL AND entrada < %(fim)s
+            )
+            SELECT d.etapa_numero, e.nome AS etapa_nome,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE d.aberto) AS em_andamento,
+                   AVG(d.segundos)::float AS media_segundos,
+                   percentile_cont(0.5) WITHIN GROUP (ORDER BY d.segundos) AS p50_segundos,
+                   percentile_cont(0.9) WITHIN GROUP (ORDER BY d.segundos) AS p90_segundos,
+                   MAX(d.segundos)::float AS max_segundos
+            FROM duracoes d
+            LEFT JOIN etapas e ON e.numero = d.etapa_numero
+            GROUP BY d.etapa_numero, e.nome
+            ORDER BY d.etapa_numero
+        """, {"inicio": data_inicio, "fim": data_fim})
+        rows = cur.fetchall()
+        cur.close()
+        return rows
+    finally:
+        conn.close()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Intervalo entre tentativas de aquecimento quando o banco ainda não está disponível
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+
+class WarmupState:
+    """Estado do aquecimento da aplicação, consultado pelo endpoint de readiness."""
+
+    def __init__(self):
+        self.ready = False
+        self.tentativas = 0
+        self.etapas: dict = {}
+        self.erro: Optional[str] = None
+        self.iniciado_em = time.time()
+        self.concluido_em: Optional[float] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "tentativas": self.tentativas,
+            "etapas_ms": self.etapas,
+            "erro": self.erro,
+            "duracao_segundos": round((self.concluido_em or time.time()) - self.iniciado_em, 3),
+        }
+
+
+warmup_state = WarmupState()
+
+
+def _warm_passlib():
+    # Inicializa o backend bcrypt do passlib (feito de forma preguiçosa no primeiro uso)
+    from app.routers.auth.security import pwd_context
+    pwd_context.verify("aquecimento", pwd_context.hash("aquecimento"))
+
+
+def _warm_jwt():
+    from app.routers.auth.security import create_access_token, decode_token
+    decode_token(create_access_token({"sub": "aquecimento", "id": "0"}))
+
+
+def _warm_imports():
+    # Bibliotecas pesadas importadas sob demanda (cubo de chegadas e avatares): carregadas
+    # aqui para que a primeira requisição que as usa não pague a importação
+    import numpy
+    import PIL.Image
+    import PIL.ImageOps
+
+
+async def _run_step(nome: str, func):
+    inicio = time.perf_counter()
+    await func()
+    warmup_state.etapas[nome] = round((time.perf_counter() - inicio) * 1000, 1)
+
+
+async def _warm_all():
+    from app.routers.auth.db import init_db_pool
+    from app.routers.etapas import _fetch_etapas
+    from app.routers.atendentes import _fetch_atendentes
+
+    await _run_step("pool_conexoes", lambda: run_in_threadpool(init_db_pool))
+    await _run_step("passlib", lambda: run_in_threadpool(_warm_passlib))
+    await _run_step("jwt", lambda: run_in_threadpool(_warm_jwt))
+    await _run_step("importacoes", lambda: run_in_threadpool(_warm_imports))
+    # Primeira execução das consultas mais usadas no carregamento do dashboard
+    await _run_step("etapas", _fetch_etapas)
+    await _run_step("atendentes", _fetch_atendentes)
+
+
+async def run_warmup():
+    """Aquece conexões e caminhos de código críticos; repete até conseguir."""
+    while not warmup_state.ready:
+        warmup_state.tentativas += 1
+        try:
+            await _warm_all()
+            warmup_state.ready = True
+            warmup_state.erro = None
+            warmup_state.concluido_em = time.time()
+            print(f"Aquecimento concluído: {warmup_state.etapas}")
+        except Exception as e:
+            warmup_state.erro = str(getattr(e, "detail", e))
+            print(f"Erro no aquecimento (tentativa {warmup_state.tentativas}): {warmup_state.erro}")
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
@@ -0,0 +1,8 @@
+-- migracao: sem-transacao
+-- Índices da listagem paginada de atendentes (init-scripts/06) em bancos criados antes deles.
+-- CONCURRENTLY não bloqueia as escritas em atendentes durante a construção.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_atendentes_nome_id ON atendentes (nome, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_atendentes_ativo_nome_id ON atendentes (ativo, nome, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_atendentes_nome_prefixo ON atendentes (lower(nome) text_pattern_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_atendentes_email_prefixo ON atendentes (lower(email) text_pattern_ops);
@@ -0,0 +1,14 @@
+-- Chaves de idempotência das escritas de tickets (init-scripts/07) em bancos já existentes.
+-- Tabela nova e vazia: o índice pode ser criado na mesma transação.
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  chave BYTEA PRIMARY KEY,            -- sha256(usuário, rota, Idempotency-Key), 16 bytes
+  rota VARCHAR(50) NOT NULL,
+  fingerprint BYTEA NOT NULL,         -- hash dos parâmetros da requisição original
+  status_code SMALLINT,
+  resposta JSONB,
+  expira_em TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Usado pela remoção periódica dos registros expirados
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expira_em ON idempotency_keys(expira_em);
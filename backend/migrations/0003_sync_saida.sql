@@ -0,0 +1,14 @@
+-- Fila de sincronização com o sistema externo (init-scripts/08) em bancos já existentes.
+
+CREATE TABLE IF NOT EXISTS sync_saida (
+  ticket_id UUID PRIMARY KEY,
+  versao INTEGER NOT NULL DEFAULT 1,           -- incrementada a cada mudança ainda não enviada
+  status VARCHAR(20) NOT NULL DEFAULT 'pendente',  -- pendente, falhou
+  tentativas INTEGER NOT NULL DEFAULT 0,
+  proximo_envio TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  erro TEXT,
+  criado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Índice parcial usado para buscar o próximo lote pronto
+CREATE INDEX IF NOT EXISTS idx_sync_saida_pendentes ON sync_saida(proximo_envio) WHERE status = 'pendente';
@@ -0,0 +1,6 @@
+-- migracao: sem-transacao
+-- Índice de data_criado dos tickets (init-scripts/01) em bancos criados antes dele.
+-- Usado pela exportação por período e pela listagem com janela (GET /api/tickets?horas=).
+-- CONCURRENTLY não bloqueia as escritas em tickets durante a construção.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tickets_data_criado ON tickets (data_criado);
@@ -0,0 +1,72 @@
+"""Busca textual e por similaridade dos tickets (init-scripts/03) em bancos existentes.
+
+Uma coluna gerada STORED reescreveria a tabela inteira sob bloqueio exclusivo, então
+search_vector é criada como coluna comum (alteração só de catálogo), mantida por trigger
+e preenchida em lotes; os índices GIN são construídos com CONCURRENTLY.
+
+Bancos que já têm search_vector como coluna gerada (criados pelas versões anteriores do
+init-scripts/03) mantêm a coluna e recebem apenas os índices que faltarem.
+"""
+
+FUNCOES = """
+CREATE OR REPLACE FUNCTION tickets_busca_vetor(nome TEXT, motivo TEXT, user_ns TEXT, setor TEXT)
+RETURNS tsvector AS $$
+  SELECT setweight(to_tsvector('portuguese', coalesce(nome, '')), 'A') ||
+         setweight(to_tsvector('portuguese', coalesce(motivo, '')), 'B') ||
+         setweight(to_tsvector('simple', coalesce(user_ns, '')), 'C') ||
+         setweight(to_tsvector('simple', coalesce(setor, '')), 'C')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION tickets_atualiza_busca() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector := tickets_busca_vetor(NEW.nome, NEW.motivo, NEW.user_ns, NEW.setor);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def _coluna_gerada(ctx):
+    """None se search_vector não existe; senão, se é uma coluna gerada."""
+    cur = ctx.conn.cursor()
+    cur.execute("""
+        SELECT attgenerated <> ''
+        FROM pg_attribute
+        WHERE attrelid = 'tickets'::regclass AND attname = 'search_vector' AND NOT attisdropped
+    """)
+    row = cur.fetchone()
+    cur.close()
+    return row[0] if row else None
+
+
+def upgrade(ctx):
+    ctx.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    if not _coluna_gerada(ctx):
+        ctx.execute("ALTER TABLE tickets ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        for comando in FUNCOES.split(";\n\n"):
+            ctx.execute(comando)
+        # Linhas novas e alteradas passam a ter o vetor antes do backfill das antigas
+        ctx.execute("DROP TRIGGER IF EXISTS trg_tickets_busca ON tickets")
+        ctx.execute("""
+            CREATE TRIGGER trg_tickets_busca
+            BEFORE INSERT OR UPDATE OF nome, motivo, user_ns, setor ON tickets
+            FOR EACH ROW EXECUTE FUNCTION tickets_atualiza_busca()
+        """)
+        ctx.backfill(
+            """
+            UPDATE tickets SET search_vector = tickets_busca_vetor(nome, motivo, user_ns, setor)
+            WHERE id IN (SELECT id FROM tickets WHERE search_vector IS NULL LIMIT %(batch_size)s)
+            """,
+            batch_size=2000,
+            # No dry-run a coluna ainda pode não existir: estima pelo total de linhas
+            contagem_sql="SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'tickets'::regclass",
+        )
+
+    ctx.create_index_concurrently("idx_tickets_search_vector", "tickets", "USING GIN (search_vector)")
+    ctx.create_index_concurrently("idx_tickets_nome_trgm", "tickets", "USING GIN (nome gin_trgm_ops)")
+    ctx.create_index_concurrently(
+        "idx_tickets_telefone_digitos_trgm", "tickets",
+        "USING GIN ((regexp_replace(coalesce(telefone, ''), '\\D', '', 'g')) gin_trgm_ops)"
+    )
+    ctx.create_index_concurrently("idx_tickets_user_ns_trgm", "tickets", "USING GIN (user_ns gin_trgm_ops)")
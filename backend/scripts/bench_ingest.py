@@ -0,0 +1,172 @@
+"""Benchmark da criação de tickets: uma transação por ticket x group commit.
+
+Executa create_ticket (a mesma função do endpoint POST /api/tickets) com N chamadores
+concorrentes durante alguns segundos, em um banco dedicado, e mostra criações por
+segundo e latência para cada nível de concorrência.
+
+Uso (a partir de backend/, com um Postgres acessível pelas variáveis DB_*):
+    python scripts/bench_ingest.py
+    python scripts/bench_ingest.py --concorrencia 1,8,64 --duracao 10 --lote 200 --espera-ms 2
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config  # noqa: E402  (carrega o .env)
+
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "filasling_bench")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+INIT_SCRIPTS_DIR = os.path.join(ROOT_DIR, "init-scripts")
+
+# A aplicação passa a usar o banco do benchmark (lido na importação de app.routers.auth.db)
+os.environ["DB_NAME"] = BENCH_DB_NAME
+os.environ.setdefault("INVALIDATION_BUS_ENABLED", "false")
+
+
+def _connect(dbname: str):
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", "postgres"),
+        dbname=dbname,
+    )
+
+
+def prepare_database() -> list:
+    """Cria o banco do benchmark (esquema dos init-scripts) e retorna ids de atendentes."""
+    admin = _connect(os.getenv("BENCH_ADMIN_DB", "postgres"))
+    admin.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = admin.cursor()
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (BENCH_DB_NAME,))
+    novo = cur.fetchone() is None
+    if novo:
+        print(f"Criando banco do benchmark {BENCH_DB_NAME}")
+        cur.execute(f'CREATE DATABASE "{BENCH_DB_NAME}"')
+    cur.close()
+    admin.close()
+
+    conn = _connect(BENCH_DB_NAME)
+    cur = conn.cursor()
+    if novo:
+        for caminho in sorted(glob.glob(os.path.join(INIT_SCRIPTS_DIR, "*.sql"))):
+            with open(caminho) as f:
+                cur.execute(f.read())
+    cur.execute("""
+        INSERT INTO atendentes (nome, email)
+        SELECT 'Atendente ' || g, 'bench' || g || '@exemplo.com' FROM generate_series(1, 20) g
+        ON CONFLICT (email) DO NOTHING
+    """)
+    cur.execute("SELECT id::text FROM atendentes WHERE email LIKE 'bench%%@exemplo.com'")
+    atendentes = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    conn.close()
+    return atendentes
+
+
+def reset_tables():
+    conn = _connect(BENCH_DB_NAME)
+    cur = conn.cursor()
+    cur.execute("TRUNCATE tickets, ticket_events, jobs")
+    conn.commit()
+    conn.close()
+
+
+async def run_level(concorrencia: int, duracao: float, atendentes: list) -> dict:
+    from app.routers import tickets
+
+    latencias = []
+    erros = [0]
+    fim = time.perf_counter() + duracao
+
+    async def chamador(n: int):
+        i = 0
+        while time.perf_counter() < fim:
+            ticket = tickets.TicketCreate(
+                nome=f"Cliente {n}-{i}", motivo="benchmark", telefone="(11) 90000-0000",
+                setor="TI", user_ns=f"bench{n}", atendente_id=atendentes[(n + i) % len(atendentes)]
+            )
+            inicio = time.perf_counter()
+            try:
+                await tickets.create_ticket(ticket, {"usuario": "bench"}, None)
+                latencias.append(time.perf_counter() - inicio)
+            except Exception as e:
+                erros[0] += 1
+                if erros[0] == 1:
+                    print(f"    erro: {getattr(e, 'detail', e)}")
+            i += 1
+            # Devolve o controle ao event loop entre chamadas, como entre requisições HTTP
+            await asyncio.sleep(0)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[chamador(n) for n in range(concorrencia)])
+    total = time.perf_counter() - inicio
+    latencias.sort()
+
+    def percentil(p: float):
+        return latencias[min(len(latencias) - 1, int(p * len(latencias)))] * 1000 if latencias else 0.0
+
+    return {
+        "criacoes_por_segundo": len(latencias) / total,
+        "p50_ms": percentil(0.5),
+        "p99_ms": percentil(0.99),
+        "erros": erros[0],
+    }
+
+
+async def main_async(args):
+    from app.routers import tickets
+    from app.routers.auth.db import db_pool
+    from app.services.group_commit import GroupCommitter
+
+    atendentes = prepare_database()
+    niveis = [int(n) for n in args.concorrencia.split(",")]
+    resultados = []
+    for modo in ("individual", "group commit"):
+        for concorrencia in niveis:
+            reset_tables()
+            ingestor = None
+            if modo == "group commit":
+                ingestor = GroupCommitter(
+                    "tickets", tickets._create_tickets_batch, tickets._after_tickets_batch,
+                    max_batch=args.lote, max_delay=args.espera_ms / 1000, flushers=args.flushers
+                )
+                tickets.ticket_ingestor = ingestor
+                await ingestor.start()
+            print(f"{modo}, concorrência {concorrencia}...")
+            resultado = await run_level(concorrencia, args.duracao, atendentes)
+            if ingestor is not None:
+                resultado["lote_medio"] = ingestor.stats()["lote_medio"]
+                await ingestor.stop()
+            resultados.append((modo, concorrencia, resultado))
+    db_pool.closeall()
+
+    print()
+    print(f"{'modo':14} {'concorrência':>12} {'criações/s':>11} {'p50 ms':>8} {'p99 ms':>8} {'lote médio':>10} {'erros':>6}")
+    for modo, concorrencia, r in resultados:
+        lote = r.get("lote_medio")
+        print(f"{modo:14} {concorrencia:>12} {r['criacoes_por_segundo']:>11.0f} {r['p50_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {lote if lote is not None else '-':>10} {r['erros']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concorrencia", default="1,4,16,64,256", help="níveis de concorrência separados por vírgula")
+    parser.add_argument("--duracao", type=float, default=5, help="segundos por nível")
+    parser.add_argument("--lote", type=int, default=100, help="tamanho máximo do lote (INGEST_MAX_BATCH)")
+    parser.add_argument("--espera-ms", type=float, default=5, help="espera máxima pelo lote (INGEST_MAX_DELAY_MS)")
+    parser.add_argument("--flushers", type=int, default=2, help="lotes gravados em paralelo (INGEST_FLUSHERS)")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""Verificação de regressão dos planos de execução das consultas mais usadas.
+
+Popula um banco dedicado com volume realista, captura o SQL emitido pelas
+funções de leitura dos routers/serviços (executando-as com uma conexão que
+apenas registra as consultas) e roda EXPLAIN (FORMAT JSON) em cada uma.
+
+Falha (código de saída 1) quando um plano passa a fazer Seq Scan em uma tabela
+não permitida no baseline, deixa de usar um índice do baseline ou quando o custo
+estimado (ou o tempo real, com --analyze) ultrapassa o baseline além da tolerância.
+
+--atualizar-baseline regrava custo, índices e tempo, mas nunca amplia as tabelas
+permitidas em Seq Scan: um Seq Scan novo faz a atualização falhar, e permiti-lo
+exige editar seq_scans_permitidas no JSON (revisado junto com a mudança).
+
+Uso (a partir de backend/):
+    python scripts/check_query_plans.py                         # popula se preciso e verifica
+    python scripts/check_query_plans.py --analyze               # inclui tempo real (EXPLAIN ANALYZE)
+    python scripts/check_query_plans.py --atualizar-baseline    # grava os valores atuais como baseline
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import psycopg2
+import psycopg2.extensions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config  # noqa: E402  (carrega o .env)
+
+PLAN_CHECK_DB_NAME = os.getenv("PLAN_CHECK_DB_NAME", "filasling_planos")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+INIT_SCRIPTS_DIR = os.path.join(ROOT_DIR, "init-scripts")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plan_baselines.json")
+
+
+def _connect(dbname: str):
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", "postgres"),
+        dbname=dbname,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Banco de verificação
+# ---------------------------------------------------------------------------
+
+SEED_SQL = """
+INSERT INTO atendentes (nome, email, ativo)
+SELECT (ARRAY['Maria','João','Ana','Pedro','Lucas','Julia','Marcos','Carla'])[1 + g %% 8] || ' Atendente ' || g,
+       'atendente' || g || '@exemplo.com',
+       g %% 10 <> 0
+FROM generate_series(1, %(atendentes)s) g
+ON CONFLICT (email) DO NOTHING;
+
+INSERT INTO login (usuario, senha, ativo, admin)
+SELECT email, 'sem-senha', ativo, false FROM atendentes
+ON CONFLICT (usuario) DO NOTHING;
+
+INSERT INTO tickets (nome, motivo, telefone, setor, user_ns, atendente_id, email_atendente,
+                     nome_atendente, etapa_numero, data_criado, data_saida_etapa1)
+SELECT (ARRAY['Maria','João','Ana','Pedro','Lucas','Julia'])[1 + g %% 6] || ' '
+           || (ARRAY['Silva','Souza','Oliveira','Santos'])[1 + g %% 4] || ' ' || g,
+       'Problema ' || md5(g::text),
+       '(11) 9' || lpad((g * 7919 %% 100000000)::text, 8, '0'),
+       (ARRAY['RH','TI','Financeiro','Comercial'])[1 + g %% 4],
+       'ns' || g,
+       a.ids[1 + g %% array_length(a.ids, 1)],
+       'atendente@exemplo.com',
+       'Atendente',
+       CASE WHEN g > %(tickets)s - 60 THEN 1 WHEN g > %(tickets)s - 200 THEN 2 ELSE 3 END,
+       CURRENT_TIMESTAMP - (%(tickets)s - g) * interval '2 minutes',
+       CASE WHEN g > %(tickets)s - 60 THEN NULL
+            ELSE CURRENT_TIMESTAMP - (%(tickets)s - g) * interval '2 minutes' + interval '15 minutes' END
+FROM generate_series(1, %(tickets)s) g
+CROSS JOIN (SELECT array_agg(id ORDER BY id) AS ids FROM atendentes) a;
+
+INSERT INTO ticket_events (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, data_evento)
+SELECT id, 'criado', NULL, 1, atendente_id, data_criado FROM tickets;
+
+INSERT INTO ticket_events (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, data_evento)
+SELECT id, 'etapa', 1, 2, atendente_id, data_saida_etapa1 FROM tickets WHERE etapa_numero >= 2;
+
+INSERT INTO ticket_events (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, data_evento)
+SELECT id, 'etapa', 2, 3, atendente_id, data_saida_etapa1 + interval '20 minutes' FROM tickets WHERE etapa_numero = 3;
+
+INSERT INTO jobs (tipo, payload, executar_em)
+SELECT 'ticket.atualizado', '{}'::jsonb, CURRENT_TIMESTAMP - g * interval '1 second'
+FROM generate_series(1, %(jobs)s) g;
+"""
+
+
+def prepare_database(args):
+    """Cria o banco dedicado, aplica os init-scripts e popula os dados, se ainda não foi feito."""
+    admin = _connect(os.getenv("PLAN_CHECK_ADMIN_DB", "postgres"))
+    admin.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    cur = admin.cursor()
+    if args.recriar:
+        cur.execute(f'DROP DATABASE IF EXISTS "{PLAN_CHECK_DB_NAME}"')
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (PLAN_CHECK_DB_NAME,))
+    novo = cur.fetchone() is None
+    if novo:
+        print(f"Criando banco de verificação {PLAN_CHECK_DB_NAME}")
+        cur.execute(f'CREATE DATABASE "{PLAN_CHECK_DB_NAME}"')
+    cur.close()
+    admin.close()
+
+    conn = _connect(PLAN_CHECK_DB_NAME)
+    cur = conn.cursor()
+    if novo:
+        # Mesmo esquema (e índices) criado pelo docker-entrypoint em um banco novo
+        for caminho in sorted(glob.glob(os.path.join(INIT_SCRIPTS_DIR, "*.sql"))):
+            with open(caminho) as f:
+                cur.execute(f.read())
+        conn.commit()
+
+    cur.execute("SELECT count(*) FROM tickets")
+    if cur.fetchone()[0] < args.tickets:
+        print(f"Populando {args.tickets} tickets e {args.atendentes} atendentes...")
+        inicio = time.perf_counter()
+        cur.execute(SEED_SQL, {"tickets": args.tickets, "atendentes": args.atendentes, "jobs": args.jobs})
+        conn.commit()
+        print(f"Dados gerados em {time.perf_counter() - inicio:.1f}s")
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    cur.execute("VACUUM ANALYZE")
+    cur.close()
+    return conn
+
+
+# ---------------------------------------------------------------------------
+# Captura do SQL emitido pelo código da aplicação
+# ---------------------------------------------------------------------------
+
+class RecordingCursor:
+    """Cursor que apenas registra as consultas; os resultados são vazios, exceto as
+    linhas de `respostas`, devolvidas em ordem por fetchone (consultas que dependem
+    do resultado de uma anterior)."""
+
+    def __init__(self, registro: list, respostas: list = None):
+        self.registro = registro
+        self.respostas = list(respostas or [])
+        self.itersize = 2000
+
+    def execute(self, sql, params=None):
+        self.registro.append((sql, params))
+
+    def fetchone(self):
+        return self.respostas.pop(0) if self.respostas else None
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class RecordingConnection:
+    def __init__(self, registro: list):
+        self.registro = registro
+
+    def cursor(self, name=None, cursor_factory=None):
+        return RecordingCursor(self.registro)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def recording(registro: list):
+    """Substitui a obtenção de conexões dos routers e serviços por uma conexão que registra o SQL."""
+    fabrica = lambda *args, **kwargs: RecordingConnection(registro)
+    alvos = [
+        "app.routers.auth.db.get_db_connection",
+        "app.routers.auth.db.get_read_connection",
+        "app.routers.tickets.get_read_connection",
+        "app.routers.etapas.get_read_connection",
+        "app.routers.atendentes.get_read_connection",
+        "app.services.ticket_events.get_read_connection",
+        "app.services.jobs.get_db_connection",
+    ]
+    patches = [mock.patch(alvo, fabrica) for alvo in alvos]
+    for patch in patches:
+        patch.start()
+    try:
+        yield
+    finally:
+        for patch in patches:
+            patch.stop()
+
+
+def _sample(conn) -> dict:
+    cur = conn.cursor()
+    cur.execute("SELECT id::text FROM tickets ORDER BY data_criado DESC LIMIT 20")
+    ticket_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT nome, id::text FROM atendentes ORDER BY nome, id OFFSET 100 LIMIT 1")
+    atendente = cur.fetchone()
+    cur.execute("SELECT usuario FROM login WHERE usuario LIKE %s ORDER BY usuario LIMIT 1", ("atendente%",))
+    usuario = cur.fetchone()[0]
+    cur.execute("SELECT COALESCE(MAX(numero), 0) FROM etapas")
+    ultima_etapa = cur.fetchone()[0]
+    cur.close()
+    return {"ticket_ids": ticket_ids, "atendente": tuple(atendente), "usuario": usuario,
+            "ultima_etapa": ultima_etapa}
+
+
+def capture_queries(amostra: dict) -> dict:
+    """Executa as funções de leitura da aplicação e retorna {nome: (sql, params)}."""
+    from app.routers import tickets, etapas, atendentes
+    from app.routers.auth import db
+    from app.services import ticket_events
+    from app.services.jobs import job_queue
+    from app.services.queue_eta import queue_estimator
+
+    agora = datetime.now(timezone.utc)
+    casos = {
+        # Listagem completa: lê a tabela inteira por definição (Seq Scan permitido no baseline)
+        "list_tickets": lambda cur: tickets.query_tickets(cur),
+        "list_tickets_janela": lambda cur: tickets.query_tickets(
+            RecordingCursor(cur.registro, [{"ultima": amostra["ultima_etapa"]}]), 24),
+        "list_etapas": lambda cur: etapas.query_etapas(cur),
+        "list_atendentes": lambda cur: atendentes.query_atendentes(cur),
+        "atendentes_busca_prefixo": lambda cur: atendentes.query_atendentes(cur, None, True, "carla atendente 12", None, 51),
+        "atendentes_pagina_cursor": lambda cur: atendentes.query_atendentes(
+            cur, ["id", "nome_completo"], None, None, amostra["atendente"], 51),
+        "search_tickets_texto": lambda: asyncio.run(tickets.search_tickets(
+            q="maria silva", page=1, page_size=20, current_user={})),
+        "search_tickets_telefone": lambda: asyncio.run(tickets.search_tickets(
+            q="99887", page=1, page_size=20, current_user={})),
+        "export_periodo": lambda: asyncio.run(tickets.export_tickets(
+            formato="ndjson", data_inicio=agora - timedelta(days=7), data_fim=agora,
+            etapa=None, usar_copy=False, current_user={})),
+        "tempos_tickets": lambda: ticket_events.get_ticket_dwell_times(amostra["ticket_ids"]),
+        "tempo_por_etapa": lambda: ticket_events.get_stage_dwell_stats(agora - timedelta(days=30), agora),
+        "fila_eta": lambda: queue_estimator._load(),
+        "login_usuario": lambda: db.get_user_by_username(amostra["usuario"]),
+        "usuario_ativo": lambda: db.check_user_active(amostra["usuario"]),
+        "jobs_claim": lambda: job_queue._claim(),
+    }
+
+    consultas = {}
+    for nome, caso in casos.items():
+        registro = []
+        with recording(registro):
+            try:
+                if caso.__code__.co_argcount:
+                    caso(RecordingCursor(registro))
+                else:
+                    caso()
+            except Exception as e:
+                # Respostas vazias podem gerar 404 etc.; o SQL já foi registrado
+                if not registro:
+                    print(f"[{nome}] nenhuma consulta capturada: {e}")
+        for indice, (sql, params) in enumerate(registro, start=1):
+            consultas[nome if len(registro) == 1 else f"{nome}#{indice}"] = (sql, params)
+    return consultas
+
+
+# ---------------------------------------------------------------------------
+# Análise dos planos
+# ---------------------------------------------------------------------------
+
+def _walk(node: dict):
+    yield node
+    for filho in node.get("Plans", []):
+        yield from _walk(filho)
+
+
+def explain(conn, sql: str, params, analyze: bool) -> dict:
+    opcoes = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    cur = conn.cursor()
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
+    try:
+        cur.execute(f"EXPLAIN ({opcoes}) {sql}", params)
+        resultado = cur.fetchone()[0]
+    finally:
+        # Consultas de escrita (ex.: claim de jobs) não podem alterar o banco de verificação
+        conn.rollback()
+        cur.close()
+    plano = resultado[0] if isinstance(resultado, list) else json.loads(resultado)[0]
+    nodes = list(_walk(plano["Plan"]))
+    return {
+        "custo": plano["Plan"]["Total Cost"],
+        "tempo_ms": plano.get("Execution Time"),
+        "seq_scans": sorted({n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"}),
+        "indices": sorted({n["Index Name"] for n in nodes if "Index Name" in n}),
+    }
+
+
+def compare(nome: str, atual: dict, baseline: dict, tolerancia: float) -> list:
+    falhas = []
+    permitidas = set(baseline.get("seq_scans_permitidas", []))
+    novas = [tabela for tabela in atual["seq_scans"] if tabela not in permitidas]
+    if novas:
+        falhas.append(f"Seq Scan em {', '.join(novas)} (índices usados: {', '.join(atual['indices']) or 'nenhum'})")
+    perdidos = [indice for indice in baseline.get("indices", []) if indice not in atual["indices"]]
+    if perdidos:
+        falhas.append(f"deixou de usar {', '.join(perdidos)}")
+    custo = baseline.get("custo")
+    if custo and atual["custo"] > custo * (1 + tolerancia):
+        falhas.append(f"custo estimado {atual['custo']:.0f} > baseline {custo:.0f}")
+    tempo = baseline.get("tempo_ms")
+    if tempo and atual["tempo_ms"] is not None and atual["tempo_ms"] > tempo * (1 + tolerancia):
+        falhas.append(f"tempo real {atual['tempo_ms']:.1f} ms > baseline {tempo:.1f} ms")
+    return falhas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=200000)
+    parser.add_argument("--atendentes", type=int, default=5000)
+    parser.add_argument("--jobs", type=int, default=5000)
+    parser.add_argument("--analyze", action="store_true", help="executa as consultas (EXPLAIN ANALYZE)")
+    parser.add_argument("--tolerancia", type=float, default=0.5, help="aumento relativo aceito (0.5 = 50%%)")
+    parser.add_argument("--recriar", action="store_true", help="recria o banco de verificação")
+    parser.add_argument("--atualizar-baseline", action="store_true")
+    parser.add_argument("--somente", nargs="*", help="verifica apenas as consultas informadas")
+    args = parser.parse_args()
+
+    conn = prepare_database(args)
+    consultas = capture_queries(_sample(conn))
+    with open(BASELINE_PATH) as f:
+        baselines = json.load(f)
+
+    falhas_totais = 0
+    for nome, (sql, params) in consultas.items():
+        if args.somente and nome.split("#")[0] not in args.somente:
+            continue
+        try:
+            atual = explain(conn, sql, params, args.analyze)
+        except Exception as e:
+            print(f"ERRO  {nome}: {e}")
+            falhas_totais += 1
+            continue
+
+        baseline = baselines.setdefault(nome, {"seq_scans_permitidas": []})
+        if args.atualizar_baseline:
+            novas = [t for t in atual["seq_scans"] if t not in baseline["seq_scans_permitidas"]]
+            if novas:
+                falhas_totais += 1
+                print(f"FALHA {nome}: Seq Scan em {', '.join(novas)} não permitido no baseline")
+                continue
+            baseline["custo"] = round(atual["custo"], 2)
+            baseline["indices"] = atual["indices"]
+            if atual["tempo_ms"] is not None:
+                baseline["tempo_ms"] = round(atual["tempo_ms"], 2)
+            print(f"BASE  {nome}: custo {atual['custo']:.0f}, seq scans {atual['seq_scans']}, índices {atual['indices']}")
+            continue
+
+        falhas = compare(nome, atual, baseline, args.tolerancia)
+        tempo = f", {atual['tempo_ms']:.1f} ms" if atual["tempo_ms"] is not None else ""
+        if falhas:
+            falhas_totais += 1
+            print(f"FALHA {nome}: " + "; ".join(falhas))
+        else:
+            print(f"OK    {nome}: custo {atual['custo']:.0f}{tempo}")
+
+    conn.close()
+    if args.atualizar_baseline:
+        if falhas_totais:
+            print(f"Baseline não atualizado: {falhas_totais} consultas com Seq Scan novo ou erro")
+            return 1
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baselines, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline gravado em {BASELINE_PATH}")
+        return 0
+
+    print(f"{len(consultas)} consultas verificadas, {falhas_totais} com regressão")
+    return 1 if falhas_totais else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Carga e reconstrução do cubo de chegadas (tickets_cubo) a partir de ticket_events.
+
+A API já agrega os eventos novos em segundo plano (CUBE_ENABLED); este script serve
+para carregar um histórico grande de uma vez, fora dos workers, ou para reconstruir o
+cubo do zero (por exemplo, após mudar CUBE_TIMEZONE).
+
+Uso (a partir de backend/, com o banco configurado pelas variáveis DB_*):
+    python scripts/cubo_chegadas.py
+    python scripts/cubo_chegadas.py --reconstruir --lote 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.routers.auth.db import db_pool  # noqa: E402
+from app.services.arrival_cube import CUBE_BATCH, CUBE_TIMEZONE, fold_batch, reset_cube  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reconstruir", action="store_true", help="descarta o cubo e agrega todo o histórico")
+    parser.add_argument("--lote", type=int, default=CUBE_BATCH, help="eventos por transação")
+    args = parser.parse_args()
+
+    conn = db_pool.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT ultimo_evento FROM tickets_cubo_estado")
+        desde = cur.fetchone()[0]
+        cur.execute("SELECT max(id) FROM ticket_events")
+        ultimo = cur.fetchone()[0] or 0
+        cur.close()
+        conn.rollback()
+        if args.reconstruir:
+            print(f"Descartando o cubo (fuso {CUBE_TIMEZONE})")
+            reset_cube(conn)
+            desde = 0
+        print(f"Agregando eventos {desde + 1} a {ultimo}")
+
+        inicio = time.perf_counter()
+        total = 0
+        while True:
+            consumidos = fold_batch(conn, args.lote)
+            if consumidos is None:
+                print("Outro processo está agregando o cubo; aguardando...")
+                time.sleep(1)
+                continue
+            total += consumidos
+            if consumidos:
+                decorrido = time.perf_counter() - inicio
+                print(f"  {total} eventos ({total / max(decorrido, 1e-9):.0f}/s)")
+            if consumidos < args.lote:
+                break
+        print(f"Cubo atualizado: {total} eventos em {time.perf_counter() - inicio:.1f}s")
+    finally:
+        conn.close()
+        db_pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Executor de migrações versionadas do banco, pensado para bancos em produção.
+
+As migrações ficam em backend/migrations, aplicadas em ordem de versão:
+
+    0001_descricao.sql   SQL executado em uma transação. Com a linha
+                         "-- migracao: sem-transacao" cada comando roda em
+                         autocommit (obrigatório para CREATE INDEX CONCURRENTLY).
+    0002_descricao.py    Define upgrade(ctx); ctx oferece execute(),
+                         create_index_concurrently() e backfill() em lotes.
+
+A tabela schema_migrations registra versão, checksum e duração de cada migração.
+
+Uso (a partir de backend/):
+    python scripts/migrate.py                # aplica as pendentes
+    python scripts/migrate.py --status       # lista aplicadas/pendentes
+    python scripts/migrate.py --dry-run      # mostra o que seria feito e estima a duração
+"""
+import argparse
+import glob
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import config  # noqa: E402  (carrega o .env)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+# Tempo máximo de espera por bloqueios: evita que um ALTER enfileire todas as escritas atrás dele
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "5s")
+# Parâmetros das estimativas do dry-run
+MIGRATION_ESTIMATE_MB_PER_SECOND = float(os.getenv("MIGRATION_ESTIMATE_MB_PER_SECOND", "50"))
+MIGRATION_ESTIMATE_ROWS_PER_SECOND = float(os.getenv("MIGRATION_ESTIMATE_ROWS_PER_SECOND", "20000"))
+# Impede dois executores simultâneos (ex.: dois deploys ao mesmo tempo)
+ADVISORY_LOCK_ID = 7242019
+
+SEM_TRANSACAO = "-- migracao: sem-transacao"
+_CREATE_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+(CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(?:ONLY\s+)?(\w+)",
+    re.IGNORECASE
+)
+
+
+def _connect():
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", "postgres"),
+        dbname=os.getenv("DB_NAME", "filasling"),
+        # Definido na sessão: um SET dentro da transação seria desfeito pelo rollback
+        # implícito de set_isolation_level e as migrações rodariam sem limite de espera
+        options=f"-c lock_timeout={MIGRATION_LOCK_TIMEOUT}",
+    )
+
+
+def split_statements(sql: str) -> list:
+    """Divide um script em comandos, respeitando strings, comentários e blocos $$."""
+    comandos, atual = [], []
+    i, n = 0, len(sql)
+    dollar_tag = None
+    while i < n:
+        c = sql[i]
+        if dollar_tag:
+            if sql.startswith(dollar_tag, i):
+                atual.append(dollar_tag)
+                i += len(dollar_tag)
+                dollar_tag = None
+                continue
+        elif c == "'":
+            fim = sql.find("'", i + 1)
+            while fim != -1 and sql.startswith("''", fim):
+                fim = sql.find("'", fim + 2)
+            fim = n - 1 if fim == -1 else fim
+            atual.append(sql[i:fim + 1])
+            i = fim + 1
+            continue
+        elif sql.startswith("--", i):
+            fim = sql.find("\n", i)
+            i = n if fim == -1 else fim
+            continue
+        elif c == "$":
+            match = re.match(r"\$\w*\$", sql[i:])
+            if match:
+                dollar_tag = match.group(0)
+                atual.append(dollar_tag)
+                i += len(dollar_tag)
+                continue
+        elif c == ";":
+            comando = "".join(atual).strip()
+            if comando:
+                comandos.append(comando)
+            atual = []
+            i += 1
+            continue
+        atual.append(c)
+        i += 1
+    comando = "".join(atual).strip()
+    if comando:
+        comandos.append(comando)
+    return comandos
+
+
+def _formatar_duracao(segundos: float) -> str:
+    if segundos < 60:
+        return f"{segundos:.1f}s"
+    return f"{segundos / 60:.1f}min"
+
+
+class Migration:
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        nome = os.path.basename(caminho)
+        self.versao, _, resto = nome.partition("_")
+        self.nome = os.path.splitext(resto)[0]
+        with open(caminho, "rb") as f:
+            conteudo = f.read()
+        self.checksum = hashlib.sha256(conteudo).hexdigest()
+        self.texto = conteudo.decode("utf-8")
+        self.tipo = "py" if caminho.endswith(".py") else "sql"
+        self.transacional = self.tipo == "sql" and SEM_TRANSACAO not in self.texto
+
+
+def load_migrations() -> list:
+    caminhos = sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "[0-9]*_*.sql")) +
+                      glob.glob(os.path.join(MIGRATIONS_DIR, "[0-9]*_*.py")))
+    migracoes = [Migration(caminho) for caminho in caminhos]
+    versoes = [m.versao for m in migracoes]
+    duplicadas = {v for v in versoes if versoes.count(v) > 1}
+    if duplicadas:
+        raise SystemExit(f"Versões de migração duplicadas: {', '.join(sorted(duplicadas))}")
+    return sorted(migracoes, key=lambda m: m.versao)
+
+
+class MigrationContext:
+    """Operações disponíveis para as migrações; no dry-run apenas estima e descreve."""
+
+    def __init__(self, conn, dry_run: bool):
+        self.conn = conn
+        self.dry_run = dry_run
+        self.estimativa = 0.0
+
+    def _log(self, mensagem: str):
+        print(f"    {mensagem}")
+
+    def _tamanho_tabela(self, tabela: str):
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT pg_total_relation_size(c.oid), GREATEST(c.reltuples, 0)::bigint
+            FROM pg_class c
+            WHERE c.oid = to_regclass(%s)
+        """, (tabela,))
+        row = cur.fetchone()
+        cur.close()
+        return row if row else (0, 0)
+
+    def execute(self, sql: str, params=None):
+        """Executa um comando (ou descreve e estima, no dry-run)."""
+        match = _CREATE_INDEX_RE.search(sql)
+        if match:
+            concorrente, indice, tabela = match.groups()
+            if concorrente:
+                self._drop_invalid_index(indice)
+            if self.dry_run:
+                tamanho, linhas = self._tamanho_tabela(tabela)
+                # Índice concorrente percorre a tabela duas vezes
+                segundos = tamanho / 1024 / 1024 / MIGRATION_ESTIMATE_MB_PER_SECOND * (2 if concorrente else 1)
+                self.estimativa += segundos
+                bloqueio = "sem bloquear escritas" if concorrente else "BLOQUEIA ESCRITAS em " + tabela
+                self._log(f"índice {indice} em {tabela} ({linhas} linhas, {tamanho / 1024 / 1024:.0f} MB): "
+                          f"~{_formatar_duracao(segundos)}, {bloqueio}")
+                return
+        if self.dry_run:
+            primeira_linha = " ".join(sql.split())[:100]
+            if re.match(r"\s*ALTER\s+TABLE", sql, re.IGNORECASE):
+                self._log(f"{primeira_linha} (bloqueio exclusivo breve, lock_timeout {MIGRATION_LOCK_TIMEOUT})")
+            else:
+                self._log(primeira_linha)
+            return
+        cur = self.conn.cursor()
+        cur.execute(sql, params)
+        cur.close()
+
+    def _drop_invalid_index(self, indice: str):
+        # Um CREATE INDEX CONCURRENTLY interrompido deixa um índice inválido para trás
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT NOT i.indisvalid
+            FROM pg_index i
+            WHERE i.indexrelid = to_regclass(%s)
+        """, (indice,))
+        row = cur.fetchone()
+        cur.close()
+        if row and row[0]:
+            self._log(f"índice {indice} inválido de uma execução anterior: removendo")
+            if not self.dry_run:
+                self.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {indice}")
+
+    def create_index_concurrently(self, nome: str, tabela: str, definicao: str, unique: bool = False):
+        """Cria um índice sem bloquear escritas; exige migração sem transação (arquivos .py são)."""
+        self.execute(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {nome} ON {tabela} {definicao}"
+        )
+
+    def backfill(self, sql: str, batch_size: int = 1000, pausa: float = 0.1,
+                 contagem_sql: str = None, tempo_alvo: float = 0.5):
+        """Executa um UPDATE/INSERT em lotes até não afetar mais linhas.
+
+        `sql` deve limitar as linhas com %(batch_size)s e ser idempotente (ex.: WHERE coluna IS NULL).
+        Cada lote é confirmado separadamente; entre lotes há uma pausa e o tamanho do lote
+        se ajusta para que cada um leve cerca de `tempo_alvo` segundos.
+        """
+        if self.dry_run:
+            linhas = None
+            if contagem_sql:
+                cur = self.conn.cursor()
+                cur.execute(contagem_sql)
+                linhas = cur.fetchone()[0]
+                cur.close()
+            if linhas is None:
+                self._log(f"backfill em lotes de {batch_size}: sem contagem_sql, duração desconhecida")
+                return
+            lotes = -(-linhas // batch_size)
+            segundos = linhas / MIGRATION_ESTIMATE_ROWS_PER_SECOND + lotes * pausa
+            self.estimativa += segundos
+            self._log(f"backfill de {linhas} linhas em ~{lotes} lotes: ~{_formatar_duracao(segundos)}")
+            return
+
+        total = 0
+        inicio = time.perf_counter()
+        while True:
+            inicio_lote = time.perf_counter()
+            cur = self.conn.cursor()
+            cur.execute(sql, {"batch_size": batch_size})
+            afetadas = cur.rowcount
+            cur.close()
+            self.conn.commit()
+            total += afetadas
+            if afetadas <= 0:
+                break
+            duracao = time.perf_counter() - inicio_lote
+            # Lotes rápidos crescem, lotes lentos diminuem (limites para não segurar bloqueios)
+            if duracao < tempo_alvo / 2:
+                batch_size = min(batch_size * 2, 50000)
+            elif duracao > tempo_alvo * 2:
+                batch_size = max(batch_size // 2, 100)
+            self._log(f"backfill: {total} linhas ({afetadas} no último lote, {duracao * 1000:.0f} ms)")
+            time.sleep(pausa)
+        self._log(f"backfill concluído: {total} linhas em {_formatar_duracao(time.perf_counter() - inicio)}")
+
+
+def ensure_table(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          versao VARCHAR(50) PRIMARY KEY,
+          nome VARCHAR(255) NOT NULL,
+          checksum VARCHAR(64) NOT NULL,
+          duracao_ms INTEGER,
+          aplicada_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT versao, checksum FROM schema_migrations")
+    aplicadas = dict(cur.fetchall())
+    cur.close()
+    conn.commit()
+    return aplicadas
+
+
+def run_migration(conn, migracao: Migration, dry_run: bool) -> float:
+    ctx = MigrationContext(conn, dry_run)
+    inicio = time.perf_counter()
+
+    if migracao.tipo == "py":
+        spec = importlib.util.spec_from_file_location(f"migracao_{migracao.versao}", migracao.caminho)
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        modulo.upgrade(ctx)
+    elif migracao.transacional:
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
+        for comando in split_statements(migracao.texto):
+            ctx.execute(comando)
+    else:
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        for comando in split_statements(migracao.texto):
+            ctx.execute(comando)
+
+    if dry_run:
+        conn.rollback()
+        return ctx.estimativa
+
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
+    duracao_ms = int((time.perf_counter() - inicio) * 1000)
+    cur = conn.cursor()
+    cur.execute(
+        "INSERT INTO schema_migrations (versao, nome, checksum, duracao_ms) VALUES (%s, %s, %s, %s)",
+        (migracao.versao, migracao.nome, migracao.checksum, duracao_ms)
+    )
+    cur.close()
+    conn.commit()
+    return duracao_ms / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="não altera o banco; estima a duração")
+    parser.add_argument("--status", action="store_true", help="lista migrações aplicadas e pendentes")
+    parser.add_argument("--ate", help="aplica apenas até esta versão (inclusive)")
+    args = parser.parse_args()
+
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    if not cur.fetchone()[0]:
+        print("Outro executor de migrações está em andamento")
+        return 1
+    cur.close()
+    conn.commit()
+
+    aplicadas = ensure_table(conn)
+    migracoes = load_migrations()
+    for migracao in migracoes:
+        if migracao.versao in aplicadas and aplicadas[migracao.versao] != migracao.checksum:
+            print(f"AVISO: a migração {migracao.versao}_{migracao.nome} foi alterada depois de aplicada")
+
+    pendentes = [m for m in migracoes if m.versao not in aplicadas and (not args.ate or m.versao <= args.ate)]
+    if args.status:
+        for migracao in migracoes:
+            situacao = "aplicada" if migracao.versao in aplicadas else "pendente"
+            print(f"{situacao:9} {migracao.versao}_{migracao.nome}")
+        return 0
+
+    if not pendentes:
+        print("Nenhuma migração pendente")
+        return 0
+
+    total = 0.0
+    for migracao in pendentes:
+        modo = "transação" if migracao.transacional else "autocommit"
+        print(f"{'[dry-run] ' if args.dry_run else ''}{migracao.versao}_{migracao.nome} ({modo})")
+        try:
+            segundos = run_migration(conn, migracao, args.dry_run)
+        except Exception as e:
+            conn.rollback()
+            print(f"Erro ao aplicar migração {migracao.versao}_{migracao.nome}: {e}")
+            return 1
+        total += segundos
+        if args.dry_run:
+            print(f"    estimativa: ~{_formatar_duracao(segundos)}")
+        else:
+            print(f"    aplicada em {_formatar_duracao(segundos)}")
+
+    resumo = "Estimativa total" if args.dry_run else "Tempo total"
+    print(f"{resumo}: ~{_formatar_duracao(total)} para {len(pendentes)} migração(ões)")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Servidor local que simula o sistema externo para testar a sincronização de saída.
+
+Recebe os lotes em POST /sync, registra cada ticket recebido e pode simular lentidão,
+falhas temporárias (503 com Retry-After), limite de taxa (429) e recusas de itens.
+
+Uso (a partir de backend/):
+    python scripts/sync_stub_server.py --porta 8099 --falhas 0.2 --latencia-ms 300
+e na API:
+    SYNC_ENABLED=true SYNC_URL=http://localhost:8099/sync
+
+GET /sync mostra o último estado recebido de cada ticket e os contadores.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+estado = {"tickets": {}, "lotes": 0, "itens": 0, "falhas": 0, "limitados": 0, "ultimo_lote": None}
+lock = threading.Lock()
+
+
+class SyncStubHandler(BaseHTTPRequestHandler):
+    args = None
+    ultimos = []
+
+    def _json(self, status: int, corpo: dict, headers: dict = None):
+        conteudo = json.dumps(corpo, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(conteudo)))
+        for nome, valor in (headers or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def do_GET(self):
+        with lock:
+            self._json(200, estado)
+
+    def do_POST(self):
+        tamanho = int(self.headers.get("Content-Length", 0))
+        try:
+            corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+        except ValueError:
+            return self._json(400, {"detail": "JSON inválido"})
+        itens = corpo.get("tickets", [])
+        time.sleep(self.args.latencia_ms / 1000)
+
+        agora = time.monotonic()
+        with lock:
+            # Limite de requisições por segundo (429), como uma API externa faria
+            self.ultimos[:] = [t for t in self.ultimos if agora - t < 1]
+            if self.args.limite and len(self.ultimos) >= self.args.limite:
+                estado["limitados"] += 1
+                return self._json(429, {"detail": "limite de requisições"}, {"Retry-After": "1"})
+            self.ultimos.append(agora)
+            if random.random() < self.args.falhas:
+                estado["falhas"] += 1
+                return self._json(503, {"detail": "indisponível"}, {"Retry-After": "2"})
+
+            rejeitados = [item["ticket_id"] for item in itens if item.get("numero_sistema") in self.args.recusar]
+            for item in itens:
+                if item["ticket_id"] not in rejeitados:
+                    estado["tickets"][item["ticket_id"]] = item
+            estado["lotes"] += 1
+            estado["itens"] += len(itens)
+            estado["ultimo_lote"] = len(itens)
+        print(f"lote com {len(itens)} tickets ({len(rejeitados)} recusados)")
+        self._json(200, {"rejeitados": rejeitados})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--falhas", type=float, default=0.0, help="fração dos lotes respondidos com 503")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="atraso de cada resposta")
+    parser.add_argument("--limite", type=int, default=0, help="lotes por segundo antes de responder 429 (0 = sem limite)")
+    parser.add_argument("--recusar", type=int, nargs="*", default=[], help="numero_sistema recusados")
+    SyncStubHandler.args = parser.parse_args()
+
+    servidor = ThreadingHTTPServer(("0.0.0.0", SyncStubHandler.args.porta), SyncStubHandler)
+    print(f"Sistema externo simulado em http://localhost:{SyncStubHandler.args.porta}/sync")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
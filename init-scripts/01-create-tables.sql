@@ -57,3 +57,5 @@ CREATE TABLE IF NOT EXISTS tickets (
 CREATE INDEX IF NOT EXISTS idx_atendentes_email ON atendentes(email);
 CREATE INDEX IF NOT EXISTS idx_tickets_etapa_numero ON tickets(etapa_numero);
 CREATE INDEX IF NOT EXISTS idx_tickets_atendente_id ON tickets(atendente_id);
+-- Em bancos criados antes deste índice: migração 0006 (CONCURRENTLY)
+CREATE INDEX IF NOT EXISTS idx_tickets_data_criado ON tickets(data_criado);
@@ -0,0 +1,38 @@
+-- Busca textual e por similaridade nos tickets (banco novo)
+-- Em bancos existentes, aplique com scripts/migrate.py (migração 0007), que preenche
+-- search_vector em lotes e cria os índices com CONCURRENTLY, sem bloquear escritas
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Vetor de busca mantido por trigger (mesma definição da migração 0007)
+-- Pesos: nome (A), motivo (B), user_ns/setor (C)
+CREATE OR REPLACE FUNCTION tickets_busca_vetor(nome TEXT, motivo TEXT, user_ns TEXT, setor TEXT)
+RETURNS tsvector AS $$
+  SELECT setweight(to_tsvector('portuguese', coalesce(nome, '')), 'A') ||
+         setweight(to_tsvector('portuguese', coalesce(motivo, '')), 'B') ||
+         setweight(to_tsvector('simple', coalesce(user_ns, '')), 'C') ||
+         setweight(to_tsvector('simple', coalesce(setor, '')), 'C')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION tickets_atualiza_busca() RETURNS trigger AS $$
+BEGIN
+  NEW.search_vector := tickets_busca_vetor(NEW.nome, NEW.motivo, NEW.user_ns, NEW.setor);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE tickets ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+DROP TRIGGER IF EXISTS trg_tickets_busca ON tickets;
+CREATE TRIGGER trg_tickets_busca
+  BEFORE INSERT OR UPDATE OF nome, motivo, user_ns, setor ON tickets
+  FOR EACH ROW EXECUTE FUNCTION tickets_atualiza_busca();
+
+-- Índice GIN para a busca textual
+CREATE INDEX IF NOT EXISTS idx_tickets_search_vector ON tickets USING GIN (search_vector);
+
+-- Índices de trigramas para busca aproximada por nome, telefone (apenas dígitos) e user_ns
+CREATE INDEX IF NOT EXISTS idx_tickets_nome_trgm ON tickets USING GIN (nome gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tickets_telefone_digitos_trgm
+  ON tickets USING GIN ((regexp_replace(coalesce(telefone, ''), '\D', '', 'g')) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_tickets_user_ns_trgm ON tickets USING GIN (user_ns gin_trgm_ops);
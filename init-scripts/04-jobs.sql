@@ -0,0 +1,19 @@
+-- Fila persistente de tarefas em segundo plano (consumida com FOR UPDATE SKIP LOCKED)
+-- Pode ser executado também em bancos já existentes (todas as instruções são idempotentes)
+
+CREATE TABLE IF NOT EXISTS jobs (
+  id BIGSERIAL PRIMARY KEY,
+  tipo VARCHAR(100) NOT NULL,
+  payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+  status VARCHAR(20) NOT NULL DEFAULT 'pendente',  -- pendente, executando, falhou
+  tentativas INTEGER NOT NULL DEFAULT 0,
+  max_tentativas INTEGER NOT NULL DEFAULT 5,
+  executar_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  iniciado_em TIMESTAMP WITH TIME ZONE,
+  erro TEXT,
+  data_criado TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Índice parcial usado pelos workers para buscar o próximo job pronto
+CREATE INDEX IF NOT EXISTS idx_jobs_pendentes ON jobs(executar_em) WHERE status = 'pendente';
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
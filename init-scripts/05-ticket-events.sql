@@ -0,0 +1,45 @@
+-- Histórico append-only das transições de etapa dos tickets
+-- Pode ser executado também em bancos já existentes (todas as instruções são idempotentes)
+
+CREATE TABLE IF NOT EXISTS ticket_events (
+  id BIGSERIAL PRIMARY KEY,
+  ticket_id UUID NOT NULL,  -- sem FK: o histórico sobrevive à exclusão do ticket
+  tipo VARCHAR(20) NOT NULL,  -- criado, etapa, removido
+  etapa_anterior INTEGER,
+  etapa_numero INTEGER,
+  atendente_id UUID,
+  usuario VARCHAR(255),
+  data_evento TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Eventos são inseridos em ordem de tempo: BRIN é pequeno e suficiente para filtros por período
+CREATE INDEX IF NOT EXISTS idx_ticket_events_data_evento_brin ON ticket_events USING BRIN (data_evento);
+CREATE INDEX IF NOT EXISTS idx_ticket_events_ticket ON ticket_events(ticket_id, data_evento);
+
+-- Garantir que o histórico seja apenas de inserção
+CREATE OR REPLACE FUNCTION ticket_events_append_only() RETURNS trigger AS $$
+BEGIN
+  RAISE EXCEPTION 'ticket_events é append-only (% não permitido)', TG_OP;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ticket_events_append_only ON ticket_events;
+CREATE TRIGGER trg_ticket_events_append_only
+  BEFORE UPDATE OR DELETE ON ticket_events
+  FOR EACH ROW EXECUTE FUNCTION ticket_events_append_only();
+
+-- Reconstrução aproximada do histórico de tickets existentes
+-- (criação na etapa 1 e, quando houver, a saída da etapa 1 para a etapa atual)
+INSERT INTO ticket_events (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, data_evento)
+SELECT t.id, 'criado', NULL,
+       CASE WHEN t.data_saida_etapa1 IS NOT NULL THEN 1 ELSE t.etapa_numero END,
+       t.atendente_id, t.data_criado
+FROM tickets t
+WHERE NOT EXISTS (SELECT 1 FROM ticket_events ev WHERE ev.ticket_id = t.id);
+
+INSERT INTO ticket_events (ticket_id, tipo, etapa_anterior, etapa_numero, atendente_id, data_evento)
+SELECT t.id, 'etapa', 1, t.etapa_numero, t.atendente_id, t.data_saida_etapa1
+FROM tickets t
+WHERE t.data_saida_etapa1 IS NOT NULL
+  AND t.etapa_numero <> 1
+  AND NOT EXISTS (SELECT 1 FROM ticket_events ev WHERE ev.ticket_id = t.id AND ev.tipo = 'etapa');
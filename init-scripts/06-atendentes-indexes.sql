@@ -0,0 +1,10 @@
+-- Listagem de atendentes paginada, com filtro por ativo e busca por prefixo
+-- Pode ser executado também em bancos já existentes (todas as instruções são idempotentes)
+
+-- Paginação por cursor (nome, id), com ou sem filtro de ativo
+CREATE INDEX IF NOT EXISTS idx_atendentes_nome_id ON atendentes (nome, id);
+CREATE INDEX IF NOT EXISTS idx_atendentes_ativo_nome_id ON atendentes (ativo, nome, id);
+
+-- Busca por prefixo sem diferenciar maiúsculas (LIKE 'prefixo%' independente da collation)
+CREATE INDEX IF NOT EXISTS idx_atendentes_nome_prefixo ON atendentes (lower(nome) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_atendentes_email_prefixo ON atendentes (lower(email) text_pattern_ops);
@@ -0,0 +1,30 @@
+-- Revogação de tokens de acesso e refresh tokens
+-- Pode ser executado também em bancos já existentes (todas as instruções são idempotentes)
+
+-- Revogações lidas incrementalmente por cada worker (id é o cursor da sincronização)
+CREATE TABLE IF NOT EXISTS token_revogacoes (
+  id BIGSERIAL PRIMARY KEY,
+  tipo VARCHAR(20) NOT NULL,        -- jti (um token) ou usuario (tokens emitidos até revogado_em)
+  valor VARCHAR(255) NOT NULL,
+  revogado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  expira_em TIMESTAMP WITH TIME ZONE NOT NULL  -- depois disso os tokens revogados já expiraram
+);
+
+CREATE INDEX IF NOT EXISTS idx_token_revogacoes_revogado_em ON token_revogacoes(revogado_em);
+
+-- Refresh tokens (apenas o hash); cada uso gera um novo token na mesma família
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+  id BIGSERIAL PRIMARY KEY,
+  token_hash BYTEA NOT NULL UNIQUE,
+  usuario_id VARCHAR(255) NOT NULL,
+  usuario VARCHAR(255) NOT NULL,
+  familia UUID NOT NULL,
+  criado_em TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+  expira_em TIMESTAMP WITH TIME ZONE NOT NULL,
+  usado_em TIMESTAMP WITH TIME ZONE,
+  revogado_em TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_familia ON refresh_tokens(familia);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_usuario ON refresh_tokens(usuario_id) WHERE revogado_em IS NULL;
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expira_em ON refresh_tokens(expira_em);
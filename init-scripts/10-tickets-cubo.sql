@@ -0,0 +1,23 @@
+-- Cubo de chegadas e atendimentos por dia x hora x setor (mapas de calor de escala)
+-- Pode ser executado também em bancos já existentes (todas as instruções são idempotentes)
+
+-- Uma linha por dia, hora (no fuso CUBE_TIMEZONE) e setor; mantida pela API a partir de ticket_events
+CREATE TABLE IF NOT EXISTS tickets_cubo (
+  dia DATE NOT NULL,
+  hora SMALLINT NOT NULL,
+  setor VARCHAR(100) NOT NULL DEFAULT '',       -- '' = tickets sem setor
+  chegadas INTEGER NOT NULL DEFAULT 0,           -- tickets criados
+  atendimentos INTEGER NOT NULL DEFAULT 0,       -- saídas da etapa 1 (início do atendimento)
+  espera_total DOUBLE PRECISION NOT NULL DEFAULT 0,  -- soma das esperas dos atendimentos, em segundos
+  espera_max DOUBLE PRECISION NOT NULL DEFAULT 0,
+  PRIMARY KEY (dia, hora, setor)
+);
+
+-- Marca d'água: último evento de ticket_events já agregado (linha única)
+CREATE TABLE IF NOT EXISTS tickets_cubo_estado (
+  id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+  ultimo_evento BIGINT NOT NULL DEFAULT 0,
+  atualizado_em TIMESTAMP WITH TIME ZONE
+);
+
+INSERT INTO tickets_cubo_estado (id, ultimo_evento) VALUES (TRUE, 0) ON CONFLICT (id) DO NOTHING;
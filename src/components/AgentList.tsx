@@ -72,7 +72,7 @@ const AgentList = ({ agents, onAgentChange, onEditAgent }: AgentListProps) => {
           </CardHeader>
           <CardContent className="flex items-center gap-4">
             <Avatar className="w-12 h-12">
-              <AvatarImage src={agent.url_imagem} />
+              <AvatarImage src={agent.url_avatar || agent.url_imagem} />
               <AvatarFallback>{getInitials(agent.nome)}</AvatarFallback>
             </Avatar>
             <div>
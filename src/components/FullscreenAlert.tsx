@@ -19,7 +19,6 @@ const FullscreenAlert = ({ ticket, onClose, onDismissAll }: FullscreenAlertProps
   const { settings } = useSettings();
   const [isVisible, setIsVisible] = useState(false);
   const [soundPlayed, setSoundPlayed] = useState(false);
-  const [, forceUpdate] = useState<number>(0);
 
   useEffect(() => {
     // Log audio system state for debugging
@@ -67,21 +66,15 @@ const FullscreenAlert = ({ ticket, onClose, onDismissAll }: FullscreenAlertProps
     // Animação de entrada
     setTimeout(() => setIsVisible(true), 100);
     
-    // Update time display every second
-    const timer = setInterval(() => {
-      forceUpdate(prev => prev + 1);
-    }, 1000); // Update every second
-    
     // Limpeza
     return () => {
       stopAlertNotification();
       document.removeEventListener('click', handleUserInteraction);
       document.removeEventListener('touchstart', handleUserInteraction);
-      clearInterval(timer);
     };
   }, [settings, soundPlayed]);
 
-  // Formata o tempo desde a criação
+  // Formata o tempo desde a criação (recalculado quando a lista de tickets é atualizada)
   const creationDate = ticket.data_criado || ticket.data_criacao;
   const { minutes } = getTimeStatus(
     creationDate, 
@@ -141,7 +134,7 @@ const FullscreenAlert = ({ ticket, onClose, onDismissAll }: FullscreenAlertProps
             <div className="flex items-center gap-2 mb-1">
               {ticket.url_imagem_atendente && (
                 <Avatar className="w-6 h-6">
-                  <AvatarImage src={ticket.url_imagem_atendente} alt={ticket.nome_atendente || ''} />
+                  <AvatarImage src={ticket.url_avatar_atendente || ticket.url_imagem_atendente} alt={ticket.nome_atendente || ''} />
                   <AvatarFallback>{getInitials(ticket.nome_atendente || '')}</AvatarFallback>
                 </Avatar>
               )}
@@ -3,7 +3,7 @@ import React, { useState, useEffect } from "react";
 import { Card, CardContent } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
 import { Avatar, AvatarImage, AvatarFallback } from "@/components/ui/avatar";
-import { Ticket, Stage } from "@/types";
+import { Ticket, Stage, TicketStageTime } from "@/types";
 import { formatTimeSince, getTimeStatus } from "@/utils/timeUtils";
 import { formatPhoneDisplay } from "@/utils/phoneUtils";
 import { useSettings } from "@/contexts/SettingsContext";
@@ -11,10 +11,11 @@ import { useSettings } from "@/contexts/SettingsContext";
 interface TicketCardProps {
   ticket: Ticket;
   stages: Stage[];
+  stageTimes?: TicketStageTime[];
   onStatusChange?: (ticketId: string, newStageNumber: number, systemNumber?: number) => void;
 }
 
-const TicketCard: React.FC<TicketCardProps> = ({ ticket, stages, onStatusChange }) => {
+const TicketCard: React.FC<TicketCardProps> = ({ ticket, stages, stageTimes, onStatusChange }) => {
   const { settings } = useSettings();
   const { showUserNS, phoneDisplayMode, warningTimeMinutes, criticalTimeMinutes } = settings;
   const [, forceUpdate] = useState<number>(0);
@@ -74,6 +75,17 @@ const TicketCard: React.FC<TicketCardProps> = ({ ticket, stages, onStatusChange
   
   const waitingTimeInfo = getWaitingTimeInfo();
 
+  // Time spent in each stage the ticket already left (from the ticket history)
+  const formatStageDuration = (totalSeconds: number) => {
+    const totalMinutes = Math.floor(totalSeconds / 60);
+    if (totalMinutes < 60) {
+      return `${totalMinutes} min`;
+    }
+    return `${Math.floor(totalMinutes / 60)}h ${totalMinutes % 60}min`;
+  };
+
+  const finishedStageTimes = (stageTimes || []).filter((tempo) => !tempo.atual);
+
   // Determine the correct time display color based on the current stage
   const getTimeDisplayColor = () => {
     // For stage 1 (waiting), use the warning/critical colors
@@ -114,7 +126,7 @@ const TicketCard: React.FC<TicketCardProps> = ({ ticket, stages, onStatusChange
               <div className="flex items-center gap-2">
                 <span className="text-sm">{ticket.nome_atendente || ticket.email_atendente}</span>
                 <Avatar className="w-8 h-8">
-                  <AvatarImage src={ticket.url_imagem_atendente} />
+                  <AvatarImage src={ticket.url_avatar_atendente || ticket.url_imagem_atendente} />
                   <AvatarFallback>
                     {getInitials(ticket.nome_atendente || ticket.email_atendente || '')}
                   </AvatarFallback>
@@ -151,6 +163,20 @@ const TicketCard: React.FC<TicketCardProps> = ({ ticket, stages, onStatusChange
             </div>
           )}
           
+          {/* Time per finished stage */}
+          {finishedStageTimes.length > 0 && (
+            <div className="mb-2">
+              <p className="text-sm font-medium">Tempo por etapa:</p>
+              {finishedStageTimes.map((tempo) => (
+                <p key={tempo.etapa_numero} className="text-xs text-muted-foreground">
+                  {stages.find((stage) => stage.numero === tempo.etapa_numero)?.nome || `Etapa ${tempo.etapa_numero}`}
+                  {": "}
+                  {formatStageDuration(tempo.segundos)}
+                </p>
+              ))}
+            </div>
+          )}
+          
           <div className="flex justify-between items-center mt-3">
             <Badge
               style={{
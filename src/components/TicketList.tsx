@@ -1,7 +1,7 @@
 // @ts-nocheck - Desativando verificação de tipos no arquivo até resolver as dependências do React
 import { useState, useEffect } from "react";
-import { Ticket, Stage } from "@/types";
-import { updateTicket } from "@/services";
+import { Ticket, Stage, TicketStageTime } from "@/types";
+import { updateTicket, getTicketStageTimes } from "@/services";
 import { toast } from "sonner";
 import { useAudioSetup } from "@/hooks/useAudioSetup";
 import { useTicketNotifications } from "@/hooks/useTicketNotifications";
@@ -21,6 +21,23 @@ const TicketList = ({ tickets, stages, onTicketChange }: TicketListProps) => {
   // Setup notification and alert system
   useTicketNotifications(tickets, onTicketChange);
 
+  // Tempo por etapa de todos os cards em uma única consulta, refeita quando
+  // um ticket entra, sai ou muda de etapa
+  const [stageTimes, setStageTimes] = useState<Record<string, TicketStageTime[]>>({});
+  const stageTimesKey = tickets.map((ticket) => `${ticket.id}:${ticket.etapa_numero}`).join(",");
+
+  useEffect(() => {
+    let cancelled = false;
+    getTicketStageTimes(tickets.map((ticket) => ticket.id)).then((tempos) => {
+      if (!cancelled) {
+        setStageTimes(tempos);
+      }
+    });
+    return () => {
+      cancelled = true;
+    };
+  }, [stageTimesKey]);
+
   // Ensure audio is ready on component mount - but don't play test sound
   useEffect(() => {
     // Unlock audio on mount to prepare for notifications
@@ -69,6 +86,7 @@ const TicketList = ({ tickets, stages, onTicketChange }: TicketListProps) => {
           key={ticket.id}
           ticket={ticket}
           stages={stages}
+          stageTimes={stageTimes[ticket.id]}
           onStatusChange={handleStatusChange}
         />
       ))}
@@ -1,20 +1,22 @@
 
 import React from "react";
 import TicketCard from "../TicketCard";
-import { Ticket, Stage } from "@/types";
+import { Ticket, Stage, TicketStageTime } from "@/types";
 
 interface TicketCardRowProps {
   ticket: Ticket;
   stages: Stage[];
+  stageTimes?: TicketStageTime[];
   onStatusChange: (ticketId: string, newStageNumber: number, systemNumber?: number) => void;
 }
 
-const TicketCardRow: React.FC<TicketCardRowProps> = ({ ticket, stages, onStatusChange }) => {
+const TicketCardRow: React.FC<TicketCardRowProps> = ({ ticket, stages, stageTimes, onStatusChange }) => {
   return (
     <TicketCard
       key={ticket.id}
       ticket={ticket}
       stages={stages}
+      stageTimes={stageTimes}
       onStatusChange={onStatusChange}
     />
   );
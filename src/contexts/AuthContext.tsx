@@ -3,7 +3,10 @@ import React, { createContext, useState, useContext, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import { toast } from "sonner";
 import { AuthContextType, User } from "@/types";
-import { checkUserActive, loginUser } from "@/services/auth";
+import { checkUserActive, loginUser, refreshAccessToken, revokeSession } from "@/services/auth";
+
+// O token de acesso é curto: renovar quando faltar menos que isso para expirar
+const TOKEN_REFRESH_MARGIN_MS = 2 * 60 * 1000;
 
 // Criando o contexto com um valor inicial
 const defaultContextValue: AuthContextType = {
@@ -44,9 +47,13 @@ export const AuthProvider = ({ children }: { children: React.ReactNode }) => {
         const payload = JSON.parse(atob(token.split('.')[1]));
         const expiration = payload.exp * 1000; // convert to milliseconds
         
-        if (Date.now() >= expiration) {
-          console.log("❌ [AuthContext] Token expirado, sessão inválida");
-          return false;
+        // Renovar com o refresh token antes de expirar
+        if (Date.now() >= expiration - TOKEN_REFRESH_MARGIN_MS) {
+          const refreshed = await refreshAccessToken();
+          if (!refreshed && Date.now() >= expiration) {
+            console.log("❌ [AuthContext] Token expirado, sessão inválida");
+            return false;
+          }
         }
       } catch (error) {
         console.error("❌ [AuthContext] Erro ao decodificar token:", error);
@@ -130,7 +137,7 @@ export const AuthProvider = ({ children }: { children: React.ReactNode }) => {
     // Verifica a sessão ao carregar
     checkSession();
 
-    // Verificar periodicamente a validade do token (a cada 5 minutos)
+    // Verificar periodicamente a validade do token (a cada minuto, para renovar antes de expirar)
     const tokenCheckInterval = setInterval(async () => {
       const storedUser = localStorage.getItem("queueUser");
       if (storedUser) {
@@ -147,7 +154,7 @@ export const AuthProvider = ({ children }: { children: React.ReactNode }) => {
           }
         }
       }
-    }, 5 * 60 * 1000); // 5 minutos
+    }, 60 * 1000); // 1 minuto
 
     // Limpar o intervalo ao desmontar o componente
     return () => clearInterval(tokenCheckInterval);
@@ -189,12 +196,15 @@ export const AuthProvider = ({ children }: { children: React.ReactNode }) => {
     console.log("🔒 Realizando logout silencioso");
     localStorage.removeItem("queueUser");
     localStorage.removeItem("accessToken");
+    localStorage.removeItem("refreshToken");
     setUser(null);
   };
 
   const logout = async () => {
     try {
       console.log("🔒 Realizando logout para usuário:", user?.usuario);
+      // Revoga no servidor o token de acesso e o refresh token antes de limpar o estado local
+      await revokeSession();
       await logoutSilent();
       navigate("/login");
       toast.info("Logout realizado com sucesso");
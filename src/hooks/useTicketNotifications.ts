@@ -1,5 +1,5 @@
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { Ticket } from "@/types";
 import { useSettings } from "@/contexts/SettingsContext";
 import { 
@@ -8,7 +8,7 @@ import {
   unlockAudio,
   playSound
 } from "@/services/notificationService";
-import { setupTicketNotifications, setupTicketStatusChanges } from "@/services/notificationSystem";
+import { setupTicketNotifications } from "@/services/notificationSystem";
 import { toast } from "sonner";
 
 // Import sonner first to ensure proper type augmentation
@@ -20,6 +20,9 @@ export const useTicketNotifications = (
 ) => {
   const { settings } = useSettings();
   const [alertActive, setAlertActive] = useState(false);
+  // Mantém a assinatura de eventos estável entre renderizações
+  const onTicketChangeRef = useRef(onTicketChange);
+  onTicketChangeRef.current = onTicketChange;
 
   // Check if we need to manage alert states
   useEffect(() => {
@@ -54,21 +57,18 @@ export const useTicketNotifications = (
     console.log('🔊 Testing sound system with a silent test');
     playSound('beep', 0.01, false);
     
-    // Setup notification system for new tickets
-    const ticketNotificationCleanup = setupTicketNotifications(onTicketChange);
-    
-    // Setup notification system for ticket status changes
-    const statusChangeCleanup = setupTicketStatusChanges(onTicketChange);
+    // SLA breach events pushed by the server (no polling over the ticket list);
+    // a breach refreshes the list so the ticket shows up with its current state
+    const ticketNotificationCleanup = setupTicketNotifications(() => onTicketChangeRef.current());
     
     console.log('Notification systems started');
 
-    // Cleanup both systems on component unmount
+    // Cleanup on component unmount
     return () => {
       console.log('Deactivating notification systems');
       ticketNotificationCleanup();
-      statusChangeCleanup();
     };
-  }, [onTicketChange, settings]);
+  }, [settings]);
 
   return {
     alertActive
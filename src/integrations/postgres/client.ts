@@ -271,6 +271,7 @@ export const loginViaApi = async (username: string, password: string) => {
       // Limpar token existente em caso de erro
       if (typeof window !== 'undefined') {
         localStorage.removeItem('accessToken');
+        localStorage.removeItem('refreshToken');
       }
       
       // Tentar extrair mensagem de erro do JSON se possível
@@ -292,6 +293,9 @@ export const loginViaApi = async (username: string, password: string) => {
     // Armazenar o token se estiver presente
     if (userData.access_token && typeof window !== 'undefined') {
       localStorage.setItem('accessToken', userData.access_token);
+      if (userData.refresh_token) {
+        localStorage.setItem('refreshToken', userData.refresh_token);
+      }
       console.log('🔑 Token de autenticação armazenado:', userData.access_token.substring(0, 15) + '...');
     }
     
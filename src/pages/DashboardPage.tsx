@@ -11,8 +11,8 @@ import NewTicketDialog from "@/components/dashboard/NewTicketDialog";
 
 import { useAuth } from "@/contexts/AuthContext";
 import { useSettings } from "@/contexts/SettingsContext";
-import { getTickets, getStages } from "@/services";
-import { getTimeStatus } from "@/utils/timeUtils";
+import { getBootstrap } from "@/services";
+import { subscribeSlaEvents } from "@/services/slaEvents";
 import { Stage, Ticket } from "@/types";
 import { toast } from "sonner";
 import { getAttendantPerformance } from "@/services/performance";
@@ -31,8 +31,8 @@ const DashboardPage = () => {
   const [newTicketDialogOpen, setNewTicketDialogOpen] = useState(false);
   const [criticalTicket, setCriticalTicket] = useState<Ticket | null>(null);
   const [dismissedAlerts, setDismissedAlerts] = useState<Set<string>>(new Set());
-  const [lastCheckTime, setLastCheckTime] = useState<number>(Date.now());
-  const [lastAlertCheck, setLastAlertCheck] = useState<number>(Date.now());
+  // Tickets em violação crítica de SLA, na ordem informada pelo servidor
+  const [criticalIds, setCriticalIds] = useState<string[]>([]);
   
   useEffect(() => {
     unlockAudio();
@@ -61,14 +61,10 @@ const DashboardPage = () => {
   const loadData = async () => {
     try {
       setIsLoading(true);
-      const [ticketsData, stagesData] = await Promise.all([
-        getTickets(),
-        getStages(),
-      ]);
-      setTickets(ticketsData);
-      setStages(stagesData);
-      
-      setLastAlertCheck(Date.now());
+      // Etapas e tickets vêm de um único snapshot em /api/bootstrap
+      const data = await getBootstrap();
+      setTickets(data.tickets);
+      setStages(data.etapas);
     } catch (error) {
       console.error("Erro ao carregar dados:", error);
     } finally {
@@ -86,40 +82,28 @@ const DashboardPage = () => {
     }
   }, [isAuthenticated, navigate]);
   
+  // O servidor detecta as violações de SLA e envia os eventos; a tela só reage a eles
   useEffect(() => {
-    const checkForCriticalTickets = () => {
-      console.log("Checking for critical tickets...");
-      const waitingTickets = tickets.filter((ticket) => ticket.etapa_numero === 1);
-      
-      for (const ticket of waitingTickets) {
-        const creationDate = ticket.data_criado || ticket.data_criacao;
-        const timeInfo = getTimeStatus(
-          creationDate,
-          settings.warningTimeMinutes,
-          settings.criticalTimeMinutes
-        );
-        
-        if (timeInfo.minutes >= settings.fullScreenAlertMinutes && !dismissedAlerts.has(ticket.id)) {
-          console.log(`Critical ticket found: ${ticket.id}, time: ${timeInfo.minutes} minutes`);
-          setCriticalTicket(ticket);
-          return;
+    return subscribeSlaEvents({
+      onSnapshot: (emViolacao) => {
+        setCriticalIds(emViolacao.filter((breach) => breach.nivel === "critico").map((breach) => breach.ticket_id));
+      },
+      onEvent: (evento) => {
+        if (evento.nivel === "critico") {
+          console.log(`Critical ticket found: ${evento.ticket_id}`);
+          setCriticalIds((prev) => (prev.includes(evento.ticket_id) ? prev : [...prev, evento.ticket_id]));
         }
-      }
-      
-      setCriticalTicket(null);
-    };
-    
-    checkForCriticalTickets();
-    
-    const intervalId = setInterval(() => {
-      console.log("Interval check for critical tickets");
-      setLastAlertCheck(Date.now());
-    }, 15000);
-    
-    return () => {
-      clearInterval(intervalId);
-    };
-  }, [tickets, settings, dismissedAlerts, lastAlertCheck]);
+      },
+    });
+  }, []);
+  
+  useEffect(() => {
+    const waitingTickets = new Map(
+      tickets.filter((ticket) => ticket.etapa_numero === 1).map((ticket) => [ticket.id, ticket])
+    );
+    const criticalId = criticalIds.find((id) => waitingTickets.has(id) && !dismissedAlerts.has(id));
+    setCriticalTicket(criticalId ? waitingTickets.get(criticalId)! : null);
+  }, [tickets, criticalIds, dismissedAlerts]);
   
   const pendingTicketsCount = tickets.filter(
     (ticket) => ticket.etapa_numero === 1
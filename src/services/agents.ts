@@ -118,36 +118,40 @@ export const createAgent = async (agent: Omit<Agent, "id" | "data_criado" | "dat
 
 export const updateAgent = async (id: string, updates: Partial<Agent>): Promise<Agent> => {
   try {
-    // Construct the SET part of the SQL query dynamically
-    const fields: string[] = [];
-    const values: any[] = [];
-    let paramCounter = 1;
-    
-    // Add each update field to the query
-    Object.entries(updates).forEach(([key, value]) => {
-      if (value !== undefined) {
-        fields.push(`${key} = $${paramCounter++}`);
-        values.push(value);
-      }
+    const token = localStorage.getItem("accessToken");
+    if (!token) {
+      throw new Error("Unauthorized");
+    }
+
+    // A API atualiza atendente e login juntos; desativar encerra as sessões do atendente
+    const response = await fetch(`/api/atendentes/${id}`, {
+      method: 'PUT',
+      headers: {
+        'Authorization': `Bearer ${token}`,
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({
+        nome: updates.nome,
+        email: updates.email,
+        url_imagem: updates.url_imagem,
+        ativo: updates.ativo
+      })
     });
-    
-    // Add update timestamp
-    fields.push(`data_atualizado = NOW()`);
-    
-    // Add the id to the values array
-    values.push(id);
-    
-    // Execute the update query
-    const result = await query(
-      `UPDATE atendentes 
-       SET ${fields.join(', ')} 
-       WHERE id = $${paramCounter} 
-       RETURNING *`,
-      values
-    );
+
+    if (!response.ok) {
+      throw new Error(`API responded with status ${response.status}`);
+    }
+
+    const data = await response.json();
 
     toast.success("Atendente atualizado com sucesso");
-    return result.rows[0] as Agent;
+    return {
+      id: data.id,
+      nome: data.nome_completo,
+      email: data.usuario,
+      ativo: data.ativo,
+      url_imagem: data.url_imagem
+    } as Agent;
   } catch (error) {
     console.error("Error updating agent:", error);
     toast.error("Erro ao atualizar atendente");
@@ -5,3 +5,4 @@ export * from './userStatus';
 export * from './login';
 export * from './register';
 export * from './logout';
+export * from './refresh';
@@ -96,6 +96,10 @@ export const login = async (
       if (userData.access_token) {
         console.log("🔑 Armazenando access_token no localStorage");
         localStorage.setItem("accessToken", userData.access_token);
+        // O token de acesso é curto; o refresh token renova a sessão
+        if (userData.refresh_token) {
+          localStorage.setItem("refreshToken", userData.refresh_token);
+        }
         
         // Verificar validade do token
         try {
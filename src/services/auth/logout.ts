@@ -2,12 +2,34 @@
 import { toast } from "sonner";
 
 /**
- * Função para encerrar a sessão (no cliente, apenas limpa o estado)
+ * Revoga no servidor o token de acesso atual e o refresh token da sessão
+ */
+export const revokeSession = async (): Promise<void> => {
+  const token = localStorage.getItem("accessToken");
+  if (!token) {
+    return;
+  }
+
+  try {
+    await fetch('/api/auth/logout', {
+      method: 'POST',
+      headers: {
+        'Authorization': `Bearer ${token}`,
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ refresh_token: localStorage.getItem("refreshToken") })
+    });
+  } catch (error) {
+    // O estado local é limpo mesmo se o servidor não responder
+    console.error("🚨 Erro ao revogar sessão no servidor:", error);
+  }
+};
+
+/**
+ * Função para encerrar a sessão (revoga os tokens no servidor; o estado local é limpo no Context do React)
  */
 export const logout = async (): Promise<void> => {
-  // No lado do cliente, não precisamos fazer nada além de limpar o estado local
-  // Isso é feito no Context do React
+  await revokeSession();
   console.log("Usuário realizou logout");
   toast.success("Logout realizado com sucesso");
-  return Promise.resolve();
 };
@@ -0,0 +1,45 @@
+
+/**
+ * Renova o token de acesso usando o refresh token salvo no login.
+ * O refresh token é trocado a cada uso; retorna false se a sessão não puder ser renovada.
+ */
+export const refreshAccessToken = async (): Promise<boolean> => {
+  const refreshToken = localStorage.getItem("refreshToken");
+  if (!refreshToken) {
+    return false;
+  }
+
+  try {
+    const response = await fetch('/api/auth/refresh', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ refresh_token: refreshToken })
+    });
+
+    if (!response.ok) {
+      console.error(`🚨 [Refresh] API respondeu com status ${response.status}`);
+      // Token inválido, revogado ou usuário desativado: a sessão não pode ser renovada
+      if (response.status === 401) {
+        localStorage.removeItem("refreshToken");
+      }
+      return false;
+    }
+
+    const data = await response.json();
+    if (!data.access_token) {
+      return false;
+    }
+
+    localStorage.setItem("accessToken", data.access_token);
+    if (data.refresh_token) {
+      localStorage.setItem("refreshToken", data.refresh_token);
+    }
+    console.log("🔑 [Refresh] Token de acesso renovado");
+    return true;
+  } catch (error) {
+    console.error("🚨 [Refresh] Erro ao renovar token:", error);
+    return false;
+  }
+};
@@ -0,0 +1,64 @@
+import { Agent, Stage, Ticket } from "@/types";
+import { getTickets } from "./tickets";
+import { getStages } from "./stages";
+
+export interface BootstrapData {
+  sessao: {
+    id: string;
+    usuario: string;
+    isAdmin: boolean;
+    ativo: boolean;
+  } | null;
+  etapas: Stage[];
+  atendentes: Agent[];
+  tickets: Ticket[];
+}
+
+// Carrega sessão, etapas, atendentes e tickets em uma única requisição (GET /api/bootstrap)
+export const getBootstrap = async (): Promise<BootstrapData> => {
+  const token = localStorage.getItem("accessToken");
+  if (!token) {
+    console.log("⚠️ Token de autenticação ausente, não é possível carregar dados iniciais");
+    return { sessao: null, etapas: [], atendentes: [], tickets: [] };
+  }
+
+  try {
+    const response = await fetch('/api/bootstrap/', {
+      headers: {
+        'Authorization': `Bearer ${token}`,
+        'Content-Type': 'application/json'
+      }
+    });
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      console.error(`🚨 API respondeu com status ${response.status}: ${errorText}`);
+      throw new Error(`API responded with status ${response.status}`);
+    }
+
+    const data = await response.json();
+    console.log("Bootstrap from API:", {
+      etapas: data.etapas?.length,
+      atendentes: data.atendentes?.length,
+      tickets: data.tickets?.length,
+    });
+    return {
+      sessao: data.sessao || null,
+      etapas: data.etapas || [],
+      atendentes: data.atendentes || [],
+      tickets: data.tickets || [],
+    };
+  } catch (apiError) {
+    console.error("Error fetching bootstrap from API:", apiError);
+
+    // Sem autenticação não adianta tentar as rotas individuais
+    if (apiError instanceof Error && apiError.message.includes("401")) {
+      return { sessao: null, etapas: [], atendentes: [], tickets: [] };
+    }
+
+    // Servidor sem /api/bootstrap: volta para as chamadas separadas
+    console.log("Falling back to separate tickets/etapas requests...");
+    const [tickets, etapas] = await Promise.all([getTickets(), getStages()]);
+    return { sessao: null, etapas, atendentes: [], tickets };
+  }
+};
@@ -3,6 +3,7 @@
 export * from './tickets';
 export * from './stages';
 export * from './agents';
+export * from './bootstrap';
 export * from './auth';
 export * from './connectionTest';
 export * from './performance';
@@ -1,72 +1,43 @@
 
-// Notification system using polling for browser compatibility
+// Notification system driven by SLA breach events computed on the server
 
 import { toast } from "sonner";
+import { SlaEvent } from "@/types";
 import { playSound } from "./notificationService";
-import { getMockPerformanceData } from "./mockData";
+import { subscribeSlaEvents } from "./slaEvents";
 
-// Polling intervals in milliseconds
-const NEW_TICKET_POLLING_INTERVAL = 10000; // 10 seconds
-const STATUS_CHANGE_POLLING_INTERVAL = 5000; // 5 seconds
+// Violações já notificadas nesta aba (várias listas assinam os mesmos eventos)
+const notifiedBreaches = new Set<string>();
 
-// Setup notification system for new tickets
-export const setupTicketNotifications = (onTicketChange: () => void) => {
+// Setup notifications for tickets that exceed the SLA limits
+export const setupTicketNotifications = (onBreach?: (evento: SlaEvent) => void) => {
   console.log("Setting up ticket notification system...");
-  
-  // In a real implementation, this would poll a server endpoint
-  // or use WebSockets to get real-time notifications
-  
-  // For development/demo purposes, we'll simulate random notifications
-  const intervalId = setInterval(() => {
-    // 10% chance of a new ticket in development mode
-    if (import.meta.env.DEV && Math.random() < 0.1) {
-      console.log("🎟️ Simulating new ticket notification");
-      toast.info("Novo chamado recebido!", {
-        description: "Um novo chamado foi adicionado à fila."
-      });
-      
-      // Play notification sound
-      playSound("notification", 0.7);
-      
-      // Trigger refresh
-      onTicketChange();
-    }
-  }, NEW_TICKET_POLLING_INTERVAL);
 
-  // Return cleanup function
-  return () => {
-    console.log("Cleaning up ticket notification system");
-    clearInterval(intervalId);
-  };
-};
+  const unsubscribe = subscribeSlaEvents({
+    onEvent: (evento) => {
+      const key = `${evento.ticket_id}:${evento.nivel}`;
+      if (notifiedBreaches.has(key)) {
+        return;
+      }
+      notifiedBreaches.add(key);
+
+      const minutos = Math.round(evento.limite_minutos);
+      console.log(`⏰ SLA ${evento.nivel} ultrapassado pelo ticket ${evento.ticket_id}`);
+      toast.warning(
+        evento.nivel === "critico" ? "Atendimento em espera crítica" : "Atendimento aguardando há muito tempo",
+        { description: `${evento.nome || "Cliente"} aguarda há mais de ${minutos} minutos.` }
+      );
 
-// Setup notification system for ticket status changes
-export const setupTicketStatusChanges = (onTicketChange: () => void) => {
-  console.log("Setting up ticket status change notification system...");
-  
-  // For development/demo purposes, we'll simulate random status changes
-  const intervalId = setInterval(() => {
-    // 5% chance of a status change in development mode
-    if (import.meta.env.DEV && Math.random() < 0.05) {
-      const mockData = getMockPerformanceData();
-      const randomAgent = mockData[Math.floor(Math.random() * mockData.length)];
-      
-      console.log("🔄 Simulating ticket status change");
-      toast.success(`Chamado atualizado por ${randomAgent.nome}`, {
-        description: "Um chamado foi movido para uma nova etapa."
-      });
-      
-      // Play notification sound
-      playSound("beep", 0.5);
-      
-      // Trigger refresh
-      onTicketChange();
-    }
-  }, STATUS_CHANGE_POLLING_INTERVAL);
+      // Play notification sound (the critical alert sound is played by FullscreenAlert)
+      playSound("notification", 0.7);
+
+      onBreach?.(evento);
+    },
+  });
 
   // Return cleanup function
   return () => {
-    console.log("Cleaning up status change notification system");
-    clearInterval(intervalId);
+    console.log("Cleaning up ticket notification system");
+    unsubscribe();
   };
 };
@@ -0,0 +1,108 @@
+import { SlaBreach, SlaEvent } from "@/types";
+
+// Espera máxima de cada long polling (o servidor aceita até 55s)
+const SLA_EVENTS_WAIT_SECONDS = 25;
+// Pausa antes de reconectar após um erro
+const SLA_EVENTS_RETRY_MS = 5000;
+const SLA_EVENTS_AUTH_RETRY_MS = 30000;
+
+export interface SlaSubscriber {
+  onEvent: (evento: SlaEvent) => void;
+  // Violações já existentes quando a assinatura começa (e a cada reconexão)
+  onSnapshot?: (emViolacao: SlaBreach[]) => void;
+}
+
+const subscribers = new Set<SlaSubscriber>();
+let controller: AbortController | null = null;
+let ultimoSnapshot: SlaBreach[] | null = null;
+
+const authHeaders = (token: string) => ({
+  'Authorization': `Bearer ${token}`,
+  'Content-Type': 'application/json'
+});
+
+const sleep = (ms: number, signal: AbortSignal) =>
+  new Promise<void>((resolve) => {
+    const timeoutId = setTimeout(resolve, ms);
+    signal.addEventListener("abort", () => {
+      clearTimeout(timeoutId);
+      resolve();
+    });
+  });
+
+// Um único long polling por aba, compartilhado por todos os assinantes
+const run = async (signal: AbortSignal) => {
+  let desde: number | null = null;
+
+  while (!signal.aborted) {
+    const token = localStorage.getItem("accessToken");
+    if (!token) {
+      await sleep(SLA_EVENTS_AUTH_RETRY_MS, signal);
+      continue;
+    }
+
+    try {
+      if (desde === null) {
+        // Estado atual + posição no fluxo de eventos
+        const response = await fetch('/api/fila/sla', { headers: authHeaders(token), signal });
+        if (!response.ok) {
+          throw new Error(`API responded with status ${response.status}`);
+        }
+        const status = await response.json();
+        desde = status.ultimo_evento || 0;
+        ultimoSnapshot = status.em_violacao || [];
+        subscribers.forEach((subscriber) => subscriber.onSnapshot?.(ultimoSnapshot!));
+        continue;
+      }
+
+      const response = await fetch(
+        `/api/fila/sla/eventos?desde=${desde}&espera=${SLA_EVENTS_WAIT_SECONDS}`,
+        { headers: authHeaders(token), signal }
+      );
+      if (!response.ok) {
+        throw new Error(`API responded with status ${response.status}`);
+      }
+      const data = await response.json();
+      desde = data.ultimo_evento;
+      for (const evento of (data.eventos || []) as SlaEvent[]) {
+        // Mantém o estado atual para quem assinar depois
+        ultimoSnapshot = [
+          ...(ultimoSnapshot || []).filter((breach) => breach.ticket_id !== evento.ticket_id),
+          { ticket_id: evento.ticket_id, nivel: evento.nivel, nome: evento.nome, setor: evento.setor },
+        ];
+        subscribers.forEach((subscriber) => subscriber.onEvent(evento));
+      }
+    } catch (error) {
+      if (signal.aborted) {
+        return;
+      }
+      console.error("Error fetching SLA events:", error);
+      desde = null;
+      const status401 = error instanceof Error && error.message.includes("401");
+      await sleep(status401 ? SLA_EVENTS_AUTH_RETRY_MS : SLA_EVENTS_RETRY_MS, signal);
+    }
+  }
+};
+
+// Assina as violações de SLA calculadas no servidor; retorna a função de cancelamento
+export const subscribeSlaEvents = (subscriber: SlaSubscriber) => {
+  subscribers.add(subscriber);
+  if (ultimoSnapshot !== null) {
+    subscriber.onSnapshot?.(ultimoSnapshot);
+  }
+  if (!controller) {
+    console.log("🚨 Iniciando escuta de eventos de SLA");
+    controller = new AbortController();
+    run(controller.signal);
+  }
+
+  return () => {
+    subscribers.delete(subscriber);
+    if (subscribers.size === 0 && controller) {
+      console.log("Encerrando escuta de eventos de SLA");
+      controller.abort();
+      controller = null;
+      ultimoSnapshot = null;
+    }
+  };
+};
@@ -1,5 +1,5 @@
 
-import { Ticket } from "@/types";
+import { Ticket, TicketStageTime } from "@/types";
 import { query, transaction } from "@/integrations/postgres/client";
 import { toast } from "sonner";
 
@@ -166,3 +166,39 @@ export const deleteTicket = async (id: string): Promise<void> => {
     throw error;
   }
 };
+
+// A API aceita no máximo 500 tickets por consulta
+const STAGE_TIMES_BATCH_SIZE = 500;
+
+export const getTicketStageTimes = async (ids: string[]): Promise<Record<string, TicketStageTime[]>> => {
+  const token = localStorage.getItem("accessToken");
+  if (!token || ids.length === 0) {
+    return {};
+  }
+
+  try {
+    const result: Record<string, TicketStageTime[]> = {};
+    for (let i = 0; i < ids.length; i += STAGE_TIMES_BATCH_SIZE) {
+      const params = new URLSearchParams();
+      ids.slice(i, i + STAGE_TIMES_BATCH_SIZE).forEach((id) => params.append("ids", id));
+
+      const response = await fetch(`/api/tickets/tempos?${params.toString()}`, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          'Content-Type': 'application/json'
+        }
+      });
+
+      if (!response.ok) {
+        throw new Error(`API responded with status ${response.status}`);
+      }
+
+      Object.assign(result, await response.json());
+    }
+    return result;
+  } catch (error) {
+    // Informação complementar do card: sem toast, os cards continuam sem os tempos
+    console.error("Error fetching ticket stage times:", error);
+    return {};
+  }
+};
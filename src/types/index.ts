@@ -36,6 +36,7 @@ export interface Ticket {
   etapa_numero: number;
   numero_sistema?: number;
   url_imagem_atendente?: string;
+  url_avatar_atendente?: string; // miniatura servida pela API
   data_criado?: string;
   data_atualizado?: string;
   data_saida_etapa1?: string;
@@ -48,6 +49,36 @@ export interface Ticket {
   numeropropriedade?: number;
 }
 
+// Tempo de permanência de um ticket em uma etapa (GET /api/tickets/tempos)
+export interface TicketStageTime {
+  etapa_numero: number;
+  primeira_entrada: string;
+  segundos: number;
+  atual: boolean;
+}
+
+// Violação de SLA detectada no servidor (GET /api/fila/sla/eventos)
+export interface SlaEvent {
+  seq: number;
+  tipo: "sla";
+  nivel: "atencao" | "critico";
+  ticket_id: string;
+  nome?: string;
+  setor?: string;
+  data_criado?: number; // epoch em segundos
+  limite_minutos: number;
+  ts: number;
+}
+
+// Ticket que já ultrapassou um limite de SLA (GET /api/fila/sla)
+export interface SlaBreach {
+  ticket_id: string;
+  nivel: "atencao" | "critico";
+  nome?: string;
+  setor?: string;
+  espera_segundos?: number;
+}
+
 export interface Agent {
   id: string;
   nome: string;
@@ -55,6 +86,7 @@ export interface Agent {
   ativo: boolean;
   cor?: string;
   url_imagem?: string;
+  url_avatar?: string; // miniatura servida pela API
   data_criado?: string;
   data_atualizado?: string;
 }